@@ -41,10 +41,8 @@ def upgrade():
     op.execute("CREATE INDEX ix_kb_chunks_document_id ON kb_chunks(document_id);")
     op.execute("CREATE INDEX ix_kb_chunks_language_doc ON kb_documents(language);")
 
-    # HNSW index for cosine distance
-    op.execute(
-        "CREATE INDEX ix_kb_chunks_embedding_hnsw ON kb_chunks USING hnsw (embedding vector_cosine_ops);"
-    )
+    # HNSW indexes are built by 0005_embedding_storage: pgvector cannot build
+    # HNSW on vector columns wider than 2000 dimensions.
 
 
 def downgrade():
@@ -0,0 +1,34 @@
+from alembic import op
+
+revision = "0003_answer_cache"
+down_revision = "0002_kb_rag"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE rag_answer_cache (
+            id uuid PRIMARY KEY,
+            language varchar(8) NOT NULL,
+            question_hash varchar(64) NOT NULL,
+            question text NOT NULL,
+            answer text NOT NULL,
+            sources text NOT NULL DEFAULT '',
+            gen_ms integer NOT NULL DEFAULT 0,
+            hits integer NOT NULL DEFAULT 0,
+            created_at timestamptz NOT NULL,
+            last_hit_at timestamptz NOT NULL,
+            embedding vector(3072) NOT NULL
+        );
+        """
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX ux_rag_answer_cache_lang_hash ON rag_answer_cache(language, question_hash);"
+    )
+    op.execute("CREATE INDEX ix_rag_answer_cache_last_hit ON rag_answer_cache(last_hit_at);")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS rag_answer_cache;")
@@ -0,0 +1,32 @@
+from alembic import op
+
+revision = "0004_kb_chunk_language"
+down_revision = "0003_answer_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Denormalize document language/title onto chunks so retrieval never joins
+    op.execute(
+        """
+        ALTER TABLE kb_chunks
+            ADD COLUMN language varchar(8) NOT NULL DEFAULT 'en',
+            ADD COLUMN title varchar(256) NOT NULL DEFAULT '';
+        """
+    )
+    op.execute(
+        """
+        UPDATE kb_chunks AS c
+        SET language = d.language, title = d.title
+        FROM kb_documents AS d
+        WHERE d.id = c.document_id;
+        """
+    )
+
+    # Per-language partial HNSW indexes are created with the others in
+    # 0005_embedding_storage, once the column has an indexable type.
+
+
+def downgrade():
+    op.execute("ALTER TABLE kb_chunks DROP COLUMN IF EXISTS title, DROP COLUMN IF EXISTS language;")
@@ -0,0 +1,49 @@
+from alembic import op
+
+from app.db.vector_index import (
+    ANSWER_CACHE_INDEX,
+    EMBEDDING_DIM,
+    EMBEDDING_STORAGE,
+    convert_embedding_storage,
+    create_hnsw_index_statements,
+    drop_hnsw_index_statements,
+    hnsw_supported,
+    stored_embedding_type,
+    unsupported_hnsw_message,
+)
+
+revision = "0005_embedding_storage"
+down_revision = "0004_kb_chunk_language"
+branch_labels = None
+depends_on = None
+
+# Converts the embedding columns to EMBEDDING_STORAGE(EMBEDDING_DIM) as
+# configured in the environment (default halfvec(1536)), truncating and
+# re-normalizing existing vectors, then builds the HNSW indexes. This is the
+# only migration that reads those settings: the column type it leaves behind
+# records the choice, and later migrations read it back from the database.
+# To change dimension or storage later, use
+#   python -m app.rag.ingest_kb --convert-embeddings   (shrink / change type)
+#   python -m app.rag.ingest_kb --reembed              (any change, calls the provider)
+
+
+def upgrade():
+    if not hnsw_supported():
+        raise RuntimeError(unsupported_hnsw_message(EMBEDDING_STORAGE, EMBEDDING_DIM))
+    convert_embedding_storage(op.execute)
+
+
+def downgrade():
+    # Back to plain vector at the stored dimension; the original 3072-dim
+    # vectors cannot be recovered without a re-embed.
+    _, dim = stored_embedding_type(op.get_bind())
+    for sql in drop_hnsw_index_statements():
+        op.execute(sql)
+    op.execute(f"ALTER TABLE kb_chunks ALTER COLUMN embedding TYPE vector({dim}) USING embedding::vector;")
+    op.execute(f"DROP INDEX IF EXISTS {ANSWER_CACHE_INDEX};")
+    op.execute("TRUNCATE rag_answer_cache;")
+    op.execute(f"ALTER TABLE rag_answer_cache ALTER COLUMN embedding TYPE vector({dim}) USING NULL;")
+    # Like before 0005, vector columns wider than HNSW's limit stay unindexed
+    if hnsw_supported("vector", dim):
+        for sql in create_hnsw_index_statements("vector", dim):
+            op.execute(sql)
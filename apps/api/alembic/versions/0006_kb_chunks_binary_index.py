@@ -0,0 +1,21 @@
+from alembic import op
+
+from app.db.vector_index import LANGUAGES, create_binary_index_statements, stored_embedding_type
+
+revision = "0006_kb_chunks_binary_index"
+down_revision = "0005_embedding_storage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bit-quantized copy of each embedding, kept as an expression index
+    _, dim = stored_embedding_type(op.get_bind())
+    for sql in create_binary_index_statements(dim):
+        op.execute(sql)
+
+
+def downgrade():
+    for lang in LANGUAGES:
+        op.execute(f"DROP INDEX IF EXISTS ix_kb_chunks_embedding_bq_hnsw_{lang};")
+    op.execute("DROP INDEX IF EXISTS ix_kb_chunks_embedding_bq_hnsw;")
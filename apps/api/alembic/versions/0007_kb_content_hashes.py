@@ -0,0 +1,20 @@
+from alembic import op
+
+revision = "0007_kb_content_hashes"
+down_revision = "0006_kb_chunks_binary_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE kb_documents ADD COLUMN file_hash varchar(64);")
+    op.execute("ALTER TABLE kb_chunks ADD COLUMN content_hash varchar(64);")
+    # Same digest as app.rag.ingest_kb.content_hash, so existing embeddings are reused
+    op.execute("UPDATE kb_chunks SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex');")
+    op.execute("CREATE INDEX ix_kb_chunks_document_content_hash ON kb_chunks (document_id, content_hash);")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_kb_chunks_document_content_hash;")
+    op.execute("ALTER TABLE kb_chunks DROP COLUMN IF EXISTS content_hash;")
+    op.execute("ALTER TABLE kb_documents DROP COLUMN IF EXISTS file_hash;")
@@ -0,0 +1,15 @@
+from alembic import op
+
+revision = "0008_kb_chunk_ingest_run"
+down_revision = "0007_kb_content_hashes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Streaming ingest stamps every chunk it sees, then deletes the unstamped ones
+    op.execute("ALTER TABLE kb_chunks ADD COLUMN ingest_run uuid;")
+
+
+def downgrade():
+    op.execute("ALTER TABLE kb_chunks DROP COLUMN IF EXISTS ingest_run;")
@@ -0,0 +1,118 @@
+from alembic import op
+
+from app.db.vector_index import (
+    create_generation_index_statements,
+    create_hnsw_index_statements,
+    drop_hnsw_index_statements,
+    stored_embedding_type,
+)
+
+revision = "0009_kb_generations"
+down_revision = "0008_kb_chunk_ingest_run"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    storage, dim = stored_embedding_type(op.get_bind())
+    op.execute(
+        """
+        CREATE TABLE kb_generations (
+            id serial PRIMARY KEY,
+            status varchar(16) NOT NULL,
+            created_at timestamptz NOT NULL,
+            activated_at timestamptz,
+            chunk_count integer NOT NULL DEFAULT 0,
+            metadata jsonb NOT NULL DEFAULT '{}'::jsonb
+        );
+        """
+    )
+    # At most one generation is served at a time
+    op.execute("CREATE UNIQUE INDEX ux_kb_generations_active ON kb_generations ((true)) WHERE status = 'active';")
+
+    # Existing chunks become generation 1, already active
+    op.execute(
+        """
+        INSERT INTO kb_generations (id, status, created_at, activated_at, chunk_count)
+        SELECT 1, 'active', now(), now(), count(*) FROM kb_chunks;
+        """
+    )
+    op.execute("SELECT setval(pg_get_serial_sequence('kb_generations', 'id'), 1);")
+    op.execute(
+        """
+        ALTER TABLE kb_chunks
+            ADD COLUMN generation integer NOT NULL DEFAULT 1
+            REFERENCES kb_generations(id) ON DELETE CASCADE;
+        """
+    )
+    op.execute("ALTER TABLE kb_chunks ALTER COLUMN generation DROP DEFAULT;")
+
+    # File hashes are per generation, so a rolled-back generation keeps its own
+    op.execute(
+        """
+        CREATE TABLE kb_generation_documents (
+            generation_id integer NOT NULL REFERENCES kb_generations(id) ON DELETE CASCADE,
+            document_id uuid NOT NULL REFERENCES kb_documents(id) ON DELETE CASCADE,
+            file_hash varchar(64) NOT NULL,
+            PRIMARY KEY (generation_id, document_id)
+        );
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO kb_generation_documents (generation_id, document_id, file_hash)
+        SELECT 1, id, file_hash FROM kb_documents WHERE file_hash IS NOT NULL;
+        """
+    )
+    op.execute("ALTER TABLE kb_documents DROP COLUMN file_hash;")
+
+    op.execute("DROP INDEX IF EXISTS ix_kb_chunks_document_content_hash;")
+    op.execute(
+        "CREATE INDEX ix_kb_chunks_generation_document_hash ON kb_chunks (generation, document_id, content_hash);"
+    )
+
+    # Unscoped HNSW indexes are replaced by per-generation partial ones
+    for sql in drop_hnsw_index_statements():
+        op.execute(sql)
+    for sql in create_generation_index_statements(1, storage, dim):
+        op.execute(sql)
+
+
+def downgrade():
+    storage, dim = stored_embedding_type(op.get_bind())
+    # Keep only the active generation's chunks
+    op.execute(
+        """
+        DELETE FROM kb_chunks
+        WHERE generation <> (SELECT id FROM kb_generations WHERE status = 'active');
+        """
+    )
+    op.execute(
+        """
+        DO $$
+        DECLARE ix record;
+        BEGIN
+            FOR ix IN SELECT indexname FROM pg_indexes
+                      WHERE tablename = 'kb_chunks' AND indexname ~ '^ix_kb_chunks_g[0-9]+_'
+            LOOP
+                EXECUTE format('DROP INDEX IF EXISTS %I', ix.indexname);
+            END LOOP;
+        END $$;
+        """
+    )
+    op.execute("ALTER TABLE kb_documents ADD COLUMN file_hash varchar(64);")
+    op.execute(
+        """
+        UPDATE kb_documents AS d SET file_hash = g.file_hash
+        FROM kb_generation_documents AS g
+        JOIN kb_generations AS k ON k.id = g.generation_id AND k.status = 'active'
+        WHERE g.document_id = d.id;
+        """
+    )
+    op.execute("DROP INDEX IF EXISTS ix_kb_chunks_generation_document_hash;")
+    op.execute("CREATE INDEX ix_kb_chunks_document_content_hash ON kb_chunks (document_id, content_hash);")
+    op.execute("ALTER TABLE kb_chunks DROP COLUMN generation;")
+    op.execute("DROP TABLE kb_generation_documents;")
+    op.execute("DROP TABLE kb_generations;")
+    for sql in create_hnsw_index_statements(storage, dim):
+        op.execute(sql)
@@ -0,0 +1,23 @@
+from alembic import op
+
+from app.db.vector_index import ANSWER_CACHE_INDEX, create_answer_cache_index_statements, stored_embedding_type
+
+revision = "0010_answer_cache_indexes"
+down_revision = "0009_kb_generations"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Semantic lookups scanned every cached question on each miss, and
+    # TTL eviction had no index on created_at. Databases migrated through
+    # 0005 by this code already have the HNSW index (IF NOT EXISTS).
+    storage, dim = stored_embedding_type(op.get_bind())
+    for sql in create_answer_cache_index_statements(storage, dim):
+        op.execute(sql)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_rag_answer_cache_created_at ON rag_answer_cache(created_at);")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_rag_answer_cache_created_at;")
+    op.execute(f"DROP INDEX IF EXISTS {ANSWER_CACHE_INDEX};")
@@ -0,0 +1,28 @@
+from alembic import op
+
+revision = "0011_answer_cache_generation"
+down_revision = "0010_answer_cache_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cached answers are keyed by the KB generation they were built from, so
+    # a KB switch cannot leave answers citing retired chunks. Existing rows
+    # have no known generation and are dropped.
+    op.execute("DELETE FROM rag_answer_cache;")
+    op.execute("ALTER TABLE rag_answer_cache ADD COLUMN kb_generation integer NOT NULL;")
+    op.execute("DROP INDEX IF EXISTS ux_rag_answer_cache_lang_hash;")
+    op.execute(
+        "CREATE UNIQUE INDEX ux_rag_answer_cache_lang_hash_gen "
+        "ON rag_answer_cache(language, question_hash, kb_generation);"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM rag_answer_cache;")
+    op.execute("DROP INDEX IF EXISTS ux_rag_answer_cache_lang_hash_gen;")
+    op.execute("ALTER TABLE rag_answer_cache DROP COLUMN kb_generation;")
+    op.execute(
+        "CREATE UNIQUE INDEX ux_rag_answer_cache_lang_hash ON rag_answer_cache(language, question_hash);"
+    )
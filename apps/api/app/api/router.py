@@ -1,9 +1,15 @@
 from fastapi import APIRouter
+from app.api.routes.admin import router as admin_router
 from app.api.routes.health import router as health_router
 from app.api.routes.chat import router as chat_router
 from app.api.routes.tools import router as tools_router
+from app.api.routes.kb import router as kb_router
+from app.api.routes.metrics import router as metrics_router
 
 api_router = APIRouter()
 api_router.include_router(health_router, tags=["health"])
 api_router.include_router(chat_router, prefix="/chat", tags=["chat"])
 api_router.include_router(tools_router, tags=["tools"])
+api_router.include_router(kb_router, tags=["kb"])
+api_router.include_router(metrics_router, tags=["metrics"])
+api_router.include_router(admin_router, tags=["admin"])
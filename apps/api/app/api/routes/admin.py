@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.core import profiling
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not profiling.admin_token():
+        raise HTTPException(status_code=404, detail="Not Found")  # admin routes are off without ADMIN_TOKEN
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def list_profiles(limit: int = Query(default=50, ge=1, le=500)):
+    """Stored request/ingest profiles, newest first (see app.core.profiling)."""
+    return {"enabled": profiling.enabled(), "profiles": profiling.list_profiles(limit)}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str | None = Query(default=None, pattern="^(folded|prof|json)$")):
+    """The profile itself: folded stacks (sample mode) or cProfile stats; format=json for its metadata."""
+    found = profiling.profile_file(profile_id, format)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path, media_type = found
+    return FileResponse(path, media_type=media_type, filename=path.name)
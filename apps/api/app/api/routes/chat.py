@@ -1,9 +1,14 @@
+import json
+
 from fastapi import APIRouter, Depends
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-from sqlalchemy.orm import Session
-from app.db.deps import get_db
-from app.services.chat_service import handle_chat
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.deps import get_async_db
+from app.db.session import AsyncSessionLocal
+from app.services import answer_cache
+from app.services.chat_service import handle_chat, handle_chat_batch, handle_chat_stream
 
 router = APIRouter()
 
@@ -19,8 +24,8 @@ class ChatRequest(BaseModel):
         return self.external_id or self.user_id or "unknown:anonymous"
 
 @router.post("")
-def chat(req: ChatRequest, db: Session = Depends(get_db)):
-    return handle_chat(
+async def chat(req: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    return await handle_chat(
         db=db,
         external_id=req.resolved_external_id(),
         channel=req.channel,
@@ -28,3 +33,59 @@ def chat(req: ChatRequest, db: Session = Depends(get_db)):
         language=req.language,
         conversation_ref=req.conversation_ref,
     )
+
+class ChatBatchRequest(BaseModel):
+    messages: list[ChatRequest] = Field(..., min_length=1, max_length=500)
+
+@router.post("/batch")
+async def chat_batch(req: ChatBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Many messages in one request (web channel, replay jobs). `results` has
+    one entry per message, in order, each with `ok`; failed messages carry
+    an `error` and do not affect the others.
+    """
+    results = await handle_chat_batch(
+        db,
+        [
+            dict(
+                external_id=m.resolved_external_id(),
+                channel=m.channel,
+                message=m.message,
+                language=m.language,
+                conversation_ref=m.conversation_ref,
+            )
+            for m in req.messages
+        ],
+    )
+    return {"results": results, "failed": sum(not r["ok"] for r in results)}
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    NDJSON stream of chat events (one JSON object per line), see
+    chat_service.handle_chat_stream for the event shapes.
+    """
+
+    async def events():
+        # The session is opened here rather than via Depends: dependency
+        # teardown runs before a streaming body is sent.
+        async with AsyncSessionLocal() as db:
+            try:
+                async for event in handle_chat_stream(
+                    db=db,
+                    external_id=req.resolved_external_id(),
+                    channel=req.channel,
+                    message=req.message,
+                    language=req.language,
+                    conversation_ref=req.conversation_ref,
+                ):
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "message": f"{type(e).__name__}: {e}"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/cache/stats")
+async def answer_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    """Answer cache hit ratio and generation latency saved."""
+    return await answer_cache.stats(db)
@@ -1,18 +1,36 @@
 from fastapi import APIRouter
-import os 
+from fastapi.responses import JSONResponse
 
-from app.core.checks import check_postgres, check_redis
+from app.core import health as monitor
+from app.core.llm_client import pool_stats
 
 router = APIRouter()
 
+# All three routes read cached probe results (app.core.health); none of
+# them touches a dependency, so they are safe to poll every second.
+
 @router.get("/health")
 async def health():
-    db_ok, db_msg = await check_postgres(os.getenv("DATABASE_URL", ""))
-    redis_ok, redis_msg = await check_redis(os.getenv("REDIS_URL", ""))
-
-    status = "ok" if db_ok and redis_ok else "degraded"
+    checks = monitor.snapshot()
     return {
-        "status": status,
-        "database": {"status": "ok" if db_ok else "error", "message": db_msg},
-        "redis": {"status": "ok" if redis_ok else "error", "message": redis_msg},
-    }
\ No newline at end of file
+        "status": "ok" if monitor.ready(checks) else "degraded",
+        "database": checks.get("database"),
+        "redis": checks.get("redis"),
+        "checks": checks,
+        "llm_pool": pool_stats(),
+    }
+
+@router.get("/health/live")
+async def live():
+    """The process is up and its event loop is serving requests."""
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+async def ready():
+    """200 when every required dependency passed its last probe, else 503."""
+    checks = monitor.snapshot()
+    is_ready = monitor.ready(checks)
+    return JSONResponse(
+        {"status": "ready" if is_ready else "not_ready", "checks": checks},
+        status_code=200 if is_ready else 503,
+    )
@@ -0,0 +1,38 @@
+import os
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.routes.admin import require_admin
+from app.core.celery_client import get_celery
+from app.rag import ingest_progress
+from app.schemas.kb import IngestRequest, IngestRunResponse
+
+# Ingest runs read server paths and spend embedding quota: admin only
+router = APIRouter(prefix="/kb", dependencies=[Depends(require_admin)])
+
+def _kb_root() -> str:
+    return os.path.realpath(os.getenv("KB_INGEST_ROOT", "/app/kb"))
+
+def _resolve_kb_path(kb_path: str | None) -> str:
+    """kb_path as an absolute path, which must be KB_INGEST_ROOT or a folder under it."""
+    root = _kb_root()
+    path = os.path.realpath(os.path.join(root, kb_path or root))  # relative paths start at the root
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=400, detail=f"kb_path must be inside {root}")
+    return path
+
+@router.post("/ingest", response_model=IngestRunResponse, status_code=202)
+async def start_ingest(req: IngestRequest):
+    kb_path = _resolve_kb_path(req.kb_path)
+    run_id = str(uuid4())
+    state = await ingest_progress.create(run_id, kb_path)
+    get_celery().send_task("worker.tasks.kb.ingest_run", args=[run_id, kb_path])
+    return IngestRunResponse(**state)
+
+@router.get("/ingest/{run_id}", response_model=IngestRunResponse)
+async def get_ingest(run_id: str):
+    state = await ingest_progress.get(run_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Ingest run not found")
+    return IngestRunResponse(**state)
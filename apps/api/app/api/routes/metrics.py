@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format; see app.core.metrics for what is recorded."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,22 +1,33 @@
+from dataclasses import asdict
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.deps import get_db
+from app.db import unit_of_work
+from app.db.deps import get_async_db
 from app.schemas.tools import (
     CreateTicketRequest,
+    CreateTicketsRequest,
+    CreateTicketsResponse,
     TicketResponse,
+    TicketResult,
     LookupOrderResponse,
+    LookupOrdersRequest,
+    LookupOrdersResponse,
     ScheduleCallbackRequest,
+    ScheduleCallbacksRequest,
+    ScheduleCallbacksResponse,
     CallbackResponse,
+    CallbackResult,
     HandoffRequest,
 )
-from app.services import tools_service
+from app.services import tools_service, write_behind
 
 router = APIRouter(prefix="/tools")
 
 @router.post("/create_ticket", response_model=TicketResponse)
-def create_ticket(req: CreateTicketRequest, db: Session = Depends(get_db)):
-    ticket = tools_service.create_ticket(
+async def create_ticket(req: CreateTicketRequest, db: AsyncSession = Depends(get_async_db)):
+    ticket = await tools_service.create_ticket(
         db=db,
         external_id=req.external_id,
         channel=req.channel,
@@ -27,38 +38,73 @@ def create_ticket(req: CreateTicketRequest, db: Session = Depends(get_db)):
         status="open",
         conversation_ref=req.conversation_ref,
     )
+    await unit_of_work.commit(db)
     return TicketResponse(ticket_id=ticket.id, status=ticket.status)
 
+@router.post("/create_ticket/batch", response_model=CreateTicketsResponse)
+async def create_tickets(req: CreateTicketsRequest, db: AsyncSession = Depends(get_async_db)):
+    """Many tickets in one INSERT; a ticket that fails is reported in its result, the rest are created."""
+    created = await tools_service.create_tickets(db, [t.model_dump() | {"status": "open"} for t in req.tickets])
+    await unit_of_work.commit(db)
+    results = [
+        TicketResult(ok=False, error=error) if error else TicketResult(ok=True, ticket_id=ticket.id, status=ticket.status)
+        for ticket, error in created
+    ]
+    return CreateTicketsResponse(results=results, failed=sum(not r.ok for r in results))
+
 @router.get("/lookup_order/{order_id}", response_model=LookupOrderResponse)
-def lookup_order(order_id: str, db: Session = Depends(get_db)):
-    order = tools_service.lookup_order(db, order_id)
+async def lookup_order(order_id: str, db: AsyncSession = Depends(get_async_db)):
+    order = await tools_service.lookup_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return LookupOrderResponse(
-        order_id=order.order_id,
-        status=order.status,
-        delivery_area=order.delivery_area,
-        items=order.items,
+    return LookupOrderResponse(**asdict(order))
+
+@router.post("/lookup_order", response_model=LookupOrdersResponse)
+async def lookup_orders(req: LookupOrdersRequest, db: AsyncSession = Depends(get_async_db)):
+    """Several orders at once: cache first, then one query for the rest."""
+    orders = await tools_service.lookup_orders(db, req.order_ids)
+    return LookupOrdersResponse(
+        orders=[LookupOrderResponse(**asdict(order)) for order in orders.values() if order],
+        not_found=[order_id for order_id, order in orders.items() if not order],
     )
 
 @router.post("/schedule_callback", response_model=CallbackResponse)
-def schedule_callback(req: ScheduleCallbackRequest, db: Session = Depends(get_db)):
-    cb = tools_service.schedule_callback(
+async def schedule_callback(req: ScheduleCallbackRequest, db: AsyncSession = Depends(get_async_db)):
+    cb = await tools_service.schedule_callback(
         db=db,
         external_id=req.external_id,
         channel=req.channel,
         language=req.language,
         scheduled_time=req.scheduled_time,
     )
+    await unit_of_work.commit(db)
     return CallbackResponse(callback_id=cb.id, status=cb.status, scheduled_time=cb.scheduled_time)
 
+@router.post("/schedule_callback/batch", response_model=ScheduleCallbacksResponse)
+async def schedule_callbacks(req: ScheduleCallbacksRequest, db: AsyncSession = Depends(get_async_db)):
+    scheduled = await tools_service.schedule_callbacks(db, [c.model_dump() for c in req.callbacks])
+    await unit_of_work.commit(db)
+    results = [
+        CallbackResult(ok=False, error=error)
+        if error
+        else CallbackResult(ok=True, callback_id=cb.id, status=cb.status, scheduled_time=cb.scheduled_time)
+        for cb, error in scheduled
+    ]
+    return ScheduleCallbacksResponse(results=results, failed=sum(not r.ok for r in results))
+
 @router.post("/handoff_to_human")
-def handoff_to_human(req: HandoffRequest, db: Session = Depends(get_db)):
-    ticket = tools_service.handoff_to_human(
+async def handoff_to_human(req: HandoffRequest, db: AsyncSession = Depends(get_async_db)):
+    ticket = await tools_service.handoff_to_human(
         db=db,
         external_id=req.external_id,
         channel=req.channel,
         language=req.language,
         reason=req.reason,
     )
+    await unit_of_work.commit(db)
     return {"status": "escalated", "ticket_id": str(ticket.id)}
+
+@router.get("/write_behind/stats")
+async def write_behind_stats():
+    """Backlog of queued ticket/callback writes (WRITE_BEHIND_ENABLED)."""
+    return {"enabled": write_behind.enabled(), "backlog": await write_behind.backlog()}
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+
+from celery import Celery
+
+@lru_cache(maxsize=1)
+def get_celery() -> Celery:
+    """Producer-only client: the API enqueues worker tasks by name and never imports them."""
+    url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    return Celery("api", broker=url, backend=url)
@@ -1,27 +1,66 @@
+"""
+Dependency probes for app.core.health. They reuse the application's engine,
+Redis client and LLM client (no per-probe pools or connections) and are
+fully async, so a probe never blocks the event loop. Each returns
+(ok, message) and raises nothing.
+"""
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+import os
+from typing import Tuple
 
-from sqlalchemy import create_engine, text
-import redis as redis_lib
+from sqlalchemy import select, text
 
-async def check_postgres(database_url: str) -> Tuple[bool, str]:
-    if not database_url:
-        return False, "DATABASE_URL not provided"
+from app.core.llm_client import aping
+from app.core.redis_client import get_async_redis
+from app.db.models import KBGeneration
+from app.db.session import async_engine
+
+def _error(e: Exception) -> str:
+    # First line only: driver messages run on with hints and doc links
+    lines = str(e).strip().splitlines()
+    return f"{type(e).__name__}: {lines[0] if lines else ''}"[:300]
+
+async def check_postgres() -> Tuple[bool, str]:
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        return True, "ok"
+    except Exception as e:
+        return False, _error(e)
+
+async def check_redis() -> Tuple[bool, str]:
+    r = get_async_redis()
+    if r is None:
+        # get_async_redis() stays None for the process when the startup ping failed
+        return False, "unreachable at startup" if os.getenv("REDIS_URL") else "REDIS_URL not provided"
     try:
-        engine = create_engine(database_url, pool_pre_ping=True)
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
+        await r.ping()
         return True, "ok"
     except Exception as e:
-        return False, f"{type(e).__name__}: {str(e)}"
-    
-async def check_redis(redis_url: str) -> Tuple[bool, str]:
-    if not redis_url:
-        return False, "REDIS_URL not provided"
+        return False, _error(e)
+
+async def check_vector_index() -> Tuple[bool, str]:
+    """An active KB generation exists and all of its HNSW indexes are valid."""
+    from app.rag.generations import invalid_indexes
+
+    try:
+        async with async_engine.connect() as connection:
+            active = await connection.scalar(select(KBGeneration.id).where(KBGeneration.status == "active"))
+            if active is None:
+                return False, "no active KB generation"
+            invalid = await connection.run_sync(invalid_indexes, active)
+        if invalid:
+            return False, f"generation {active}: missing or invalid indexes: {', '.join(invalid)}"
+        return True, f"generation {active}"
+    except Exception as e:
+        return False, _error(e)
+
+async def check_llm(timeout: float) -> Tuple[bool, str]:
+    if not os.getenv("OPENAI_API_KEY"):
+        return False, "OPENAI_API_KEY not provided"
     try:
-        client = redis_lib.from_url(redis_url, decode_responses=True)
-        client.ping()
+        await aping(timeout=timeout)
         return True, "ok"
     except Exception as e:
-        return False, f"{type(e).__name__}: {str(e)}"
\ No newline at end of file
+        return False, _error(e)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from redis.exceptions import RedisError
+
+from app.core.llm_client import aembed_texts, embed_texts
+from app.core.redis_client import get_async_redis_bytes, get_redis_bytes
+
+# Two tiers: a per-process LRU in front of a shared Redis tier. Keys are
+# content-addressed by (model, dimension, hash of normalized text), so a
+# model or dimension change never serves stale vectors. The LRU holds packed
+# float32 arrays (4 bytes per component instead of a boxed float each).
+
+_lru: "OrderedDict[str, array]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+def _model() -> str:
+    return os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+
+def _dim() -> int:
+    return int(os.getenv("EMBEDDING_DIM", "1536"))
+
+def _lru_size() -> int:
+    return int(os.getenv("EMBEDDING_CACHE_LRU_SIZE", "2048"))
+
+def _ttl_seconds() -> int:
+    return int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+def _dtype_code() -> str:
+    # float16 halves Redis memory; the precision loss is far below retrieval noise
+    return "e" if os.getenv("EMBEDDING_CACHE_DTYPE", "float32") == "float16" else "f"
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def cache_key(text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"emb:{_model()}:{_dim()}:{_dtype_code()}:{digest}"
+
+def pack_vector(vec: Sequence[float]) -> bytes:
+    return struct.pack(f"<{len(vec)}{_dtype_code()}", *vec)
+
+def unpack_vector(raw: bytes) -> List[float]:
+    code = _dtype_code()
+    return list(struct.unpack(f"<{len(raw) // struct.calcsize(code)}{code}", raw))
+
+def _lru_get(key: str) -> Optional[List[float]]:
+    with _lru_lock:
+        packed = _lru.get(key)
+        if packed is None:
+            return None
+        _lru.move_to_end(key)
+    return packed.tolist()
+
+def _lru_put(key: str, vec: Sequence[float]) -> None:
+    packed = array("f", vec)
+    with _lru_lock:
+        _lru[key] = packed
+        _lru.move_to_end(key)
+        while len(_lru) > _lru_size():
+            _lru.popitem(last=False)
+
+def _split_hits(texts: Sequence[str]) -> tuple[List[str], Dict[str, List[float]]]:
+    keys = [cache_key(t) for t in texts]
+    found: Dict[str, List[float]] = {}
+    for k in keys:
+        vec = _lru_get(k)
+        if vec is not None:
+            found[k] = vec
+    return keys, found
+
+def embed_texts_cached(texts: Sequence[str]) -> List[List[float]]:
+    keys, found = _split_hits(texts)
+
+    r = get_redis_bytes()
+    pending = [k for k in dict.fromkeys(keys) if k not in found]
+    if r and pending:
+        try:
+            for k, raw in zip(pending, r.mget(pending)):
+                if raw:
+                    found[k] = unpack_vector(raw)
+                    _lru_put(k, found[k])
+        except RedisError:
+            r = None  # shared tier unavailable; fall through to the provider
+
+    todo = {k: t for t, k in zip(texts, keys) if k not in found}
+    if todo:
+        vecs = embed_texts(list(todo.values()))
+        fresh = dict(zip(todo.keys(), vecs))
+        found.update(fresh)
+        for k, v in fresh.items():
+            _lru_put(k, v)
+        if r:
+            try:
+                with r.pipeline(transaction=False) as pipe:
+                    for k, v in fresh.items():
+                        pipe.set(k, pack_vector(v), ex=_ttl_seconds())
+                    pipe.execute()
+            except RedisError:
+                pass  # the vectors are still returned; only the shared tier misses them
+
+    return [found[k] for k in keys]
+
+async def aembed_texts_cached(texts: Sequence[str]) -> List[List[float]]:
+    keys, found = _split_hits(texts)
+
+    r = get_async_redis_bytes()
+    pending = [k for k in dict.fromkeys(keys) if k not in found]
+    if r and pending:
+        try:
+            for k, raw in zip(pending, await r.mget(pending)):
+                if raw:
+                    found[k] = unpack_vector(raw)
+                    _lru_put(k, found[k])
+        except RedisError:
+            r = None  # shared tier unavailable; fall through to the provider
+
+    todo = {k: t for t, k in zip(texts, keys) if k not in found}
+    if todo:
+        vecs = await aembed_texts(list(todo.values()))
+        fresh = dict(zip(todo.keys(), vecs))
+        found.update(fresh)
+        for k, v in fresh.items():
+            _lru_put(k, v)
+        if r:
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    for k, v in fresh.items():
+                        pipe.set(k, pack_vector(v), ex=_ttl_seconds())
+                    await pipe.execute()
+            except RedisError:
+                pass  # the vectors are still returned; only the shared tier misses them
+
+    return [found[k] for k in keys]
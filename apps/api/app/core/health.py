@@ -0,0 +1,123 @@
+"""
+Background health monitor. Each dependency is probed on its own interval
+by a task started with the app (app.core.checks); /health, /health/live
+and /health/ready only read the cached results, so load balancer probes
+never open connections or wait on a dependency.
+
+Readiness needs Postgres, an active KB generation with valid HNSW indexes
+and the LLM provider, plus Redis when REDIS_URL is set. A result older than
+a few probe intervals counts as failed, so a stuck probe cannot keep a
+replica ready.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core import checks
+
+log = logging.getLogger(__name__)
+
+def _interval_seconds() -> float:
+    return float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+
+def _llm_interval_seconds() -> float:
+    # Provider calls are rate-limited and billed per request: probe less often
+    return float(os.getenv("HEALTH_LLM_PROBE_INTERVAL_SECONDS", "60"))
+
+def _timeout_seconds() -> float:
+    return float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "3"))
+
+@dataclass(frozen=True)
+class ProbeResult:
+    ok: bool
+    message: str
+    checked_at: float  # time.time()
+    latency_ms: int
+
+@dataclass(frozen=True)
+class Probe:
+    name: str
+    run: Callable[[], Awaitable[Tuple[bool, str]]]
+    interval: float
+    required: bool
+
+def _probes() -> List[Probe]:
+    interval = _interval_seconds()
+    return [
+        Probe("database", checks.check_postgres, interval, True),
+        Probe("redis", checks.check_redis, interval, bool(os.getenv("REDIS_URL"))),
+        Probe("vector_index", checks.check_vector_index, interval, True),
+        Probe("llm", partial(checks.check_llm, _timeout_seconds()), _llm_interval_seconds(), True),
+    ]
+
+_results: Dict[str, ProbeResult] = {}
+_tasks: List[asyncio.Task] = []
+_probe_list: List[Probe] = []
+
+async def _probe_once(probe: Probe) -> None:
+    timeout = _timeout_seconds()
+    started = time.perf_counter()
+    try:
+        ok, message = await asyncio.wait_for(probe.run(), timeout)
+    except asyncio.TimeoutError:
+        ok, message = False, f"timed out after {timeout:g}s"
+    result = ProbeResult(ok, message, time.time(), int((time.perf_counter() - started) * 1000))
+    previous = _results.get(probe.name)
+    if previous is not None and previous.ok != ok:
+        log.warning("health: %s is now %s (%s)", probe.name, "ok" if ok else "failing", message)
+    _results[probe.name] = result
+
+async def _loop(probe: Probe) -> None:
+    while True:
+        try:
+            await _probe_once(probe)
+        except Exception:
+            log.exception("health probe %s crashed", probe.name)
+        await asyncio.sleep(probe.interval)
+
+def start() -> None:
+    """Start one probing task per dependency (called from the app lifespan)."""
+    if _tasks:
+        return
+    _probe_list[:] = _probes()
+    for probe in _probe_list:
+        _tasks.append(asyncio.create_task(_loop(probe), name=f"health:{probe.name}"))
+
+async def stop() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+def _stale(probe: Probe, result: ProbeResult, now: float) -> bool:
+    return now - result.checked_at > 3 * probe.interval + _timeout_seconds()
+
+def snapshot() -> Dict[str, dict]:
+    """Last result per dependency; 'pending' until its first probe finished."""
+    now = time.time()
+    out = {}
+    for probe in _probe_list:
+        result: Optional[ProbeResult] = _results.get(probe.name)
+        if result is None:
+            out[probe.name] = {"status": "pending", "required": probe.required}
+            continue
+        status = "ok" if result.ok else "error"
+        if _stale(probe, result, now):
+            status = "stale"
+        out[probe.name] = {
+            "status": status,
+            "message": result.message,
+            "age_seconds": round(now - result.checked_at, 1),
+            "latency_ms": result.latency_ms,
+            "required": probe.required,
+        }
+    return out
+
+def ready(states: Dict[str, dict]) -> bool:
+    return bool(_tasks) and all(s["status"] == "ok" for s in states.values() if s["required"])
@@ -1,23 +1,203 @@
+import math
 import os
-from openai import OpenAI
+import weakref
+from functools import lru_cache
+from typing import AsyncIterator
 
+import httpx
+from openai import NOT_GIVEN, AsyncOpenAI, OpenAI
+
+from app.core import metrics
+
+# One client (and one HTTP connection pool) per process, shared by the API and
+# the ingestion CLI, so provider calls reuse warm TLS connections.
+
+_pool_stats = {
+    "sync": {"requests": 0, "connections_opened": 0},
+    "async": {"requests": 0, "connections_opened": 0},
+}
+# Network stream of every open connection that served a response. Weak, so a
+# closed connection drops out instead of its id() being reused by a new one.
+_seen_streams: dict[str, weakref.WeakSet] = {"sync": weakref.WeakSet(), "async": weakref.WeakSet()}
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60")),
+    )
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+        connect=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")),
+    )
+
+def _http2() -> bool:
+    # Needs the `h2` package
+    return os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+def _chat_timeout():
+    v = os.getenv("LLM_CHAT_TIMEOUT_SECONDS")
+    return float(v) if v else NOT_GIVEN
+
+def _embed_timeout():
+    v = os.getenv("LLM_EMBED_TIMEOUT_SECONDS")
+    return float(v) if v else NOT_GIVEN
+
+def _record(kind: str, response: httpx.Response) -> None:
+    stats = _pool_stats[kind]
+    stats["requests"] += 1
+    stream = response.extensions.get("network_stream")
+    if stream is None or stream in _seen_streams[kind]:
+        return
+    try:
+        _seen_streams[kind].add(stream)
+    except TypeError:
+        return  # a transport whose streams can't be weakly referenced: not counted
+    stats["connections_opened"] += 1
+
+def _on_response(response: httpx.Response) -> None:
+    _record("sync", response)
+
+async def _on_response_async(response: httpx.Response) -> None:
+    _record("async", response)
+
+@lru_cache(maxsize=1)
 def get_client() -> OpenAI:
     return OpenAI(
         api_key=os.getenv("OPENAI_API_KEY"),
         base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=httpx.Client(
+            limits=_limits(),
+            timeout=_timeout(),
+            http2=_http2(),
+            event_hooks={"response": [_on_response]},
+        ),
     )
 
-def generate_answer(prompt: str) -> str:
-    client = get_client()
-    model = os.getenv("CHAT_MODEL", "gemini-3-flash-preview")
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
+@lru_cache(maxsize=1)
+def get_async_client() -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=httpx.AsyncClient(
+            limits=_limits(),
+            timeout=_timeout(),
+            http2=_http2(),
+            event_hooks={"response": [_on_response_async]},
+        ),
     )
+
+def _pool_connections(http_client) -> dict:
+    # The OpenAI client's httpx client, its transport and httpcore's pool are
+    # all private: any of them missing just reports an empty pool.
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    conns = list(getattr(pool, "connections", None) or [])
+    idle = sum(1 for c in conns if getattr(c, "is_idle", lambda: False)())
+    return {"open_connections": len(conns), "idle_connections": idle}
+
+def pool_stats() -> dict:
+    out = {}
+    for kind, factory in (("sync", get_client), ("async", get_async_client)):
+        stats = dict(_pool_stats[kind])
+        stats["reused"] = max(0, stats["requests"] - stats["connections_opened"])
+        if factory.cache_info().currsize:
+            stats.update(_pool_connections(getattr(factory(), "_client", None)))
+        out[kind] = stats
+    return out
+
+async def aclose_clients() -> None:
+    if get_async_client.cache_info().currsize:
+        await get_async_client().close()
+        get_async_client.cache_clear()
+
+def _chat_model() -> str:
+    return os.getenv("CHAT_MODEL", "gemini-3-flash-preview")
+
+def _embedding_model() -> str:
+    return os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+
+def _embedding_dim() -> int:
+    return int(os.getenv("EMBEDDING_DIM", "1536"))
+
+def _request_dimensions():
+    # Ask the provider for EMBEDDING_DIM outputs directly (OpenAI text-embedding-3,
+    # Gemini); otherwise full-size vectors are truncated locally.
+    if os.getenv("EMBEDDING_REQUEST_DIMENSIONS", "false").lower() in ("1", "true", "yes"):
+        return _embedding_dim()
+    return NOT_GIVEN
+
+def _fit_dimensions(vec: list[float]) -> list[float]:
+    """
+    Matryoshka-style reduction: keep the first EMBEDDING_DIM components and
+    re-normalize to unit length (reduced outputs are not unit length).
+    """
+    dim = _embedding_dim()
+    if len(vec) < dim:
+        raise ValueError(f"Embedding has {len(vec)} dimensions, EMBEDDING_DIM is {dim}")
+    if len(vec) == dim and _request_dimensions() is NOT_GIVEN:
+        return vec
+    vec = vec[:dim]
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+def generate_answer(prompt: str, timeout: float | None = None) -> str:
+    client = get_client()
+    with metrics.stage("generate"):
+        resp = client.chat.completions.create(
+            model=_chat_model(),
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout if timeout is not None else _chat_timeout(),
+        )
     return resp.choices[0].message.content or ""
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def embed_texts(texts: list[str], timeout: float | None = None) -> list[list[float]]:
     client = get_client()
-    model = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
-    resp = client.embeddings.create(model=model, input=texts)
-    return [d.embedding for d in resp.data]
+    with metrics.stage("embed"):
+        resp = client.embeddings.create(
+            model=_embedding_model(),
+            input=texts,
+            dimensions=_request_dimensions(),
+            timeout=timeout if timeout is not None else _embed_timeout(),
+        )
+    return [_fit_dimensions(d.embedding) for d in resp.data]
+
+async def aping(timeout: float | None = None) -> None:
+    """Cheapest authenticated provider call (no tokens used): look up the embedding model."""
+    await get_async_client().models.retrieve(_embedding_model(), timeout=timeout)
+
+async def agenerate_answer(prompt: str, timeout: float | None = None) -> str:
+    client = get_async_client()
+    with metrics.stage("generate"):
+        resp = await client.chat.completions.create(
+            model=_chat_model(),
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout if timeout is not None else _chat_timeout(),
+        )
+    return resp.choices[0].message.content or ""
+
+async def astream_answer(prompt: str, timeout: float | None = None) -> AsyncIterator[str]:
+    client = get_async_client()
+    # Request to last token, including time the consumer spends between tokens
+    with metrics.stage("generate"):
+        stream = await client.chat.completions.create(
+            model=_chat_model(),
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            timeout=timeout if timeout is not None else _chat_timeout(),
+        )
+        async for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+async def aembed_texts(texts: list[str], timeout: float | None = None) -> list[list[float]]:
+    client = get_async_client()
+    with metrics.stage("embed"):
+        resp = await client.embeddings.create(
+            model=_embedding_model(),
+            input=texts,
+            dimensions=_request_dimensions(),
+            timeout=timeout if timeout is not None else _embed_timeout(),
+        )
+    return [_fit_dimensions(d.embedding) for d in resp.data]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Set
+
+# Latin-script keywords match on word boundaries with a few common English
+# suffixes allowed ("orders", "tracking", "refunded"), so "pin" no longer fires
+# inside "shipping". Ethiopic keywords keep substring semantics because Amharic
+# attaches prefixes/suffixes to the stem ("የትዕዛዝ", "ችግሩ").
+_LATIN_SUFFIX = r"(?:s|es|ed|ing)?"
+_LATIN_START = re.compile(r"\b")
+_LATIN_END = re.compile(_LATIN_SUFFIX + r"\b")
+
+
+def _is_ethiopic(word: str) -> bool:
+    return any(0x1200 <= ord(ch) <= 0x139F for ch in word)
+
+
+def _build_trie(words: Iterable[str]) -> Dict:
+    """Character trie; the "" key marks the end of a word and holds the word."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = w
+    return trie
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """
+    Build a regex alternation shaped like a trie, so the engine walks shared
+    prefixes once instead of trying every keyword at every position.
+    """
+    trie = _build_trie(words)
+
+    def _render(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + _render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if terminal else body
+
+    return _render(trie)
+
+
+class KeywordMatcher:
+    """
+    Compiled multi-keyword matcher.
+
+    `labels` maps a label (intent name) to its keywords. `match(text)` returns
+    every label with at least one keyword in the text. One regex scan finds
+    the positions where some keyword starts; the regex only reports the
+    longest one there, so each position is then walked down the trie to
+    collect every keyword ending on the path ("card" as well as "card
+    number").
+    """
+
+    def __init__(self, labels: Mapping[str, Iterable[str]]) -> None:
+        self._labels_by_keyword: Dict[str, Set[str]] = {}
+        for label, keywords in labels.items():
+            for k in keywords:
+                k = k.strip().lower()
+                if k:
+                    self._labels_by_keyword.setdefault(k, set()).add(label)
+
+        latin = [k for k in self._labels_by_keyword if not _is_ethiopic(k)]
+        ethiopic = [k for k in self._labels_by_keyword if _is_ethiopic(k)]
+
+        alternatives: List[str] = []
+        if latin:
+            alternatives.append(r"\b(?P<latin>" + _trie_regex(latin) + ")" + _LATIN_SUFFIX + r"\b")
+        if ethiopic:
+            alternatives.append("(?P<ethiopic>" + _trie_regex(ethiopic) + ")")
+
+        # Zero-width lookahead so overlapping keywords of different labels are
+        # all reported; one finditer still scans the text once.
+        self._re = re.compile("(?=" + "|".join(alternatives) + ")") if alternatives else None
+        self._trie = _build_trie(self._labels_by_keyword)
+
+    def match(self, text: str) -> FrozenSet[str]:
+        if self._re is None or not text:
+            return frozenset()
+        text = text.lower()
+        found: Set[str] = set()
+        for m in self._re.finditer(text):
+            found.update(self._labels_at(text, m.start()))
+        return frozenset(found)
+
+    def _labels_at(self, text: str, start: int) -> Set[str]:
+        labels: Set[str] = set()
+        node = self._trie
+        for end in range(start, len(text) + 1):
+            keyword = node.get("")
+            if keyword is not None and (
+                _is_ethiopic(keyword)
+                or (_LATIN_START.match(text, start) and _LATIN_END.match(text, end))
+            ):
+                labels.update(self._labels_by_keyword[keyword])
+            if end == len(text):
+                break
+            node = node.get(text[end])
+            if node is None:
+                break
+        return labels
+
+
+def _contains_any(text: str, keywords: Iterable[str]) -> bool:
+    """
+    Per-table substring scan that KeywordMatcher replaced; the baseline of
+    scripts/dev/bench_intents.py.
+    """
+    t = text.lower()
+    return any(k.lower() in t for k in keywords)
+
+
+# ---- chat intents ----
+
+PAYMENT_LABEL = "payment"
+
+PAYMENT_KEYWORDS = [
+    # English
+    "credit card", "debit card", "card number", "cvv", "cvc", "pin", "otp", "password",
+    "bank transfer", "account number", "wire", "swift",
+    "telebirr", "mpesa", "paypal",
+    # Amharic (best-effort keywords)
+    "ካርድ", "ፒን", "ፓስወርድ", "የባንክ መለያ", "ቴሌብር", "ኦቲፒ", "otp",
+]
+
+ORDER_KEYWORDS_EN = ["order", "status", "track", "delivery status"]
+ORDER_KEYWORDS_AM = ["ትዕዛዝ", "ኦርደር", "ሁኔታ", "ትራክ", "መድረስ"]
+
+TICKET_KEYWORDS_EN = ["complaint", "issue", "problem", "return", "refund", "broken", "wrong item"]
+TICKET_KEYWORDS_AM = ["ቅሬታ", "ችግር", "ችግኝ", "መመለስ", "ተሳሳተ", "ተሰብሯል"]
+
+CALLBACK_KEYWORDS_EN = ["call me", "callback", "phone", "ring me"]
+CALLBACK_KEYWORDS_AM = ["ደውሉልኝ", "መመለሻ ጥሪ", "ስልክ", "ይደውሉ"]
+
+HUMAN_KEYWORDS_EN = ["human", "agent", "representative", "support person"]
+HUMAN_KEYWORDS_AM = ["ሰው", "ሰራተኛ", "ኤጀንት", "ተወካይ"]
+
+# One compiled matcher for every intent plus the safety gate, built at import.
+INTENT_MATCHER = KeywordMatcher(
+    {
+        PAYMENT_LABEL: PAYMENT_KEYWORDS,
+        "human": HUMAN_KEYWORDS_EN + HUMAN_KEYWORDS_AM,
+        "order": ORDER_KEYWORDS_EN + ORDER_KEYWORDS_AM,
+        "callback": CALLBACK_KEYWORDS_EN + CALLBACK_KEYWORDS_AM,
+        "ticket": TICKET_KEYWORDS_EN + TICKET_KEYWORDS_AM,
+    }
+)
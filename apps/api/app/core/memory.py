@@ -1,35 +1,138 @@
 from __future__ import annotations
 
 import json
+import logging
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
-import redis as redis_lib
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.redis_client import get_redis
+from app.core import metrics
+from app.core.redis_client import get_async_redis
+from app.db import unit_of_work
+
+log = logging.getLogger(__name__)
+
+HISTORY_MAX_TURNS = 20
+
+def _conv_key(external_id: str) -> str:
+    return f"conv:{external_id}"
+
+def _profile_key(external_id: str) -> str:
+    return f"profile:{external_id}"
+
+def _turn_payload(role: str, content: str, ts: datetime) -> str:
+    return json.dumps({"role": role, "content": content, "ts": ts.isoformat()})
+
+class MemoryTurn:
+    """
+    Unit of work for one chat request.
+
+    Reads are served from a profile snapshot loaded in one round-trip on
+    enter; writes are buffered and sent in one MULTI/EXEC pipeline. With a
+    DB session they are sent once the turn's transaction commits (see
+    app.db.unit_of_work), so the history never mentions a ticket that was
+    rolled back; without one, on exit. A turn that raised writes nothing.
+    Memory is best effort: when Redis fails, the turn runs without it.
+    """
+
+    def __init__(
+        self, redis_client: Optional[aioredis.Redis], external_id: str, db: Optional[AsyncSession] = None
+    ) -> None:
+        self.r = redis_client
+        self.external_id = external_id
+        self.db = db
+        self._profile: Dict[str, str] = {}
+        self._turns: List[str] = []
+        self._profile_writes: Dict[str, str] = {}
+
+    async def load(self) -> None:
+        if not self.r:
+            return
+        with metrics.stage("memory_load"):
+            try:
+                self._profile = await self.r.hgetall(_profile_key(self.external_id)) or {}
+            except RedisError:
+                log.warning("memory load failed for %s; continuing without memory", self.external_id, exc_info=True)
+                self.r = None  # don't wait on Redis again at flush
+
+    def get_profile_field(self, field: str) -> Optional[str]:
+        return self._profile.get(field)
+
+    def set_profile_field(self, field: str, value: str) -> None:
+        self._profile[field] = value
+        self._profile_writes[field] = value
+
+    def append_turn(self, role: str, content: str, ts: datetime) -> None:
+        self._turns.append(_turn_payload(role, content, ts))
+
+    async def flush(self) -> None:
+        if not self.r or not (self._turns or self._profile_writes):
+            return
+        with metrics.stage("memory_flush"):
+            try:
+                async with self.r.pipeline(transaction=True) as pipe:
+                    if self._turns:
+                        key = _conv_key(self.external_id)
+                        pipe.rpush(key, *self._turns)
+                        pipe.ltrim(key, -HISTORY_MAX_TURNS, -1)
+                    if self._profile_writes:
+                        pipe.hset(_profile_key(self.external_id), mapping=self._profile_writes)
+                    await pipe.execute()
+            except RedisError:
+                log.warning("memory flush failed for %s; turn not remembered", self.external_id, exc_info=True)
+        self._turns.clear()
+        self._profile_writes.clear()
+
+    async def __aenter__(self) -> "MemoryTurn":
+        await self.load()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            return
+        if self.db is not None:
+            unit_of_work.after_commit(self.db, self.flush)
+        else:
+            await self.flush()
 
 class MemoryStore:
-    def __init__(self, redis_client: Optional[redis_lib.Redis]) -> None:
+    def __init__(self, redis_client: Optional[aioredis.Redis]) -> None:
         self.r = redis_client
 
     @classmethod
     def from_env(cls) -> "MemoryStore":
-        return cls(get_redis())
+        return cls(get_async_redis())
 
-    def append_turn(self, external_id: str, role: str, content: str, ts: datetime) -> None:
+    def turn(self, external_id: str, db: Optional[AsyncSession] = None) -> MemoryTurn:
+        return MemoryTurn(self.r, external_id, db)
+
+    async def append_turn(self, external_id: str, role: str, content: str, ts: datetime) -> None:
         if not self.r:
             return
-        key = f"conv:{external_id}"
-        payload = json.dumps({"role": role, "content": content, "ts": ts.isoformat()})
-        self.r.rpush(key, payload)
-        self.r.ltrim(key, -20, -1)
+        key = _conv_key(external_id)
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.rpush(key, _turn_payload(role, content, ts))
+                pipe.ltrim(key, -HISTORY_MAX_TURNS, -1)
+                await pipe.execute()
+        except RedisError:
+            log.warning("memory append failed for %s", external_id, exc_info=True)
 
-    def set_profile_field(self, external_id: str, field: str, value: str) -> None:
+    async def set_profile_field(self, external_id: str, field: str, value: str) -> None:
         if not self.r:
             return
-        self.r.hset(f"profile:{external_id}", field, value)
+        try:
+            await self.r.hset(_profile_key(external_id), field, value)
+        except RedisError:
+            log.warning("memory profile write failed for %s", external_id, exc_info=True)
 
-    def get_profile_field(self, external_id: str, field: str) -> Optional[str]:
+    async def get_profile_field(self, external_id: str, field: str) -> Optional[str]:
         if not self.r:
             return None
-        return self.r.hget(f"profile:{external_id}", field)
+        try:
+            return await self.r.hget(_profile_key(external_id), field)
+        except RedisError:
+            return None
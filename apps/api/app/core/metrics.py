@@ -0,0 +1,165 @@
+"""
+Prometheus metrics for the chat pipeline, served by GET /metrics.
+
+Stage timings (Redis memory, intent matching, tool calls, embeddings, the
+vector query, answer generation) are labelled with the turn's routed_to
+and language. Those are only known at the end of a turn, so inside
+chat_turn() timings are buffered in a context variable and observed once
+the turn finishes. Outside a turn (the /tools routes, ingestion) they are
+observed immediately with empty labels. The hot path only adds a
+perf_counter() pair and a list append per stage. The language label comes
+from the client, so it is clamped to the KB languages plus "other" to keep
+the number of series bounded.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Iterator, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from app.db.vector_index import LANGUAGES
+
+_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Time spent in one stage of the chat pipeline",
+    ["stage", "routed_to", "language"],
+    buckets=_LATENCY_BUCKETS,
+)
+TURN_SECONDS = Histogram(
+    "chat_turn_seconds",
+    "Time to handle one chat turn",
+    ["routed_to", "language"],
+    buckets=_LATENCY_BUCKETS,
+)
+TOP_DISTANCE = Histogram(
+    "rag_top_distance",
+    "Cosine distance of the best retrieved chunk (RAG_MAX_DISTANCE is the no-answer cutoff)",
+    ["language"],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+NO_ANSWER = Counter("chat_no_answer_total", "Turns answered with the no-answer fallback", ["language"])
+POOL_OVERFLOW_CHECKOUTS = Counter(
+    "db_pool_overflow_checkouts_total", "Connections checked out beyond DB_POOL_SIZE", ["pool"]
+)
+POOL_SATURATED_CHECKOUTS = Counter(
+    "db_pool_saturated_checkouts_total",
+    "Checkouts that left no free connection (the next request waits for one)",
+    ["pool"],
+)
+
+@dataclass
+class _Turn:
+    routed_to: str = "error"
+    language: str = ""
+    stages: List[Tuple[str, float]] = field(default_factory=list)
+
+_turn: ContextVar[Optional[_Turn]] = ContextVar("metrics_turn", default=None)
+
+def language_label(language: Optional[str]) -> str:
+    if not language:
+        return ""
+    return language if language in LANGUAGES else "other"
+
+def record(stage: str, seconds: float) -> None:
+    turn = _turn.get()
+    if turn is None:
+        STAGE_SECONDS.labels(stage, "", "").observe(seconds)
+    else:
+        turn.stages.append((stage, seconds))
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def timed(name: str):
+    """Decorator for coroutine functions: time every call as stage `name`."""
+    def decorate(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+@contextmanager
+def chat_turn() -> Iterator[None]:
+    """Buffer stage timings until the turn's labels are known (label_turn)."""
+    turn = _Turn()
+    _turn.set(turn)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        # set(), not reset(): a streaming turn may finish in another context
+        _turn.set(None)
+        TURN_SECONDS.labels(turn.routed_to, turn.language).observe(time.perf_counter() - started)
+        for name, seconds in turn.stages:
+            STAGE_SECONDS.labels(name, turn.routed_to, turn.language).observe(seconds)
+
+def label_turn(routed_to: Optional[str] = None, language: Optional[str] = None) -> None:
+    turn = _turn.get()
+    if turn is None:
+        return
+    if routed_to is not None:
+        turn.routed_to = routed_to
+    if language is not None:
+        turn.language = language_label(language)
+
+# ---- DB pool saturation ----
+
+class _PoolCollector:
+    """Pool occupancy read at scrape time, so it costs nothing per request."""
+
+    def __init__(self) -> None:
+        self.engines = {}  # name -> (engine, configured max_overflow)
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Connections kept in the pool", labels=["pool"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"])
+        capacity = GaugeMetricFamily("db_pool_capacity", "Pool size plus allowed overflow", labels=["pool"])
+        for name, (engine, max_overflow) in self.engines.items():
+            pool = engine.pool  # re-read: dispose() replaces the pool
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            capacity.add_metric([name], pool.size() + max_overflow)
+        yield from (size, checked_out, capacity)
+
+_pools = _PoolCollector()
+REGISTRY.register(_pools)
+
+def watch_pool(name: str, engine, max_overflow: int) -> None:
+    """
+    Export occupancy of `engine`'s QueuePool, created with `max_overflow`,
+    and count overflow/saturated checkouts.
+    """
+    if not isinstance(engine.pool, QueuePool) or name in _pools.engines:
+        return  # NullPool/StaticPool: nothing to saturate
+    _pools.engines[name] = (engine, max_overflow)
+    overflow, saturated = POOL_OVERFLOW_CHECKOUTS.labels(name), POOL_SATURATED_CHECKOUTS.labels(name)
+
+    # Pool events registered on the engine carry over to the pool dispose() creates
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(*_args) -> None:
+        pool = engine.pool
+        in_use = pool.checkedout()
+        if in_use > pool.size():
+            overflow.inc()
+        if max_overflow >= 0 and in_use >= pool.size() + max_overflow:
+            saturated.inc()
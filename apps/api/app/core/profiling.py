@@ -0,0 +1,273 @@
+"""
+Opt-in profiling of single API requests and of the ingestion CLI.
+
+Two modes:
+  sample    a background thread samples the profiled thread's stack every
+            PROFILE_SAMPLE_INTERVAL_MS and writes folded stacks ("f1;f2;f3
+            count" lines) for flamegraph.pl, inferno or speedscope. Waiting
+            shows up as the event loop's selector call, CPU work as
+            everything else.
+  cprofile  deterministic cProfile stats (.prof: pstats, snakeviz, flameprof).
+
+Each profile also records wall and CPU time (cpu_ms far below wall_ms: the
+request mostly waited). A request is profiled when PROFILE_ENABLED is set
+and it either carries `X-Profile: sample|cprofile` plus a matching
+`X-Admin-Token`, or is picked at PROFILE_SAMPLE_RATE among PROFILE_PATHS.
+The event loop runs other requests while one awaits, so their frames and
+CPU time show up too; one profile runs at a time per process.
+
+Profiles go to PROFILE_DIR, whose oldest files are deleted beyond
+PROFILE_DIR_MAX_MB, and are served by the /admin/profiles routes.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+MODES = ("sample", "cprofile")
+
+# Files of a stored profile by extension: the profile itself (folded or
+# prof, depending on the mode) and <id>.json with its metadata
+FORMATS = {"folded": "text/plain; charset=utf-8", "prof": "application/octet-stream", "json": "application/json"}
+
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{9}-[0-9a-f]{8}$")
+
+def enabled() -> bool:
+    return os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def admin_token() -> str:
+    return os.getenv("ADMIN_TOKEN", "")
+
+def _sample_rate() -> float:
+    return float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+def _paths() -> List[str]:
+    return [p.strip() for p in os.getenv("PROFILE_PATHS", "/chat").split(",") if p.strip()]
+
+def _default_mode() -> str:
+    mode = os.getenv("PROFILE_MODE", "sample")
+    return mode if mode in MODES else "sample"
+
+def _interval_seconds() -> float:
+    return float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+
+def profile_dir() -> Path:
+    return Path(os.getenv("PROFILE_DIR", "/tmp/profiles"))
+
+def _max_bytes() -> int:
+    return int(float(os.getenv("PROFILE_DIR_MAX_MB", "200")) * 1024 * 1024)
+
+def is_admin(token: Optional[str]) -> bool:
+    expected = admin_token()
+    return bool(expected and token) and hmac.compare_digest(token.encode(), expected.encode())
+
+# ---- profilers ----
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class _Sampler:
+    """Counts the folded stacks of one thread, sampled from a daemon thread."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+    def start(self) -> "_Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+_running = threading.Lock()
+
+# (metadata, profiler, sampler) of a finished run, ready for _save
+_Run = Tuple[dict, Optional[cProfile.Profile], Optional[_Sampler]]
+
+@contextmanager
+def _collect(mode: str, label: str) -> Iterator[Optional[_Run]]:
+    """Profile the calling thread while the block runs; None when another profile is running."""
+    if not _running.acquire(blocking=False):
+        yield None
+        return
+    try:
+        now = datetime.now(timezone.utc)
+        info = {
+            "id": f"{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}-{uuid4().hex[:8]}",
+            "mode": mode,
+            "label": label,
+            "started_at": now.isoformat(),
+            "pid": os.getpid(),
+        }
+        profiler = cProfile.Profile() if mode == "cprofile" else None
+        sampler = None if profiler else _Sampler(threading.get_ident(), _interval_seconds())
+        wall, cpu = time.perf_counter(), time.thread_time()
+        if profiler:
+            profiler.enable()
+        else:
+            sampler.start()
+        try:
+            yield info, profiler, sampler
+        finally:
+            if profiler:
+                profiler.disable()
+            else:
+                sampler.stop()
+            info["wall_ms"] = round((time.perf_counter() - wall) * 1000, 1)
+            info["cpu_ms"] = round((time.thread_time() - cpu) * 1000, 1)
+    finally:
+        _running.release()
+
+@contextmanager
+def profile(mode: str, label: str) -> Iterator[Optional[dict]]:
+    """
+    Profile the calling thread while the block runs and save the result.
+    Yields the profile's metadata (its "id" is set up front), or None when
+    another profile is already running in this process.
+    """
+    run = None
+    try:
+        with _collect(mode, label) as run:
+            yield run[0] if run else None
+    finally:
+        if run:
+            _save(*run)
+
+@asynccontextmanager
+async def aprofile(mode: str, label: str) -> AsyncIterator[Optional[dict]]:
+    """profile() for the event loop thread: the result is saved in a worker thread."""
+    run = None
+    try:
+        with _collect(mode, label) as run:
+            yield run[0] if run else None
+    finally:
+        if run:
+            await asyncio.to_thread(_save, *run)
+
+# ---- storage ----
+
+def _save(info: dict, profiler: Optional[cProfile.Profile], sampler: Optional[_Sampler]) -> None:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    if profiler is not None:
+        profiler.dump_stats(str(directory / f"{info['id']}.prof"))
+        info["format"] = "prof"
+    else:
+        lines = (f"{stack} {count}" for stack, count in sampler.stacks.most_common())
+        (directory / f"{info['id']}.folded").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        info["format"] = "folded"
+        info["samples"] = sum(sampler.stacks.values())
+    (directory / f"{info['id']}.json").write_text(json.dumps(info), encoding="utf-8")
+    info["path"] = str(directory / f"{info['id']}.{info['format']}")
+    _enforce_cap(directory)
+
+def _enforce_cap(directory: Path) -> None:
+    """Delete the oldest profiles until the directory fits in PROFILE_DIR_MAX_MB."""
+    files = sorted((p for p in directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    for p in files:
+        if total <= _max_bytes():
+            break
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    metas = sorted(directory.glob("*.json"), reverse=True)[:limit]  # ids sort by start time
+    out = []
+    for p in metas:
+        try:
+            out.append(json.loads(p.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # deleted by the size cap or half-written
+    return out
+
+def profile_file(profile_id: str, fmt: Optional[str] = None) -> Optional[Tuple[Path, str]]:
+    """(path, media type) of a stored profile; fmt defaults to the profile's own format."""
+    if not _ID_RE.match(profile_id):
+        return None
+    directory = profile_dir()
+    formats = [fmt] if fmt else ["folded", "prof"]
+    for f in formats:
+        path = directory / f"{profile_id}.{f}"
+        if f in FORMATS and path.is_file():
+            return path, FORMATS[f]
+    return None
+
+# ---- ASGI middleware ----
+
+def _requested_mode(scope) -> Optional[str]:
+    headers: Dict[bytes, bytes] = dict(scope.get("headers") or [])
+    requested = headers.get(b"x-profile")
+    if requested is not None:
+        token = headers.get(b"x-admin-token", b"").decode("latin-1")
+        mode = requested.decode("latin-1").strip().lower()
+        if is_admin(token):
+            return mode if mode in MODES else _default_mode()
+        return None
+    rate = _sample_rate()
+    if rate > 0 and any(scope["path"].startswith(p) for p in _paths()) and random.random() < rate:
+        return _default_mode()
+    return None
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI (not BaseHTTPMiddleware) so a streamed body is profiled to its
+    last chunk. Profiled responses carry an X-Profile-Id header; writing the
+    profile and trimming PROFILE_DIR happen off the event loop.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        mode = _requested_mode(scope) if scope["type"] == "http" and enabled() else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        async with aprofile(mode, f"{scope['method']} {scope['path']}") as info:
+            if info is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_id(message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", info["id"].encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_id)
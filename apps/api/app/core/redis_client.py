@@ -5,6 +5,7 @@ from functools import lru_cache
 from typing import Optional
 
 import redis as redis_lib
+import redis.asyncio as aioredis
 
 @lru_cache(maxsize=1)
 def get_redis() -> Optional[redis_lib.Redis]:
@@ -17,3 +18,31 @@ def get_redis() -> Optional[redis_lib.Redis]:
         return r
     except Exception:
         return None
+
+@lru_cache(maxsize=1)
+def get_async_redis() -> Optional[aioredis.Redis]:
+    # None when Redis was unreachable, like get_redis(): the ping goes through
+    # the sync client because this is called from sync code paths too. Callers
+    # still handle RedisError for an outage after startup.
+    if get_redis() is None:
+        return None
+    return aioredis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+
+@lru_cache(maxsize=1)
+def get_redis_bytes() -> Optional[redis_lib.Redis]:
+    """Client without response decoding, for binary values (e.g. packed vectors)."""
+    url = os.getenv("REDIS_URL", "")
+    if not url:
+        return None
+    try:
+        r = redis_lib.from_url(url, decode_responses=False)
+        r.ping()
+        return r
+    except Exception:
+        return None
+
+@lru_cache(maxsize=1)
+def get_async_redis_bytes() -> Optional[aioredis.Redis]:
+    if get_redis_bytes() is None:
+        return None
+    return aioredis.from_url(os.environ["REDIS_URL"], decode_responses=False)
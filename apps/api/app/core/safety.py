@@ -1,17 +1,9 @@
 from __future__ import annotations
 
-PAYMENT_KEYWORDS = [
-    # English
-    "credit card", "debit card", "card number", "cvv", "cvc", "pin", "otp", "password",
-    "bank transfer", "account number", "wire", "swift",
-    "telebirr", "mpesa", "paypal",
-    # Amharic (best-effort keywords)
-    "ካርድ", "ፒን", "ፓስወርድ", "የባንክ መለያ", "ቴሌብር", "ኦቲፒ", "otp",
-]
+from app.core.matcher import INTENT_MATCHER, PAYMENT_KEYWORDS, PAYMENT_LABEL  # noqa: F401  (PAYMENT_KEYWORDS re-exported)
 
 def is_payment_or_credentials_request(text: str) -> bool:
-    t = text.lower()
-    return any(k.lower() in t for k in PAYMENT_KEYWORDS)
+    return PAYMENT_LABEL in INTENT_MATCHER.match(text)
 
 def payment_refusal(language: str) -> str:
     if language == "am":
@@ -3,6 +3,11 @@ from app.db.models.order import Order
 from app.db.models.ticket import Ticket
 from app.db.models.callback import Callback
 from app.db.models.kbdocument import KBDocument, KBChunk
+from app.db.models.answer_cache import AnswerCacheEntry
+from app.db.models.kb_generation import KBGeneration, KBGenerationDocument
 
 
-__all__ = ["Customer", "Order", "Ticket", "Callback", "KBDocument", "KBChunk"]
+__all__ = [
+    "Customer", "Order", "Ticket", "Callback", "KBDocument", "KBChunk", "AnswerCacheEntry",
+    "KBGeneration", "KBGenerationDocument",
+]
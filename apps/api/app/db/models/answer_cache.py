@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.base import Base
+from app.db.vector_index import embedding_column_type
+
+
+class AnswerCacheEntry(Base):
+    __tablename__ = "rag_answer_cache"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    language = Column(String(8), nullable=False)
+    question_hash = Column(String(64), nullable=False)  # sha256 of the normalized question
+    question = Column(Text, nullable=False)
+    kb_generation = Column(Integer, nullable=False)  # KB generation the answer was built from
+
+    answer = Column(Text, nullable=False)
+    sources = Column(Text, nullable=False, default="")
+    gen_ms = Column(Integer, nullable=False, default=0)  # generation latency the entry saves per hit
+
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    last_hit_at = Column(DateTime(timezone=True), nullable=False)
+
+    embedding = Column(embedding_column_type(), nullable=False)
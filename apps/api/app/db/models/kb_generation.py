@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+from app.db.base import Base
+
+
+class KBGeneration(Base):
+    """
+    One complete, independently indexed copy of the KB chunks. Exactly one
+    generation is active and served; new content is ingested into a new
+    generation that is switched in once its indexes are built and verified.
+    """
+
+    __tablename__ = "kb_generations"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String(16), nullable=False)  # building|ready|active|retired|failed
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    activated_at = Column(DateTime(timezone=True), nullable=True)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    meta = Column("metadata", JSONB, nullable=False, default=dict)
+
+
+class KBGenerationDocument(Base):
+    """Source file hash of each document as ingested into a generation."""
+
+    __tablename__ = "kb_generation_documents"
+
+    generation_id = Column(Integer, ForeignKey("kb_generations.id", ondelete="CASCADE"), primary_key=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("kb_documents.id", ondelete="CASCADE"), primary_key=True)
+    file_hash = Column(String(64), nullable=False)
@@ -1,13 +1,9 @@
-import os
-
 from sqlalchemy.dialects.postgresql import JSONB
-from pgvector.sqlalchemy import VECTOR  # pgvector-python supports SQLAlchemy VECTOR :contentReference[oaicite:6]{index=6}
 from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.db.base import Base
-
-EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "3072"))
+from app.db.vector_index import EMBEDDING_DIM, embedding_column_type  # noqa: F401  (EMBEDDING_DIM re-exported)
 
 
 class KBDocument(Base):
@@ -27,9 +23,19 @@ class KBChunk(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True)
     document_id = Column(UUID(as_uuid=True), ForeignKey("kb_documents.id", ondelete="CASCADE"), nullable=False)
+    # KB generation this chunk belongs to (see KBGeneration); retrieval only reads the active one
+    generation = Column(Integer, ForeignKey("kb_generations.id", ondelete="CASCADE"), nullable=False)
     chunk_index = Column(Integer, nullable=False)
 
+    # Denormalized from KBDocument so retrieval is a single-table ANN query
+    language = Column(String(8), nullable=False, default="en")
+    title = Column(String(256), nullable=False, default="")
+
     content = Column(Text, nullable=False)
+    # sha256 of content; chunks whose text is unchanged keep their embedding
+    content_hash = Column(String(64), nullable=True)
+    # Id of the last ingest run that saw this chunk; unseen chunks are deleted at the end of a run
+    ingest_run = Column(UUID(as_uuid=True), nullable=True)
     token_count = Column(Integer, nullable=False, default=0)
 
     page_start = Column(Integer, nullable=True)
@@ -37,5 +43,5 @@ class KBChunk(Base):
     meta = Column("metadata", JSONB, nullable=False, default=dict)
     created_at = Column(DateTime(timezone=True), nullable=False)
 
-    # Keep in sync with migration vector dimension
-    embedding = Column(VECTOR(EMBEDDING_DIM), nullable=False)
+    # vector(N) or halfvec(N) per EMBEDDING_STORAGE / EMBEDDING_DIM (see app.db.vector_index)
+    embedding = Column(embedding_column_type(), nullable=False)
@@ -1,11 +1,67 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+def _async_database_url(url: str) -> str:
+    # psycopg (v3) speaks asyncio natively; psycopg2 URLs are rewritten to it
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+def _configure_vector_search(dbapi_connection, _connection_record) -> None:
+    """
+    Per-connection pgvector settings. Iterative index scans (pgvector >= 0.8)
+    keep walking the HNSW graph until a filtered query has its full LIMIT.
+    """
+    settings = []
+    iterative = os.getenv("RAG_HNSW_ITERATIVE_SCAN", "relaxed_order")
+    if iterative in ("strict_order", "relaxed_order"):
+        settings.append(f"SET hnsw.iterative_scan = {iterative}")
+    ef_search = os.getenv("RAG_HNSW_EF_SEARCH")
+    if ef_search:
+        settings.append(f"SET hnsw.ef_search = {int(ef_search)}")
+    if not settings:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for sql in settings:
+            cursor.execute(sql)
+        # Commit so the pool's reset-on-return rollback does not undo the SETs
+        dbapi_connection.commit()
+    except Exception:
+        dbapi_connection.rollback()  # older pgvector: plain HNSW scans
+    finally:
+        cursor.close()
+
+# Pool settings are kept here so app.core.metrics can report each pool's capacity
+SYNC_POOL_SIZE, SYNC_MAX_OVERFLOW = 5, 10  # SQLAlchemy's QueuePool defaults
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+engine = create_engine(
+    DATABASE_URL, pool_pre_ping=True, pool_size=SYNC_POOL_SIZE, max_overflow=SYNC_MAX_OVERFLOW
+)
+event.listen(engine, "connect", _configure_vector_search)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
+
+event.listen(async_engine.sync_engine, "connect", _configure_vector_search)
+
+# expire_on_commit=False: attributes stay loaded after commit, so no implicit
+# lazy-load IO happens outside an await.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
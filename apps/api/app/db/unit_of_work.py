@@ -0,0 +1,38 @@
+"""
+Request-scoped transactions. Services only add, flush or execute; whoever
+owns the request (chat_service.handle_chat, the /tools routes) commits
+once with commit(). Work that must only happen if the transaction commits,
+such as filling a cache with ids created in it or queueing write-behind
+inserts, is registered with
+after_commit() and runs right after the COMMIT; on rollback it is dropped
+together with the session.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Awaitable, Callable, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+log = logging.getLogger(__name__)
+
+AfterCommit = Callable[[], Awaitable[None]]
+
+_KEY = "after_commit"
+
+def after_commit(db: AsyncSession, fn: AfterCommit) -> None:
+    db.info.setdefault(_KEY, []).append(fn)
+
+async def commit(db: AsyncSession) -> None:
+    await db.commit()
+    callbacks: List[AfterCommit] = db.info.pop(_KEY, [])
+    for fn in callbacks:
+        try:
+            await fn()
+        except Exception:
+            # The data itself is committed; callbacks handle their own fallbacks
+            log.warning("after_commit callback failed", exc_info=True)
+
+async def rollback(db: AsyncSession) -> None:
+    db.info.pop(_KEY, None)
+    await db.rollback()
@@ -0,0 +1,204 @@
+"""
+Embedding column type and HNSW index definitions, shared by the models,
+migrations and the ingest_kb maintenance commands so they never disagree.
+
+Since KB generations (0009) every generation has its own set of partial
+indexes (WHERE generation = N); the unscoped ix_kb_chunks_embedding_*
+definitions remain for the migrations that predate them.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from pgvector.sqlalchemy import HALFVEC, VECTOR
+from sqlalchemy import Connection, text
+
+# Defaults match .env.example: 1536-dim halfvec is the largest combination
+# the provider supports that HNSW can index
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "halfvec")  # vector|halfvec
+if EMBEDDING_STORAGE not in ("vector", "halfvec"):
+    raise RuntimeError(f"EMBEDDING_STORAGE must be 'vector' or 'halfvec', got {EMBEDDING_STORAGE!r}")
+
+# Languages produced by app.core.language.detect_language
+LANGUAGES = ("en", "am")
+
+# pgvector HNSW dimension limits per type
+_HNSW_MAX_DIM = {"vector": 2000, "halfvec": 4000}
+
+def embedding_column_type():
+    return HALFVEC(EMBEDDING_DIM) if EMBEDDING_STORAGE == "halfvec" else VECTOR(EMBEDDING_DIM)
+
+def embedding_sql_type(storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM) -> str:
+    return f"{storage}({dim})"
+
+def hnsw_supported(storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM) -> bool:
+    return dim <= _HNSW_MAX_DIM[storage]
+
+def unsupported_hnsw_message(storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM) -> str:
+    return (
+        f"HNSW cannot index {embedding_sql_type(storage, dim)} (max {_HNSW_MAX_DIM[storage]} dimensions); "
+        "lower EMBEDDING_DIM or set EMBEDDING_STORAGE=halfvec"
+    )
+
+def stored_embedding_type(conn: Connection) -> Tuple[str, int]:
+    """
+    (storage, dim) of kb_chunks.embedding as it exists in the database.
+    Migrations after 0005 build on this rather than on the environment, so
+    they always match the type 0005 (or a later conversion) chose.
+    """
+    sql_type = conn.scalar(
+        text(
+            """
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'kb_chunks'::regclass AND attname = 'embedding' AND NOT attisdropped
+            """
+        )
+    )
+    match = re.fullmatch(r"(vector|halfvec)\((\d+)\)", sql_type or "")
+    if match is None:
+        raise RuntimeError(f"kb_chunks.embedding is {sql_type!r}, expected vector(N) or halfvec(N)")
+    return match.group(1), int(match.group(2))
+
+def hnsw_index_names() -> List[str]:
+    return (
+        ["ix_kb_chunks_embedding_hnsw"]
+        + [f"ix_kb_chunks_embedding_hnsw_{lang}" for lang in LANGUAGES]
+        + ["ix_kb_chunks_embedding_bq_hnsw"]
+        + [f"ix_kb_chunks_embedding_bq_hnsw_{lang}" for lang in LANGUAGES]
+    )
+
+def create_hnsw_index_statements(storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM) -> List[str]:
+    """A global index for the any-language leg plus one partial index per language."""
+    if not hnsw_supported(storage, dim):
+        return []
+    ops = f"{storage}_cosine_ops"
+    stmts = [f"CREATE INDEX IF NOT EXISTS ix_kb_chunks_embedding_hnsw ON kb_chunks USING hnsw (embedding {ops});"]
+    for lang in LANGUAGES:
+        stmts.append(
+            f"CREATE INDEX IF NOT EXISTS ix_kb_chunks_embedding_hnsw_{lang} ON kb_chunks "
+            f"USING hnsw (embedding {ops}) WHERE language = '{lang}';"
+        )
+    return stmts + create_binary_index_statements(dim)
+
+def create_binary_index_statements(dim: int = EMBEDDING_DIM) -> List[str]:
+    """
+    Hamming-distance HNSW over binary_quantize(embedding): one bit per
+    dimension, used for the candidate stage of RAG_RETRIEVAL_MODE=binary_rerank.
+    """
+    expr = f"(binary_quantize(embedding)::bit({dim}))"
+    stmts = [f"CREATE INDEX IF NOT EXISTS ix_kb_chunks_embedding_bq_hnsw ON kb_chunks USING hnsw ({expr} bit_hamming_ops);"]
+    for lang in LANGUAGES:
+        stmts.append(
+            f"CREATE INDEX IF NOT EXISTS ix_kb_chunks_embedding_bq_hnsw_{lang} ON kb_chunks "
+            f"USING hnsw ({expr} bit_hamming_ops) WHERE language = '{lang}';"
+        )
+    return stmts
+
+ANSWER_CACHE_INDEX = "ix_rag_answer_cache_embedding_hnsw"
+
+def create_answer_cache_index_statements(storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM) -> List[str]:
+    """HNSW over cached questions, so a semantic cache lookup is not a full scan."""
+    if not hnsw_supported(storage, dim):
+        return []
+    return [
+        f"CREATE INDEX IF NOT EXISTS {ANSWER_CACHE_INDEX} ON rag_answer_cache "
+        f"USING hnsw (embedding {storage}_cosine_ops);"
+    ]
+
+def drop_hnsw_index_statements() -> List[str]:
+    return [f"DROP INDEX IF EXISTS {name};" for name in hnsw_index_names()]
+
+def generation_index_names(generation: int) -> List[str]:
+    base = f"ix_kb_chunks_g{int(generation)}"
+    return (
+        [f"{base}_hnsw"]
+        + [f"{base}_hnsw_{lang}" for lang in LANGUAGES]
+        + [f"{base}_bq_hnsw"]
+        + [f"{base}_bq_hnsw_{lang}" for lang in LANGUAGES]
+    )
+
+def create_generation_index_statements(
+    generation: int, storage: str = EMBEDDING_STORAGE, dim: int = EMBEDDING_DIM
+) -> List[str]:
+    """
+    HNSW indexes scoped to one generation: any-language and per-language,
+    on the full vectors and on binary_quantize(embedding). Retrieval renders
+    the generation inline so the planner can match these partial indexes.
+    """
+    if not hnsw_supported(storage, dim):
+        return []
+    names = iter(generation_index_names(generation))
+    scope = f"generation = {int(generation)}"
+    targets = [(f"embedding {storage}_cosine_ops", "")] + [
+        (f"embedding {storage}_cosine_ops", f" AND language = '{lang}'") for lang in LANGUAGES
+    ]
+    bq = f"(binary_quantize(embedding)::bit({dim})) bit_hamming_ops"
+    targets += [(bq, "")] + [(bq, f" AND language = '{lang}'") for lang in LANGUAGES]
+    return [
+        f"CREATE INDEX IF NOT EXISTS {next(names)} ON kb_chunks USING hnsw ({expr}) WHERE {scope}{extra};"
+        for expr, extra in targets
+    ]
+
+def drop_generation_index_statements(generation: int, concurrently: bool = False) -> List[str]:
+    how = "CONCURRENTLY " if concurrently else ""
+    return [f"DROP INDEX {how}IF EXISTS {name};" for name in generation_index_names(generation)]
+
+def _drop_indexes(generations: Optional[Sequence[int]]) -> List[str]:
+    if generations is None:
+        return drop_hnsw_index_statements()
+    return [sql for g in generations for sql in drop_generation_index_statements(g)]
+
+def _create_indexes(generations: Optional[Sequence[int]], storage: str, dim: int) -> List[str]:
+    if generations is None:
+        return create_hnsw_index_statements(storage, dim)
+    return [sql for g in generations for sql in create_generation_index_statements(g, storage, dim)]
+
+def convert_embedding_storage(
+    execute: Callable[[str], object],
+    storage: str = EMBEDDING_STORAGE,
+    dim: int = EMBEDDING_DIM,
+    generations: Optional[Sequence[int]] = None,
+) -> None:
+    """
+    Convert kb_chunks.embedding (and the answer cache) in place to
+    storage(dim). Vectors are truncated to the first `dim` components and
+    re-normalized, which is valid for Matryoshka-trained embedding models;
+    growing the dimension needs a re-embed instead.
+    """
+    target = embedding_sql_type(storage, dim)
+    for sql in _drop_indexes(generations):
+        execute(sql)
+    execute(
+        f"ALTER TABLE kb_chunks ALTER COLUMN embedding TYPE {target} "
+        f"USING l2_normalize(subvector(embedding::vector, 1, {dim}))::{target};"
+    )
+    _reset_answer_cache(execute, storage, dim)
+    for sql in _create_indexes(generations, storage, dim):
+        execute(sql)
+
+def swap_reembedded_column(
+    execute: Callable[[str], object],
+    storage: str = EMBEDDING_STORAGE,
+    dim: int = EMBEDDING_DIM,
+    generations: Optional[Sequence[int]] = None,
+) -> None:
+    """Replace kb_chunks.embedding with the fully populated embedding_new column."""
+    for sql in _drop_indexes(generations):
+        execute(sql)
+    execute("ALTER TABLE kb_chunks DROP COLUMN embedding;")
+    execute("ALTER TABLE kb_chunks RENAME COLUMN embedding_new TO embedding;")
+    execute("ALTER TABLE kb_chunks ALTER COLUMN embedding SET NOT NULL;")
+    _reset_answer_cache(execute, storage, dim)
+    for sql in _create_indexes(generations, storage, dim):
+        execute(sql)
+
+def _reset_answer_cache(execute: Callable[[str], object], storage: str, dim: int) -> None:
+    # Cached answers are cheap to regenerate; do not convert them
+    execute(f"DROP INDEX IF EXISTS {ANSWER_CACHE_INDEX};")
+    execute("TRUNCATE rag_answer_cache;")
+    execute(f"ALTER TABLE rag_answer_cache ALTER COLUMN embedding TYPE {embedding_sql_type(storage, dim)} USING NULL;")
+    for sql in create_answer_cache_index_statements(storage, dim):
+        execute(sql)
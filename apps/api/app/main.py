@@ -1,8 +1,32 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.router import api_router
+from app.core import health, metrics
+from app.core.profiling import ProfilingMiddleware
+from app.core.llm_client import aclose_clients
+from app.core.redis_client import get_async_redis
+from app.db.session import DB_MAX_OVERFLOW, SYNC_MAX_OVERFLOW, async_engine, engine
+
+metrics.watch_pool("async", async_engine.sync_engine, DB_MAX_OVERFLOW)
+metrics.watch_pool("sync", engine, SYNC_MAX_OVERFLOW)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_async_redis()  # connect (or give up on Redis) once, before serving
+    health.start()
+    yield
+    await health.stop()
+    r = get_async_redis()
+    if r is not None:
+        await r.aclose()
+    await aclose_clients()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Agentic Support Copilot API", version="0.1.0", 
-    description="API for Agentic Support Copilot"
+    description="API for Agentic Support Copilot",
+    lifespan=lifespan,
 )
-app.include_router(api_router)
\ No newline at end of file
+app.add_middleware(ProfilingMiddleware)
+app.include_router(api_router)
@@ -0,0 +1,144 @@
+"""
+Bulk path for full knowledge-base rebuilds. Chunk rows are streamed into a
+new, not yet indexed KB generation with binary COPY (psycopg 3), and that
+generation's HNSW indexes are built once at the end with a larger
+maintenance_work_mem and parallel maintenance workers. The active
+generation keeps serving, with its indexes, throughout.
+"""
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Sequence
+
+import psycopg
+from pgvector import HalfVector, Vector
+from pgvector.psycopg import register_vector
+from psycopg.types.json import Jsonb
+from sqlalchemy.engine import make_url
+
+from app.db.session import DATABASE_URL
+from app.db.vector_index import (
+    EMBEDDING_STORAGE,
+    create_generation_index_statements,
+    drop_generation_index_statements,
+)
+
+COLUMNS = (
+    "id",
+    "document_id",
+    "generation",
+    "chunk_index",
+    "language",
+    "title",
+    "content",
+    "content_hash",
+    "token_count",
+    "page_start",
+    "page_end",
+    "metadata",
+    "created_at",
+    "embedding",
+)
+TYPES = (
+    "uuid",
+    "uuid",
+    "int4",
+    "int4",
+    "varchar",
+    "varchar",
+    "text",
+    "varchar",
+    "int4",
+    "int4",
+    "int4",
+    "jsonb",
+    "timestamptz",
+    EMBEDDING_STORAGE,
+)
+
+def _maintenance_work_mem() -> str:
+    return os.getenv("KB_BULK_MAINTENANCE_WORK_MEM", "1GB")
+
+def _parallel_workers() -> int:
+    return int(os.getenv("KB_BULK_PARALLEL_WORKERS", "4"))
+
+def conninfo(url: str = DATABASE_URL) -> str:
+    # COPY goes through psycopg 3 directly, whatever driver DATABASE_URL names
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+def connect(autocommit: bool = False) -> psycopg.Connection:
+    conn = psycopg.connect(conninfo(), autocommit=autocommit)
+    register_vector(conn)
+    return conn
+
+def embedding_value(vec):
+    return HalfVector(vec) if EMBEDDING_STORAGE == "halfvec" else Vector(vec)
+
+def chunk_row(
+    chunk_id,
+    document_id,
+    generation: int,
+    chunk_index: int,
+    language: str,
+    title: str,
+    content: str,
+    content_hash: str,
+    token_count: int,
+    page_start,
+    page_end,
+    meta: dict,
+    created_at,
+    embedding,
+) -> tuple:
+    """One COPY row, in COLUMNS order."""
+    return (
+        chunk_id,
+        document_id,
+        generation,
+        chunk_index,
+        language,
+        title,
+        content,
+        content_hash,
+        token_count,
+        page_start,
+        page_end,
+        Jsonb(meta),
+        created_at,
+        embedding_value(embedding),
+    )
+
+@contextmanager
+def chunk_copy(conn: psycopg.Connection) -> Iterator:
+    """Yields a write(row) callable backed by a single binary COPY."""
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY kb_chunks ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT BINARY)") as copy:
+            copy.set_types(TYPES)
+            yield copy.write_row
+
+def copy_chunks(conn: psycopg.Connection, rows: Iterable[Sequence]) -> int:
+    count = 0
+    with chunk_copy(conn) as write:
+        for row in rows:
+            write(row)
+            count += 1
+    return count
+
+def drop_indexes(conn: psycopg.Connection, generation: int) -> None:
+    """Needs an autocommit connection: indexes are dropped CONCURRENTLY."""
+    for sql in drop_generation_index_statements(generation, concurrently=True):
+        conn.execute(sql)
+
+def build_indexes(conn: psycopg.Connection, generation: int) -> None:
+    """
+    Build one generation's HNSW indexes in one transaction with build-tuned
+    settings. Readers of other generations are not blocked; writes to
+    kb_chunks wait until the build commits.
+    """
+    with conn.transaction():
+        conn.execute(f"SET LOCAL maintenance_work_mem = '{_maintenance_work_mem()}'")
+        conn.execute(f"SET LOCAL max_parallel_maintenance_workers = {_parallel_workers()}")
+        for sql in create_generation_index_statements(generation):
+            conn.execute(sql)
+        conn.execute("ANALYZE kb_chunks")
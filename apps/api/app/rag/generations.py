@@ -0,0 +1,427 @@
+"""
+Versioned KB generations (blue/green re-indexing).
+
+Every kb_chunks row belongs to a generation; retrieval only reads the one
+marked active. An ingest run creates a new generation (by default a
+server-side copy of the active one, so unchanged files keep their chunks and
+embeddings), writes into it, builds its partial HNSW indexes, verifies
+them, and then activates it in a single transaction. The previous
+generation is retired but kept, indexes included, so rollback is the same
+one-row switch; gc() drops what is no longer needed.
+
+    building -> ready -> active -> retired -> (gc)
+           \\-> failed -> (gc)
+
+Starting a generation is not cheap: the copy duplicates every active chunk
+(embeddings included) and finish() builds all of the new generation's HNSW
+indexes from scratch, however small the change. With the active, the
+retired (KB_GENERATIONS_KEEP) and the building generation, kb_chunks holds
+up to three copies of the KB. An incremental run therefore resumes an
+unowned 'building' generation (claim()) instead of starting another one.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import Connection, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models import KBChunk, KBGeneration, KBGenerationDocument
+from app.db.vector_index import generation_index_names, hnsw_supported
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _keep() -> int:
+    # Retired generations kept (with their indexes) for instant rollback
+    return int(os.getenv("KB_GENERATIONS_KEEP", "1"))
+
+def _verify_samples() -> int:
+    return int(os.getenv("KB_GENERATION_VERIFY_SAMPLES", "20"))
+
+def _min_recall() -> float:
+    return float(os.getenv("KB_GENERATION_MIN_RECALL", "0.9"))
+
+def _cache_seconds() -> float:
+    return float(os.getenv("KB_GENERATION_CACHE_SECONDS", "5"))
+
+def _stale_building_seconds() -> int:
+    return int(os.getenv("KB_GENERATION_STALE_SECONDS", str(24 * 3600)))
+
+# First key of the session advisory lock (pg_try_advisory_lock(key, generation))
+# held by the run that owns a generation
+_OWNER_LOCK = 0x4B42
+
+def active_id(db: Session) -> Optional[int]:
+    return db.scalar(select(KBGeneration.id).where(KBGeneration.status == "active"))
+
+def list_generations(db: Session) -> List[KBGeneration]:
+    return list(db.scalars(select(KBGeneration).order_by(KBGeneration.id.desc())))
+
+def begin(db: Session, copy_active: bool = True, meta: Optional[dict] = None) -> int:
+    """
+    Create a generation in status 'building'. With copy_active, the active
+    generation's chunks and file hashes are copied into it in the database
+    (no re-embedding), so an incremental run only rewrites changed files.
+    """
+    gen = KBGeneration(status="building", created_at=utcnow(), chunk_count=0, meta=meta or {})
+    db.add(gen)
+    db.flush()
+    source = active_id(db) if copy_active else None
+    if source is not None:
+        db.execute(
+            text(
+                """
+                INSERT INTO kb_chunks (
+                    id, document_id, generation, chunk_index, language, title, content, content_hash,
+                    ingest_run, token_count, page_start, page_end, metadata, created_at, embedding
+                )
+                SELECT gen_random_uuid(), document_id, :target, chunk_index, language, title, content,
+                       content_hash, ingest_run, token_count, page_start, page_end, metadata, created_at,
+                       embedding
+                FROM kb_chunks WHERE generation = :source
+                """
+            ),
+            {"source": source, "target": gen.id},
+        )
+        db.execute(
+            text(
+                """
+                INSERT INTO kb_generation_documents (generation_id, document_id, file_hash)
+                SELECT :target, document_id, file_hash FROM kb_generation_documents
+                WHERE generation_id = :source
+                """
+            ),
+            {"source": source, "target": gen.id},
+        )
+        gen.meta = {**gen.meta, "copied_from": source}
+    db.commit()
+    return gen.id
+
+def _resumable(db: Session, mode: Optional[str]) -> List[int]:
+    """'building' generations of `mode` copied from the current active one, newest first."""
+    source = active_id(db)
+    building = db.scalars(
+        select(KBGeneration).where(KBGeneration.status == "building").order_by(KBGeneration.id.desc())
+    )
+    return [g.id for g in building if g.meta.get("mode") == mode and g.meta.get("copied_from") == source]
+
+def _try_own(conn: Connection, generation: int) -> bool:
+    owned = bool(conn.scalar(text("SELECT pg_try_advisory_lock(:key, :gen)"), {"key": _OWNER_LOCK, "gen": generation}))
+    conn.commit()  # the lock is session-level and outlives the transaction
+    return owned
+
+def _owned(db: Session) -> Set[int]:
+    """Generations whose owning run is alive (its connection holds the lock)."""
+    return set(
+        db.scalars(
+            text(
+                """
+                SELECT objid::bigint FROM pg_locks
+                WHERE locktype = 'advisory' AND classid = CAST(:key AS oid) AND objsubid = 2
+                """
+            ),
+            {"key": _OWNER_LOCK},
+        )
+    )
+
+@contextmanager
+def claim(db: Session, meta: Optional[dict] = None) -> Iterator[Tuple[int, bool]]:
+    """
+    Own a 'building' generation while the block runs and yield (generation,
+    resumed). The newest one of the same mode that was copied from the
+    current active generation and has no live owner is resumed: files it
+    already finished are skipped and half-written ones are matched by
+    content hash, so only the rest is embedded. Otherwise a new copy is
+    started with begin(). Ownership is a session advisory lock on a
+    dedicated connection, so it ends with the owning process even when
+    that is killed.
+    """
+    meta = meta or {}
+    owner = db.get_bind().connect()
+    generation: Optional[int] = None
+    try:
+        for candidate in _resumable(db, meta.get("mode")):
+            if not _try_own(owner, candidate):
+                continue
+            # Re-check under the lock: its previous owner may have finished it
+            if db.scalar(select(KBGeneration.status).where(KBGeneration.id == candidate)) == "building":
+                generation = candidate
+                break
+            _release(owner, candidate)
+        db.commit()
+        resumed = generation is not None
+        if generation is None:
+            generation = begin(db, meta=meta)
+            _try_own(owner, generation)
+        yield generation, resumed
+    finally:
+        if generation is not None:
+            _release(owner, generation)
+        owner.close()
+
+@contextmanager
+def hold(db: Session, generation: int) -> Iterator[None]:
+    """
+    Own `generation` for one task of a distributed run. The run's tasks
+    share it, so the advisory lock is taken in shared mode for the length
+    of the task, and every task also stamps a heartbeat in the generation's
+    metadata, which gc() counts as activity while the next tasks wait in
+    the queue.
+    """
+    owner = db.get_bind().connect()
+    try:
+        params = {"key": _OWNER_LOCK, "gen": generation}
+        owner.execute(text("SELECT pg_advisory_lock_shared(:key, :gen)"), params)
+        owner.execute(
+            text("UPDATE kb_generations SET metadata = metadata || jsonb_build_object('heartbeat_at', now()) WHERE id = :gen"),
+            params,
+        )
+        owner.commit()
+        yield
+    finally:
+        try:
+            owner.execute(text("SELECT pg_advisory_unlock_shared(:key, :gen)"), {"key": _OWNER_LOCK, "gen": generation})
+            owner.commit()
+        except Exception:
+            owner.invalidate()
+        owner.close()
+
+def _last_activity(gen: KBGeneration) -> float:
+    """Creation time, or the last heartbeat of a distributed run (hold())."""
+    heartbeat = gen.meta.get("heartbeat_at")
+    started = gen.created_at.timestamp()
+    return max(started, datetime.fromisoformat(heartbeat).timestamp()) if heartbeat else started
+
+def _release(conn: Connection, generation: int) -> None:
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:key, :gen)"), {"key": _OWNER_LOCK, "gen": generation})
+        conn.commit()
+    except Exception:
+        conn.invalidate()  # closing the DBAPI connection releases the lock too
+
+def record_document(db: Session, generation: int, document_id, digest: str) -> None:
+    """Remember the source file hash a document was ingested from in this generation."""
+    stmt = insert(KBGenerationDocument).values(generation_id=generation, document_id=document_id, file_hash=digest)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[KBGenerationDocument.generation_id, KBGenerationDocument.document_id],
+            set_={"file_hash": stmt.excluded.file_hash},
+        )
+    )
+
+def build_indexes(generation: int) -> float:
+    """Build the generation's HNSW indexes; returns the build time in seconds."""
+    from app.rag import bulk_load  # psycopg 3 is only needed by ingestion
+
+    started = time.perf_counter()
+    with bulk_load.connect() as conn:
+        bulk_load.build_indexes(conn, generation)
+    return time.perf_counter() - started
+
+def invalid_indexes(db: Union[Session, Connection], generation: int) -> List[str]:
+    """HNSW indexes of `generation` that are missing or not (yet) valid."""
+    expected = generation_index_names(generation) if hnsw_supported() else []
+    if not expected:
+        return []
+    valid = set(
+        db.scalars(
+            text(
+                """
+                SELECT c.relname FROM pg_index AS i JOIN pg_class AS c ON c.oid = i.indexrelid
+                WHERE c.relname = ANY(:names) AND i.indisvalid AND i.indisready
+                """
+            ),
+            {"names": expected},
+        )
+    )
+    return [name for name in expected if name not in valid]
+
+def _self_recall(db: Session, generation: int) -> Optional[float]:
+    """
+    Share of sampled chunks that the production retrieval query finds as
+    their own nearest neighbour (distance ~0) within the top 5; None for an
+    empty generation.
+    """
+    from app.services.rag_service import search_stmt  # rag_service imports this module
+
+    sample = db.execute(
+        select(KBChunk.language, KBChunk.content, KBChunk.embedding)
+        .where(KBChunk.generation == generation)
+        .order_by(func.random())
+        .limit(_verify_samples())
+    ).all()
+    if not sample:
+        return None
+    found = 0
+    for row in sample:
+        vec = row.embedding.to_list() if hasattr(row.embedding, "to_list") else list(row.embedding)
+        hits = db.execute(search_stmt(vec, row.language, 5, generation)).all()
+        found += any(h.content == row.content and float(h.distance) < 1e-3 for h in hits)
+    return found / len(sample)
+
+def verify(db: Session, generation: int) -> List[str]:
+    """
+    Check a built generation before it may serve: it has chunks, all of its
+    HNSW indexes are valid, and the indexed retrieval query finds sampled
+    chunks (KB_GENERATION_MIN_RECALL). Returns the problems found; on
+    success the generation is marked 'ready'.
+    """
+    gen = db.get(KBGeneration, generation)
+    if gen is None:
+        return [f"generation {generation} does not exist"]
+
+    problems = []
+    count = db.scalar(select(func.count(KBChunk.id)).where(KBChunk.generation == generation)) or 0
+    if count == 0:
+        problems.append("no chunks")
+    invalid = invalid_indexes(db, generation)
+    if invalid:
+        problems.append(f"missing or invalid indexes: {', '.join(invalid)}")
+    recall = _self_recall(db, generation) if not invalid else None
+    if recall is not None and recall < _min_recall():
+        problems.append(f"self-recall {recall:.2f} below {_min_recall():.2f}")
+    db.rollback()  # end the read transaction before taking row locks below
+
+    gen = db.get(KBGeneration, generation, with_for_update=True)
+    gen.chunk_count = count
+    gen.meta = {**gen.meta, "verify_recall": recall, "verify_problems": problems}
+    if not problems and gen.status == "building":
+        gen.status = "ready"
+    db.commit()
+    return problems
+
+def mark_failed(db: Session, generation: int, reason: str) -> None:
+    gen = db.get(KBGeneration, generation, with_for_update=True)
+    if gen is not None and gen.status in ("building", "ready"):
+        gen.status = "failed"
+        gen.meta = {**gen.meta, "error": reason[:500]}
+    db.commit()
+
+def activate(db: Session, generation: int) -> None:
+    """
+    Serve `generation` from now on: retire the active generation and
+    activate this one in one transaction. Only 'ready' or 'retired'
+    generations can be activated. The numpy snapshot, if configured, is
+    republished. Cached answers need no purge: they are keyed by the
+    generation they were built from (see app.services.answer_cache).
+    """
+    from app.rag.ingest_kb import publish_snapshot_if_configured
+
+    # Lock the active row first so concurrent activations serialize
+    db.execute(select(KBGeneration.id).where(KBGeneration.status == "active").with_for_update())
+    gen = db.get(KBGeneration, generation, with_for_update=True)
+    status = gen.status if gen is not None else None
+    if status not in ("ready", "retired"):
+        db.rollback()
+        if status == "active":
+            return
+        raise ValueError(f"KB generation {generation} is {status or 'missing'}, not ready")
+
+    db.execute(update(KBGeneration).where(KBGeneration.status == "active").values(status="retired"))
+    gen.status = "active"
+    gen.activated_at = utcnow()
+    db.commit()
+
+    publish_snapshot_if_configured(db)
+
+def rollback(db: Session) -> Optional[int]:
+    """Re-activate the most recently active retired generation; returns it, or None if there is none."""
+    previous = db.scalar(
+        select(KBGeneration.id)
+        .where(KBGeneration.status == "retired")
+        .order_by(KBGeneration.activated_at.desc().nulls_last(), KBGeneration.id.desc())
+        .limit(1)
+    )
+    if previous is None:
+        return None
+    activate(db, previous)
+    return previous
+
+def drop(db: Session, generation: int) -> None:
+    """Drop a generation's indexes, then its rows (chunks cascade). Never the active one."""
+    gen = db.get(KBGeneration, generation)
+    if gen is None:
+        return
+    if gen.status == "active":
+        raise ValueError(f"KB generation {generation} is active")
+    from app.rag import bulk_load
+
+    # Concurrently, so retrieval never queues behind an exclusive lock
+    with bulk_load.connect(autocommit=True) as conn:
+        bulk_load.drop_indexes(conn, generation)
+    db.delete(gen)
+    db.commit()
+
+def gc(db: Session, keep: Optional[int] = None) -> List[int]:
+    """
+    Drop generations that can no longer be served: failed ones, retired ones
+    beyond the newest `keep` (KB_GENERATIONS_KEEP), and 'building'/'ready'
+    ones that no live run owns and that saw no activity (creation or a
+    distributed run's heartbeat) for KB_GENERATION_STALE_SECONDS
+    (abandoned runs). Returns the dropped ids.
+    """
+    keep = _keep() if keep is None else keep
+    retired = list(
+        db.scalars(
+            select(KBGeneration.id)
+            .where(KBGeneration.status == "retired")
+            .order_by(KBGeneration.activated_at.desc().nulls_last(), KBGeneration.id.desc())
+        )
+    )
+    stale_before = utcnow().timestamp() - _stale_building_seconds()
+    owned = _owned(db)
+    abandoned = [
+        g.id
+        for g in db.scalars(select(KBGeneration).where(KBGeneration.status.in_(("building", "ready"))))
+        if _last_activity(g) < stale_before and g.id not in owned
+    ]
+    failed = list(db.scalars(select(KBGeneration.id).where(KBGeneration.status == "failed")))
+    dropped = sorted(set(retired[keep:] + abandoned + failed))
+    for generation in dropped:
+        drop(db, generation)
+    return dropped
+
+def finish(db: Session, generation: int, activate_ready: bool = True) -> List[str]:
+    """
+    Build, verify and (with activate_ready) activate a generation whose
+    chunks are written, then gc. A generation that fails verification is
+    marked failed and the active one keeps serving. Returns the problems.
+    """
+    try:
+        seconds = build_indexes(generation)
+        print(f"Built HNSW indexes for generation {generation} in {seconds:.1f}s")
+        problems = verify(db, generation)
+    except Exception as exc:
+        db.rollback()
+        mark_failed(db, generation, str(exc))
+        raise
+    if problems:
+        mark_failed(db, generation, "; ".join(problems))
+        return problems
+    if activate_ready:
+        activate(db, generation)
+        gc(db)
+    return []
+
+_active: Optional[int] = None
+_active_checked_at = 0.0
+
+async def active_generation(db: AsyncSession) -> Optional[int]:
+    """
+    Active generation for retrieval, re-read at most every
+    KB_GENERATION_CACHE_SECONDS per process. The previous generation stays
+    intact after a switch, so briefly serving it is harmless.
+    """
+    global _active, _active_checked_at
+    now = time.monotonic()
+    if _active is None or now - _active_checked_at >= _cache_seconds():
+        _active = await db.scalar(select(KBGeneration.id).where(KBGeneration.status == "active"))
+        _active_checked_at = now
+    return _active
@@ -2,23 +2,46 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
 import os
 import re
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from uuid import uuid4
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from uuid import UUID, uuid4
 
 import tiktoken
 from pypdf import PdfReader
-from sqlalchemy import delete, select
+from sqlalchemy import delete, insert, select, text, update
 from sqlalchemy.orm import Session
 
+from app.core import profiling
 from app.core.language import detect_language
-from app.core.llm_client import embed_texts
-from app.db.models import KBDocument, KBChunk
+from app.core.embedding_cache import embed_texts_cached
+from app.db.models import KBDocument, KBChunk, KBGenerationDocument
 from app.db.session import SessionLocal
-
-EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "3072"))
+from app.db.vector_index import (
+    convert_embedding_storage,
+    embedding_sql_type,
+    swap_reembedded_column,
+)
+from app.rag import generations
+from app.rag.parallel import (
+    ExtractionPool,
+    bounded,
+    concurrency,
+    embed_batch,
+    extraction_pool,
+    ordered_map,
+    token_batches,
+)
 
 def utcnow():
     return datetime.now(timezone.utc)
@@ -29,6 +52,14 @@ def normalize_text(s: str) -> str:
     s = re.sub(r"\n{3,}", "\n\n", s)
     return s.strip()
 
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    """Tokens in text, counted as chunk_by_tokens does (token_batches budgets on it)."""
+    return len(_encoding().encode(text))
+
 def chunk_by_tokens(
     text: str,
     max_tokens: int | None = None,
@@ -38,7 +69,7 @@ def chunk_by_tokens(
         max_tokens = int(os.getenv("RAG_CHUNK_TOKENS", "450"))
     if overlap is None:
         overlap = int(os.getenv("RAG_CHUNK_OVERLAP", "60"))
-    enc = tiktoken.get_encoding("cl100k_base")
+    enc = _encoding()
     tokens = enc.encode(text)
     if not tokens:
         return []
@@ -55,6 +86,32 @@ def chunk_by_tokens(
         start = max(0, end - overlap)
     return chunks
 
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+@dataclass
+class ChunkSpec:
+    content: str
+    token_count: int
+    page_start: Optional[int]
+    page_end: Optional[int]
+    meta: dict
+
+def unchanged_document(db: Session, source_path: str, digest: str, generation: int) -> bool:
+    existing = db.scalar(
+        select(KBGenerationDocument.file_hash)
+        .join(KBDocument, KBDocument.id == KBGenerationDocument.document_id)
+        .where(KBGenerationDocument.generation_id == generation, KBDocument.source_path == source_path)
+    )
+    return existing == digest
+
 def upsert_document(db: Session, source_type: str, title: str, source_path: str, language: str, meta: dict):
     existing = db.scalar(select(KBDocument).where(KBDocument.source_path == source_path))
     if existing:
@@ -80,229 +137,589 @@ def upsert_document(db: Session, source_type: str, title: str, source_path: str,
     db.refresh(doc)
     return doc
 
-def ingest_pdf(db: Session, path: Path):
-    reader = PdfReader(str(path))
-    title = path.stem
-    source_path = str(path)
-
-    # detect language from first pages
-    sample = ""
-    for i, page in enumerate(reader.pages[:3]):
-        sample += (page.extract_text() or "") + "\n"
-    language = detect_language(sample)
+def _commit_every() -> int:
+    return int(os.getenv("KB_COMMIT_EVERY", "500"))
+
+def _queue_size() -> int:
+    return int(os.getenv("KB_PIPELINE_QUEUE_SIZE", "256"))
+
+def _pages_per_task() -> int:
+    return int(os.getenv("KB_PDF_PAGES_PER_TASK", "25"))
+
+Numbered = List[Tuple[int, ChunkSpec]]
+P = TypeVar("P")
+
+def embedded_batches(
+    specs: Iterable[ChunkSpec],
+    plan: Callable[[Numbered], P],
+    texts_of: Callable[[P], List[str]],
+    first_index: int = 1,
+) -> Iterator[Tuple[P, List[List[float]]]]:
+    """
+    The read -> chunk -> embed half of the pipeline. Specs are produced in a
+    reader thread at most KB_PIPELINE_QUEUE_SIZE ahead, grouped into
+    token-budgeted batches, turned into a plan on the calling thread (which
+    owns the DB session), and embedded with KB_EMBED_CONCURRENCY requests in
+    flight. Yields (plan, vectors for texts_of(plan)) in input order.
+    """
+    numbered = enumerate(bounded(specs, _queue_size()), start=first_index)
+    plans = (plan(batch) for batch in token_batches(numbered, lambda item: item[1].token_count))
+    with ThreadPoolExecutor(max_workers=concurrency(), thread_name_prefix="ingest-embed") as pool:
+        yield from ordered_map(pool, lambda p: (p, embed_batch(texts_of(p))), plans, concurrency())
+
+@dataclass
+class _SyncPlan:
+    updates: List[dict]
+    inserts: List[dict]
+    relabelled: bool
+
+# Fields that appear in answers' source citations
+_CITED = ("language", "title", "page_start", "page_end")
+
+def write_chunks(
+    db: Session, doc: KBDocument, specs: Iterable[ChunkSpec], run: UUID, generation: int, first_index: int = 1
+) -> Tuple[bool, int]:
+    """
+    Stream specs into doc's chunks in `generation`, stamping every chunk
+    written or reused with `run`. Chunks are matched by content hash and
+    keep their embedding; only new text is embedded. Rows are committed
+    every KB_COMMIT_EVERY chunks. Several workers may write disjoint page
+    ranges of one document under the same run: a matched chunk is claimed
+    by stamping it with `run` in the same transaction that locked it (SKIP
+    LOCKED), before its batch is embedded. The stamp survives the commits
+    in between, and only chunks not yet stamped are candidates, so a chunk
+    is reused by at most one batch of one worker. Returns (any chunk added
+    or re-labelled, chunks written).
+    """
+    doc_id, language, title = doc.id, doc.language, doc.title
+
+    def plan(batch: Numbered) -> _SyncPlan:
+        hashed = [(chunk_index, spec, content_hash(spec.content)) for chunk_index, spec in batch]
+        found: Dict[str, list] = defaultdict(list)
+        rows = db.execute(
+            select(KBChunk.id, KBChunk.content_hash, *(getattr(KBChunk, c) for c in _CITED))
+            .where(
+                KBChunk.generation == generation,
+                KBChunk.document_id == doc_id,
+                KBChunk.content_hash.in_({h for _, _, h in hashed}),
+                KBChunk.ingest_run.is_distinct_from(run),
+            )
+            .with_for_update(skip_locked=True)
+        )
+        for row in rows:
+            found[row.content_hash].append(row)
 
-    doc = upsert_document(
-        db=db,
-        source_type="pdf",
-        title=title,
-        source_path=source_path,
-        language=language,
-        meta={"filename": path.name},
+        out = _SyncPlan([], [], False)
+        for chunk_index, spec, chunk_hash in hashed:
+            values = dict(
+                chunk_index=chunk_index,
+                language=language,
+                title=title,
+                token_count=spec.token_count,
+                page_start=spec.page_start,
+                page_end=spec.page_end,
+                meta=spec.meta,
+                content_hash=chunk_hash,
+                ingest_run=run,
+            )
+            if found[chunk_hash]:
+                row = found[chunk_hash].pop()
+                out.relabelled = out.relabelled or any(getattr(row, c) != values[c] for c in _CITED)
+                out.updates.append({"id": row.id, **values})
+            else:
+                out.inserts.append(
+                    {
+                        "id": uuid4(),
+                        "document_id": doc_id,
+                        "generation": generation,
+                        "content": spec.content,
+                        "created_at": utcnow(),
+                        **values,
+                    }
+                )
+        if out.updates:
+            # Claim the matched chunks durably, not just for this transaction
+            claimed = [row["id"] for row in out.updates]
+            db.execute(update(KBChunk).where(KBChunk.id.in_(claimed)).values(ingest_run=run))
+        return out
+
+    changed = False
+    written = uncommitted = 0
+    numbered = embedded_batches(specs, plan, lambda p: [row["content"] for row in p.inserts], first_index)
+    for p, vecs in numbered:
+        if p.updates:
+            db.execute(update(KBChunk), p.updates)
+        if p.inserts:
+            for row, vec in zip(p.inserts, vecs):
+                row["embedding"] = vec
+            db.execute(insert(KBChunk), p.inserts)
+        changed = changed or bool(p.inserts) or p.relabelled
+        written += len(p.updates) + len(p.inserts)
+        uncommitted += len(p.updates) + len(p.inserts)
+        if uncommitted >= _commit_every():
+            db.commit()
+            uncommitted = 0
+    db.commit()
+    return changed, written
+
+def finish_document(db: Session, doc: KBDocument, run: UUID, digest: str, changed: bool, generation: int) -> bool:
+    """
+    Delete doc's chunks in `generation` not stamped by `run` (gone from the
+    source) and record the file hash there. Until this commits, re-running
+    the file redoes it and finds already-written batches by hash instead of
+    re-embedding. Returns whether anything changed.
+    """
+    stale = db.execute(
+        delete(KBChunk).where(
+            KBChunk.generation == generation,
+            KBChunk.document_id == doc.id,
+            KBChunk.ingest_run.is_distinct_from(run),
+        )
+    )
+    changed = changed or stale.rowcount > 0
+    generations.record_document(db, generation, doc.id, digest)
+    db.commit()
+    return changed
+
+def renumber_chunks(db: Session, doc: KBDocument, generation: int) -> None:
+    """Make chunk_index contiguous in page order after page ranges were written independently."""
+    db.execute(
+        text(
+            """
+            UPDATE kb_chunks AS c SET chunk_index = o.n
+            FROM (
+                SELECT id, row_number() OVER (ORDER BY page_start NULLS FIRST, chunk_index) AS n
+                FROM kb_chunks WHERE generation = :generation AND document_id = :doc
+            ) AS o
+            WHERE c.id = o.id AND c.chunk_index <> o.n
+            """
+        ),
+        {"generation": generation, "doc": doc.id},
     )
-
-    # delete old chunks for this document
-    db.execute(delete(KBChunk).where(KBChunk.document_id == doc.id))
     db.commit()
 
-    rows_to_embed = []
-    chunk_records = []
-
-    chunk_index = 0
-    for page_idx, page in enumerate(reader.pages, start=1):
-        text = normalize_text(page.extract_text() or "")
+def sync_chunks(db: Session, doc: KBDocument, specs: Iterable[ChunkSpec], digest: str, generation: int) -> bool:
+    """
+    Make doc's chunks in `generation` match specs (see write_chunks /
+    finish_document). Returns True if any chunk was added, removed or
+    re-labelled.
+    """
+    run = uuid4()
+    changed, _ = write_chunks(db, doc, specs, run, generation)
+    return finish_document(db, doc, run, digest, changed, generation)
+
+@dataclass
+class Extracted:
+    source_type: str
+    language: str
+    specs: Iterable[ChunkSpec]  # lazy, consumed once
+
+Extractor = Callable[[Path, Optional[ExtractionPool]], Optional[Extracted]]
+Sources = List[Tuple[str, Extractor, Path]]
+
+def extract_pdf_pages(path: Path, start: int, stop: int) -> List[ChunkSpec]:
+    """
+    Chunk pages [start, stop) (0-based) with a fresh reader, so pypdf's object
+    cache never spans more than one range. Top-level so it can run in the
+    extraction process pool.
+    """
+    reader = PdfReader(str(path))
+    specs = []
+    for page_idx in range(start + 1, min(stop, len(reader.pages)) + 1):
+        text = normalize_text(reader.pages[page_idx - 1].extract_text() or "")
         if not text:
             continue
-
         for piece, tok_count in chunk_by_tokens(text):
-            chunk_index += 1
-            chunk_id = uuid4()
-            chunk_records.append(
-                KBChunk(
-                    id=chunk_id,
-                    document_id=doc.id,
-                    chunk_index=chunk_index,
-                    content=piece,
-                    token_count=tok_count,
-                    page_start=page_idx,
-                    page_end=page_idx,
-                    meta={"type": "pdf", "page": page_idx},
-                    created_at=utcnow(),
-                    embedding=[0.0] * EMBEDDING_DIM,  # placeholder, replaced after embedding
-                )
-            )
-            rows_to_embed.append((chunk_id, piece))
+            specs.append(ChunkSpec(piece, tok_count, page_idx, page_idx, {"type": "pdf", "page": page_idx}))
+    return specs
 
-    # batch embed and insert
-    batch_size = 64
-    for i in range(0, len(rows_to_embed), batch_size):
-        batch = rows_to_embed[i : i + batch_size]
-        texts = [t for _, t in batch]
-        vecs = embed_texts(texts)
-        id_to_vec = {cid: v for (cid, _), v in zip(batch, vecs)}
+def _extract_pdf_range(args: Tuple[Path, int, int]) -> List[ChunkSpec]:
+    return extract_pdf_pages(*args)
 
-        for rec in chunk_records:
-            if rec.id in id_to_vec:
-                rec.embedding = id_to_vec[rec.id]
+def pdf_outline(path: Path) -> Tuple[str, int]:
+    """(language, page count) without extracting the whole document."""
+    reader = PdfReader(str(path))
 
-    db.add_all(chunk_records)
-    db.commit()
+    # detect language from first pages
+    sample = ""
+    for i, page in enumerate(reader.pages[:3]):
+        sample += (page.extract_text() or "") + "\n"
+    return detect_language(sample), len(reader.pages)
 
-def ingest_faq(db: Session, path: Path):
-    title = path.stem
-    source_path = str(path)
-    raw = normalize_text(path.read_text(encoding="utf-8", errors="ignore"))
-    if not raw:
-        return
+def pdf_page_ranges(pages: int) -> List[Tuple[int, int]]:
+    step = _pages_per_task()
+    return [(start, start + step) for start in range(0, pages, step)]
 
-    language = detect_language(raw)
-    doc = upsert_document(
-        db=db,
-        source_type="faq",
-        title=title,
-        source_path=source_path,
-        language=language,
-        meta={"filename": path.name},
-    )
+def extract_pdf(path: Path, pool: Optional[ExtractionPool] = None) -> Optional[Extracted]:
+    language, pages = pdf_outline(path)
+    ranges = [(path, start, stop) for start, stop in pdf_page_ranges(pages)]
 
-    db.execute(delete(KBChunk).where(KBChunk.document_id == doc.id))
-    db.commit()
+    def specs() -> Iterator[ChunkSpec]:
+        if pool is None:
+            parts: Iterable[List[ChunkSpec]] = map(_extract_pdf_range, ranges)
+        else:
+            parts = ordered_map(pool, _extract_pdf_range, ranges, 2 * pool.workers)
+        for part in parts:
+            yield from part
 
-    chunk_records = []
-    rows_to_embed = []
-
-    chunk_index = 0
-    for piece, tok_count in chunk_by_tokens(raw):
-        chunk_index += 1
-        chunk_id = uuid4()
-        chunk_records.append(
-            KBChunk(
-                id=chunk_id,
-                document_id=doc.id,
-                chunk_index=chunk_index,
-                content=piece,
-                token_count=tok_count,
-                page_start=None,
-                page_end=None,
-                meta={"type": "faq"},
-                created_at=utcnow(),
-                embedding=[0.0] * EMBEDDING_DIM,
-            )
-        )
-        rows_to_embed.append((chunk_id, piece))
-
-    batch_size = 64
-    for i in range(0, len(rows_to_embed), batch_size):
-        batch = rows_to_embed[i : i + batch_size]
-        texts = [t for _, t in batch]
-        vecs = embed_texts(texts)
-        id_to_vec = {cid: v for (cid, _), v in zip(batch, vecs)}
-        for rec in chunk_records:
-            if rec.id in id_to_vec:
-                rec.embedding = id_to_vec[rec.id]
-
-    db.add_all(chunk_records)
-    db.commit()
+    return Extracted("pdf", language, specs())
 
-def ingest_csv(db: Session, path: Path):
-    title = path.stem
-    source_path = str(path)
+def extract_faq(path: Path, pool: Optional[ExtractionPool] = None) -> Optional[Extracted]:
+    raw = normalize_text(path.read_text(encoding="utf-8", errors="ignore"))
+    if not raw:
+        return None
+    specs = (ChunkSpec(piece, tok_count, None, None, {"type": "faq"}) for piece, tok_count in chunk_by_tokens(raw))
+    return Extracted("faq", detect_language(raw), specs)
 
-    rows = []
+def extract_csv(path: Path, pool: Optional[ExtractionPool] = None) -> Optional[Extracted]:
     with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
-
-    if not rows:
-        return
+        first = next(csv.DictReader(f), None)
+    if first is None:
+        return None
 
     # detect language from a sample of row strings
-    sample = " ".join([" ".join([str(v) for v in rows[0].values()])])
+    sample = " ".join([" ".join([str(v) for v in first.values()])])
     language = detect_language(sample)
 
+    def specs() -> Iterator[ChunkSpec]:
+        row = 0
+        with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+            for r in csv.DictReader(f):
+                # turn a row into a searchable chunk
+                parts = []
+                for k, v in r.items():
+                    if v is None:
+                        continue
+                    v = str(v).strip()
+                    if v:
+                        parts.append(f"{k}: {v}")
+                text = normalize_text("\n".join(parts))
+                if not text:
+                    continue
+                row += 1
+                yield ChunkSpec(text, count_tokens(text), None, None, {"type": "csv", "row": row})
+
+    return Extracted("csv", language, specs())
+
+EXTRACTORS: Dict[str, Extractor] = {"PDF": extract_pdf, "FAQ": extract_faq, "CSV": extract_csv}
+
+def kb_sources(kb: Path) -> Sources:
+    """Files under a kb/ folder in ingest order: pdfs/, faqs/, catalog/."""
+    pdf_dir = kb / "pdfs"
+    faq_dir = kb / "faqs"
+    csv_dir = kb / "catalog"
+    return (
+        [("PDF", extract_pdf, p) for p in sorted(pdf_dir.glob("*.pdf"))]
+        + [("FAQ", extract_faq, p) for p in sorted(list(faq_dir.glob("*.md")) + list(faq_dir.glob("*.txt")))]
+        + [("CSV", extract_csv, p) for p in sorted(csv_dir.glob("*.csv"))]
+    )
+
+def changed_sources(db: Session, sources: Sources, generation: Optional[int]) -> Sources:
+    """Sources whose file differs from what `generation` was built from (all of them if None)."""
+    if generation is None:
+        return list(sources)
+    return [src for src in sources if not unchanged_document(db, str(src[2]), file_hash(src[2]), generation)]
+
+def extract_sources(
+    db: Session, sources: Sources, generation: int, workers: int = 1, skip_unchanged: bool = True
+) -> Iterator[Tuple[str, Path, str, Optional[Extracted]]]:
+    """
+    Yields (kind, path, file hash, extraction) in source order; extraction is
+    None for files unchanged in `generation` and empty files. Chunks are
+    produced lazily; with workers > 1, PDF page ranges are extracted in a
+    process pool.
+    """
+    pool = extraction_pool(workers) if workers > 1 else None
+    try:
+        for kind, extract, path in sources:
+            digest = file_hash(path)
+            if skip_unchanged and unchanged_document(db, str(path), digest, generation):
+                yield kind, path, digest, None
+                continue
+            yield kind, path, digest, extract(path, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def ingest_extracted(db: Session, path: Path, digest: str, extracted: Extracted, generation: int) -> bool:
     doc = upsert_document(
         db=db,
-        source_type="csv",
-        title=title,
-        source_path=source_path,
-        language=language,
+        source_type=extracted.source_type,
+        title=path.stem,
+        source_path=str(path),
+        language=extracted.language,
         meta={"filename": path.name},
     )
-
-    db.execute(delete(KBChunk).where(KBChunk.document_id == doc.id))
+    return sync_chunks(db, doc, extracted.specs, digest, generation)
+
+def ingest_file(db: Session, path: Path, extract: Extractor, generation: int) -> Optional[bool]:
+    """Returns None if the file is unchanged or empty, otherwise whether any chunk changed."""
+    digest = file_hash(path)
+    if unchanged_document(db, str(path), digest, generation):
+        return None
+    extracted = extract(path, None)
+    if extracted is None:
+        return None
+    return ingest_extracted(db, path, digest, extracted, generation)
+
+def ingest_pdf(db: Session, path: Path, generation: int) -> Optional[bool]:
+    return ingest_file(db, path, extract_pdf, generation)
+
+def ingest_faq(db: Session, path: Path, generation: int) -> Optional[bool]:
+    return ingest_file(db, path, extract_faq, generation)
+
+def ingest_csv(db: Session, path: Path, generation: int) -> Optional[bool]:
+    return ingest_file(db, path, extract_csv, generation)
+
+def bulk_ingest(db: Session, sources: Sources, generation: int, workers: int = 1) -> int:
+    """
+    Full rebuild into `generation`, which must be new and empty: stream
+    every file's chunks in with binary COPY, committing every
+    KB_COMMIT_EVERY rows. The generation has no indexes yet, so nothing is
+    maintained per row; generations.finish builds them once afterwards.
+    Returns the number of chunk rows loaded.
+    """
+    from app.rag import bulk_load
+
+    total = 0
+    with bulk_load.connect() as conn:
+        for kind, path, digest, extracted in extract_sources(db, sources, generation, workers, skip_unchanged=False):
+            if extracted is None:
+                continue
+            doc = upsert_document(
+                db=db,
+                source_type=extracted.source_type,
+                title=path.stem,
+                source_path=str(path),
+                language=extracted.language,
+                meta={"filename": path.name},
+            )
+            loaded = 0
+            batches = embedded_batches(extracted.specs, lambda b: b, lambda b: [s.content for _, s in b])
+            for first in batches:
+                # one COPY per commit; the inner loop pulls from the same generator
+                with bulk_load.chunk_copy(conn) as write:
+                    rows = 0
+                    for batch, vecs in chain([first], batches):
+                        for (chunk_index, spec), vec in zip(batch, vecs):
+                            write(
+                                bulk_load.chunk_row(
+                                    uuid4(),
+                                    doc.id,
+                                    generation,
+                                    chunk_index,
+                                    doc.language,
+                                    doc.title,
+                                    spec.content,
+                                    content_hash(spec.content),
+                                    spec.token_count,
+                                    spec.page_start,
+                                    spec.page_end,
+                                    spec.meta,
+                                    utcnow(),
+                                    vec,
+                                )
+                            )
+                        rows += len(batch)
+                        if rows >= _commit_every():
+                            break
+                conn.commit()
+                loaded += rows
+            generations.record_document(db, generation, doc.id, digest)
+            db.commit()
+            total += loaded
+            print(f"Loaded {kind}: {path} ({loaded} chunks)")
+    return total
+
+def _all_generations(db: Session) -> List[int]:
+    return [g.id for g in generations.list_generations(db)]
+
+def convert_embeddings(db: Session) -> None:
+    """Convert stored embeddings in place to EMBEDDING_STORAGE(EMBEDDING_DIM) (truncate + re-normalize)."""
+    convert_embedding_storage(lambda sql: db.execute(text(sql)), generations=_all_generations(db))
     db.commit()
 
-    chunk_records = []
-    rows_to_embed = []
-
-    chunk_index = 0
-    for r in rows:
-        # turn a row into a searchable chunk
-        parts = []
-        for k, v in r.items():
-            if v is None:
-                continue
-            v = str(v).strip()
-            if v:
-                parts.append(f"{k}: {v}")
-        text = normalize_text("\n".join(parts))
-        if not text:
-            continue
+def reembed_all(db: Session, batch_size: int = 64) -> int:
+    """
+    Re-embed every chunk into a fresh EMBEDDING_STORAGE(EMBEDDING_DIM) column,
+    then swap it in. Safe to re-run after a crash: rows already filled are kept.
+    """
+    target = embedding_sql_type()
+    db.execute(text(f"ALTER TABLE kb_chunks ADD COLUMN IF NOT EXISTS embedding_new {target}"))
+    db.commit()
 
-        chunk_index += 1
-        chunk_id = uuid4()
-        tok_count = len(text.split())
-        chunk_records.append(
-            KBChunk(
-                id=chunk_id,
-                document_id=doc.id,
-                chunk_index=chunk_index,
-                content=text,
-                token_count=tok_count,
-                page_start=None,
-                page_end=None,
-                meta={"type": "csv", "row": chunk_index},
-                created_at=utcnow(),
-                embedding=[0.0] * EMBEDDING_DIM,
-            )
+    total = 0
+    while True:
+        rows = db.execute(
+            text("SELECT id, content FROM kb_chunks WHERE embedding_new IS NULL LIMIT :n"),
+            {"n": batch_size},
+        ).all()
+        if not rows:
+            break
+        vecs = embed_texts_cached([r.content for r in rows])
+        db.execute(
+            text(f"UPDATE kb_chunks SET embedding_new = CAST(:vec AS {target}) WHERE id = :id"),
+            [{"id": r.id, "vec": "[" + ",".join(map(str, v)) + "]"} for r, v in zip(rows, vecs)],
         )
-        rows_to_embed.append((chunk_id, text))
-
-    batch_size = 64
-    for i in range(0, len(rows_to_embed), batch_size):
-        batch = rows_to_embed[i : i + batch_size]
-        texts = [t for _, t in batch]
-        vecs = embed_texts(texts)
-        id_to_vec = {cid: v for (cid, _), v in zip(batch, vecs)}
-        for rec in chunk_records:
-            if rec.id in id_to_vec:
-                rec.embedding = id_to_vec[rec.id]
-
-    db.add_all(chunk_records)
+        db.commit()
+        total += len(rows)
+        print(f"Re-embedded {total} chunks")
+
+    swap_reembedded_column(lambda sql: db.execute(text(sql)), generations=_all_generations(db))
     db.commit()
+    return total
+
+def publish_snapshot_if_configured(db: Session, changed: bool = True) -> None:
+    """Publish the in-process retrieval snapshot when the numpy backend is configured."""
+    if not os.getenv("KB_SNAPSHOT_DIR"):
+        return
+    from app.rag.numpy_index import CURRENT_FILE, publish_snapshot, snapshot_dir
+
+    if not changed and (snapshot_dir() / CURRENT_FILE).exists():
+        return
+    print(f"Published retrieval snapshot: {publish_snapshot(db)}")
+
+def _print_generations(db: Session) -> None:
+    print(f"{'id':>4} {'status':<9} {'chunks':>8} {'created':<20} {'activated':<20}")
+    for g in generations.list_generations(db):
+        activated = f"{g.activated_at:%Y-%m-%d %H:%M:%S}" if g.activated_at else "-"
+        print(f"{g.id:>4} {g.status:<9} {g.chunk_count:>8} {g.created_at:%Y-%m-%d %H:%M:%S}  {activated:<20}")
+
+def _finish(db: Session, generation: int, activate: bool) -> None:
+    problems = generations.finish(db, generation, activate_ready=activate)
+    if problems:
+        print(f"Generation {generation} failed verification: {'; '.join(problems)}")
+        raise SystemExit(1)
+    if activate:
+        print(f"Activated generation {generation}")
+    else:
+        print(f"Generation {generation} is ready; activate it with --activate {generation}")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--kb-path", default="kb", help="Path to kb/ folder")
+    ap.add_argument(
+        "--convert-embeddings",
+        action="store_true",
+        help="Convert stored embeddings to EMBEDDING_STORAGE(EMBEDDING_DIM) in place and rebuild indexes",
+    )
+    ap.add_argument(
+        "--reembed",
+        action="store_true",
+        help="Re-embed all chunks at EMBEDDING_DIM (needed when growing the dimension)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("KB_INGEST_WORKERS", "1")),
+        help="Processes for PDF/CSV extraction and tokenization (1 = in-process)",
+    )
+    ap.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Full rebuild: COPY all chunks into a new generation and build its HNSW indexes once at the end",
+    )
+    ap.add_argument(
+        "--no-activate",
+        action="store_true",
+        help="Build and verify the new generation but leave it 'ready' instead of switching to it",
+    )
+    ap.add_argument("--list-generations", action="store_true", help="List KB generations and exit")
+    ap.add_argument("--activate", type=int, metavar="N", help="Switch retrieval to generation N (ready or retired)")
+    ap.add_argument("--rollback", action="store_true", help="Switch back to the previously active generation")
+    ap.add_argument("--gc", action="store_true", help="Drop failed, abandoned and surplus retired generations")
+    ap.add_argument(
+        "--profile",
+        nargs="?",
+        const="sample",
+        choices=profiling.MODES,
+        help="Profile this run (main thread) into PROFILE_DIR: sampled folded stacks or cProfile stats",
+    )
     args = ap.parse_args()
 
-    kb = Path(args.kb_path)
-    pdf_dir = kb / "pdfs"
-    faq_dir = kb / "faqs"
-    csv_dir = kb / "catalog"
+    if not args.profile:
+        _run(args)
+        return
+    with profiling.profile(args.profile, "ingest_kb " + " ".join(sys.argv[1:])) as info:
+        _run(args)
+    print(f"Profile {info['id']}: {info['path']} (wall {info['wall_ms']:.0f} ms, cpu {info['cpu_ms']:.0f} ms)")
+
+def _run(args: argparse.Namespace) -> None:
+    if args.list_generations or args.activate is not None or args.rollback or args.gc:
+        with SessionLocal() as db:
+            if args.activate is not None:
+                generations.activate(db, args.activate)
+                print(f"Activated generation {args.activate}")
+            elif args.rollback:
+                previous = generations.rollback(db)
+                print(f"Rolled back to generation {previous}" if previous else "No retired generation to roll back to")
+            elif args.gc:
+                dropped = generations.gc(db)
+                print(f"Dropped generations: {', '.join(map(str, dropped)) or 'none'}")
+            _print_generations(db)
+        return
 
-    with SessionLocal() as db:
-        for p in sorted(pdf_dir.glob("*.pdf")):
-            ingest_pdf(db, p)
-            print(f"Ingested PDF: {p}")
+    if args.convert_embeddings or args.reembed:
+        with SessionLocal() as db:
+            if args.reembed:
+                print(f"Re-embedded {reembed_all(db)} chunks as {embedding_sql_type()}")
+            else:
+                convert_embeddings(db)
+                print(f"Converted embeddings to {embedding_sql_type()}")
+            publish_snapshot_if_configured(db)
+        return
 
-        for p in sorted(list(faq_dir.glob("*.md")) + list(faq_dir.glob("*.txt"))):
-            ingest_faq(db, p)
-            print(f"Ingested FAQ: {p}")
+    sources = kb_sources(Path(args.kb_path))
+    activate = not args.no_activate
+
+    if args.bulk:
+        with SessionLocal() as db:
+            generation = generations.begin(db, copy_active=False, meta={"mode": "bulk"})
+            started = time.perf_counter()
+            try:
+                rows = bulk_ingest(db, sources, generation, workers=args.workers)
+            except BaseException as exc:
+                db.rollback()
+                generations.mark_failed(db, generation, repr(exc))
+                raise
+            elapsed = time.perf_counter() - started
+            print(f"Bulk loaded {rows} chunks in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+            _finish(db, generation, activate)
+        print("Done.")
+        return
 
-        for p in sorted(csv_dir.glob("*.csv")):
-            ingest_csv(db, p)
-            print(f"Ingested CSV: {p}")
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        active = generations.active_id(db)
+        pending = changed_sources(db, sources, active)
+        pending_paths = {p for _, _, p in pending}
+        for kind, _, p in sources:
+            if p not in pending_paths:
+                print(f"Unchanged {kind}: {p}")
+        if not pending and active is not None:
+            publish_snapshot_if_configured(db, changed=False)
+            print("Nothing changed; active generation kept.")
+            return
+
+        # Unchanged files are carried over by the copy; only changed ones are rewritten
+        with generations.claim(db, meta={"mode": "incremental"}) as (generation, resumed):
+            if resumed:
+                print(f"Resuming generation {generation}")
+            try:
+                for kind, p, digest, extracted in extract_sources(db, pending, generation, workers=args.workers):
+                    if extracted is None:
+                        print(f"Unchanged or empty {kind}: {p}")
+                        continue
+                    ingest_extracted(db, p, digest, extracted, generation)
+                    print(f"Ingested {kind}: {p}")
+            except BaseException:
+                # Left 'building': the next run resumes from its last committed batch
+                db.rollback()
+                print(f"Generation {generation} is incomplete; re-run to resume it")
+                raise
+            _finish(db, generation, activate)
+
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
 
     print("Done.")
 
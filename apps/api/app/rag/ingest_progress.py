@@ -0,0 +1,124 @@
+"""
+Progress of distributed KB ingest runs, kept in one Redis hash per run.
+The API creates the run and reads it; Celery workers update the counters.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.core.redis_client import get_async_redis, get_redis
+
+INT_FIELDS = (
+    "files_total",
+    "files_done",
+    "files_unchanged",
+    "files_changed",
+    "tasks_total",
+    "tasks_done",
+    "chunks",
+)
+
+def _key(run_id: str) -> str:
+    return f"kb_ingest:{run_id}"
+
+def _files_key(run_id: str) -> str:
+    # Files of the run already counted as done, so a redelivered task is not counted twice
+    return f"kb_ingest:{run_id}:files"
+
+def _ttl_seconds() -> int:
+    return int(os.getenv("KB_INGEST_PROGRESS_TTL_SECONDS", str(7 * 24 * 3600)))
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+async def create(run_id: str, kb_path: str) -> dict:
+    r = get_async_redis()
+    if r is None:
+        raise RuntimeError("REDIS_URL is not set")
+    state = {"run_id": run_id, "kb_path": kb_path, "status": "queued", "created_at": _now()}
+    state.update({field: 0 for field in INT_FIELDS})
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hset(_key(run_id), mapping=state)
+        pipe.expire(_key(run_id), _ttl_seconds())
+        await pipe.execute()
+    return state
+
+async def get(run_id: str) -> Optional[dict]:
+    r = get_async_redis()
+    if r is None:
+        return None
+    state = await r.hgetall(_key(run_id))
+    if not state:
+        return None
+    for field in INT_FIELDS:
+        state[field] = int(state.get(field, 0))
+    return state
+
+def update(run_id: str, **fields) -> None:
+    r = get_redis()
+    if r is not None:
+        r.hset(_key(run_id), mapping={k: str(v) for k, v in fields.items()})
+
+def incr(run_id: str, **counts: int) -> dict:
+    """Atomically add to counters; returns the new values (plus files_total)."""
+    r = get_redis()
+    if r is None:
+        return {}
+    with r.pipeline(transaction=True) as pipe:
+        for field, n in counts.items():
+            pipe.hincrby(_key(run_id), field, n)
+        pipe.hget(_key(run_id), "files_total")
+        *values, total = pipe.execute()
+    out = dict(zip(counts, values))
+    out["files_total"] = int(total or 0)
+    return out
+
+def files_skipped(run_id: str, files: List[str]) -> None:
+    """Count files the run does not need to write (unchanged) as done."""
+    r = get_redis()
+    if r is None or not files:
+        return
+    with r.pipeline(transaction=True) as pipe:
+        pipe.sadd(_files_key(run_id), *files)
+        pipe.expire(_files_key(run_id), _ttl_seconds())
+        pipe.execute()
+    incr(run_id, files_done=len(files), files_unchanged=len(files))
+
+def file_done(run_id: str, file: str, changed: bool) -> Optional[dict]:
+    """
+    Count one finished file, once: a task redelivered after it counted its
+    file (acks_late) changes nothing. Returns the counters to exactly one
+    caller: the one that finished the run's last file, which must finish
+    the run.
+    """
+    r = get_redis()
+    if r is None:
+        return None
+    # Adding to the set and reading its size in one transaction gives each
+    # file a distinct count, so only one caller sees the last one
+    with r.pipeline(transaction=True) as pipe:
+        pipe.sadd(_files_key(run_id), file)
+        pipe.scard(_files_key(run_id))
+        pipe.expire(_files_key(run_id), _ttl_seconds())
+        pipe.hget(_key(run_id), "files_total")
+        added, done, _, total = pipe.execute()
+    if not added:
+        return None
+    state = incr(run_id, files_done=1, files_changed=int(changed))
+    if done == int(total or 0):
+        return state
+    return None
+
+def started(run_id: str, files_total: int, **fields) -> None:
+    update(run_id, status="running", started_at=_now(), files_total=files_total, **fields)
+
+def indexing(run_id: str) -> None:
+    update(run_id, status="indexing")
+
+def finished(run_id: str) -> None:
+    update(run_id, status="done", finished_at=_now())
+
+def failed(run_id: str, error: str) -> None:
+    update(run_id, status="failed", error=error[:500], finished_at=_now())
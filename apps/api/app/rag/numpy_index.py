@@ -0,0 +1,151 @@
+"""
+In-process vector index for small and medium knowledge bases.
+
+Ingestion publishes a snapshot directory (`embeddings.npy` + `chunks.json`)
+under KB_SNAPSHOT_DIR and points `CURRENT` at it with an atomic rename.
+API workers memory-map the matrix, so all uvicorn workers on a host share
+the same page cache, and reload when `CURRENT` changes.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db.models import KBChunk, KBGeneration
+
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 2
+
+def snapshot_dir() -> Path:
+    return Path(os.getenv("KB_SNAPSHOT_DIR", "kb_snapshot"))
+
+def _dtype() -> str:
+    return "float16" if os.getenv("KB_SNAPSHOT_DTYPE", "float32") == "float16" else "float32"
+
+def _check_interval() -> float:
+    return float(os.getenv("KB_SNAPSHOT_CHECK_SECONDS", "5"))
+
+def _as_array(vec) -> np.ndarray:
+    # pgvector returns numpy arrays for vector and HalfVector for halfvec
+    if hasattr(vec, "to_numpy"):
+        vec = vec.to_numpy()
+    return np.asarray(vec, dtype=np.float32)
+
+def publish_snapshot(db: Session, root: Optional[Path] = None, batch_size: int = 1000) -> Path:
+    """Dump the active generation's chunks into a new snapshot directory and make it current."""
+    root = root or snapshot_dir()
+    generation = db.scalar(select(KBGeneration.id).where(KBGeneration.status == "active"))
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"snap-{int(time.time())}-{uuid4().hex[:8]}"
+    target = root / name
+    target.mkdir()
+
+    count = db.scalar(select(func.count(KBChunk.id)).where(KBChunk.generation == generation)) or 0
+    matrix = None
+    meta = []
+    stmt = select(
+        KBChunk.title,
+        KBChunk.language,
+        KBChunk.page_start,
+        KBChunk.page_end,
+        KBChunk.content,
+        KBChunk.embedding,
+    ).where(KBChunk.generation == generation).order_by(KBChunk.document_id, KBChunk.chunk_index)
+    for i, row in enumerate(db.execute(stmt.execution_options(yield_per=batch_size))):
+        if i >= count:
+            break  # rows added after the count; the next publish picks them up
+        vec = _as_array(row.embedding)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                target / "embeddings.npy", mode="w+", dtype=_dtype(), shape=(count, vec.shape[0])
+            )
+        norm = float(np.linalg.norm(vec)) or 1.0
+        matrix[i] = vec / norm
+        meta.append([row.title, row.language, row.page_start, row.page_end, row.content])
+
+    if matrix is None:
+        np.save(target / "embeddings.npy", np.zeros((0, 0), dtype=_dtype()))
+    else:
+        matrix.flush()
+        del matrix
+    (target / "chunks.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    (target / "generation.json").write_text(json.dumps({"generation": generation}), encoding="utf-8")
+
+    tmp = root / f".{CURRENT_FILE}.{name}"
+    tmp.write_text(name, encoding="utf-8")
+    os.replace(tmp, root / CURRENT_FILE)
+
+    snapshots = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith("snap-"))
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+class NumpyIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        meta = json.loads((path / "chunks.json").read_text(encoding="utf-8"))
+        # Rows past len(meta) were never filled (chunks deleted mid-publish)
+        self.embeddings = np.load(path / "embeddings.npy", mmap_mode="r")[: len(meta)]
+        self.titles = [m[0] for m in meta]
+        self.languages = np.array([m[1] for m in meta])
+        self.pages = [(m[2], m[3]) for m in meta]
+        self.contents = [m[4] for m in meta]
+        # KB generation the snapshot was dumped from; None for snapshots
+        # published before it was recorded (never used until republished)
+        self.generation: Optional[int] = None
+        generation_file = path / "generation.json"
+        if generation_file.exists():
+            self.generation = json.loads(generation_file.read_text(encoding="utf-8"))["generation"]
+
+    def search(self, qvec: List[float], language: Optional[str], top_k: int) -> List[Tuple[int, float]]:
+        """(row, cosine distance) pairs, same language first, then any language."""
+        if not len(self.contents):
+            return []
+        q = np.asarray(qvec, dtype=np.float32)
+        q /= float(np.linalg.norm(q)) or 1.0
+
+        scores = self.embeddings @ q
+        rows = np.flatnonzero(self.languages == language) if language else None
+        if rows is not None and rows.size:
+            scores = scores[rows]
+        else:
+            rows = None
+
+        k = min(top_k, scores.shape[0])
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        idx = rows[best] if rows is not None else best
+        return [(int(i), float(1.0 - s)) for i, s in zip(idx, scores[best])]
+
+_index: Optional[NumpyIndex] = None
+_index_name: Optional[str] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def get_index() -> Optional[NumpyIndex]:
+    """Current snapshot, re-checking CURRENT at most every KB_SNAPSHOT_CHECK_SECONDS."""
+    global _index, _index_name, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < _check_interval():
+        return _index
+    with _lock:
+        _checked_at = now
+        current = snapshot_dir() / CURRENT_FILE
+        try:
+            name = current.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return _index
+        if name != _index_name:
+            _index = NumpyIndex(snapshot_dir() / name)
+            _index_name = name
+        return _index
@@ -0,0 +1,138 @@
+"""
+Throughput helpers for ingest_kb: token-budgeted embedding batches sent with
+bounded concurrency (retrying rate limits with backoff), a process pool for
+PDF text extraction and tokenization, and bounded hand-offs between pipeline
+stages so memory stays flat however large the input is.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from app.core.embedding_cache import embed_texts_cached
+
+RETRYABLE = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def _batch_tokens() -> int:
+    return int(os.getenv("KB_EMBED_BATCH_TOKENS", "8000"))
+
+def _batch_items() -> int:
+    return int(os.getenv("KB_EMBED_BATCH_MAX_ITEMS", "100"))
+
+def concurrency() -> int:
+    return max(1, int(os.getenv("KB_EMBED_CONCURRENCY", "4")))
+
+def _max_retries() -> int:
+    return int(os.getenv("KB_EMBED_MAX_RETRIES", "6"))
+
+def _backoff_seconds() -> float:
+    return float(os.getenv("KB_EMBED_BACKOFF_SECONDS", "1.0"))
+
+def token_batches(items: Iterable[T], tokens_of: Callable[[T], int]) -> Iterator[List[T]]:
+    """
+    Group items into batches of at most KB_EMBED_BATCH_TOKENS tokens and
+    KB_EMBED_BATCH_MAX_ITEMS items, lazily. An item larger than the token
+    budget goes out alone.
+    """
+    max_tokens, max_items = _batch_tokens(), _batch_items()
+    batch: List[T] = []
+    tokens = 0
+    for item in items:
+        count = tokens_of(item)
+        if batch and (tokens + count > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += count
+    if batch:
+        yield batch
+
+def with_retry(fn: Callable[[], List[List[float]]]) -> List[List[float]]:
+    """Exponential backoff with full jitter on rate limits and transient provider errors."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except RETRYABLE:
+            attempt += 1
+            if attempt > _max_retries():
+                raise
+            time.sleep(random.uniform(0, min(60.0, _backoff_seconds() * 2 ** attempt)))
+
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    return with_retry(lambda: embed_texts_cached(texts)) if texts else []
+
+def ordered_map(pool: Executor, fn: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """
+    pool.map that keeps at most `window` calls in flight and pulls `items`
+    lazily, so neither inputs nor results pile up ahead of the consumer.
+    """
+    pending: deque = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+_DONE = object()
+
+def bounded(items: Iterable[T], maxsize: int) -> Iterator[T]:
+    """
+    Run `items` in a background thread that stays at most `maxsize` items
+    ahead of the consumer. Exceptions are re-raised in the consumer; if the
+    consumer stops early the producer is abandoned at its next put.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+            _put(_DONE)
+        except BaseException as exc:  # surfaced to the consumer
+            _put(exc)
+
+    threading.Thread(target=_produce, name="ingest-reader", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+class ExtractionPool(ProcessPoolExecutor):
+    """Process pool for CPU-bound extraction; pypdf and tiktoken hold the GIL."""
+
+    def __init__(self, workers: int) -> None:
+        super().__init__(max_workers=workers)
+        self.workers = workers
+
+def extraction_pool(workers: int) -> ExtractionPool:
+    return ExtractionPool(workers)
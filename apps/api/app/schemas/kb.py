@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+
+class IngestRequest(BaseModel):
+    kb_path: str | None = Field(
+        default=None,
+        description="kb/ folder as mounted in the worker containers: KB_INGEST_ROOT (default) or a folder under it",
+    )
+
+class IngestRunResponse(BaseModel):
+    run_id: str
+    kb_path: str
+    status: str  # queued|running|indexing|done|failed
+    generation: int | None = None  # KB generation the run builds; None when nothing changed
+    files_total: int = 0
+    files_done: int = 0
+    files_unchanged: int = 0
+    files_changed: int = 0
+    tasks_total: int = 0
+    tasks_done: int = 0
+    chunks: int = 0
+    error: str | None = None
+    created_at: str | None = None
+    started_at: str | None = None
+    finished_at: str | None = None
@@ -15,12 +15,32 @@ class TicketResponse(BaseModel):
     ticket_id: UUID
     status: str
 
+class CreateTicketsRequest(BaseModel):
+    tickets: list[CreateTicketRequest] = Field(..., min_length=1, max_length=500)
+
+class TicketResult(BaseModel):
+    ok: bool
+    ticket_id: UUID | None = None
+    status: str | None = None
+    error: str | None = None
+
+class CreateTicketsResponse(BaseModel):
+    results: list[TicketResult]
+    failed: int
+
 class LookupOrderResponse(BaseModel):
     order_id: str
     status: str
     delivery_area: str | None = None
     items: dict | None = None
 
+class LookupOrdersRequest(BaseModel):
+    order_ids: list[str] = Field(..., min_length=1, max_length=100, examples=[["ETH-1001", "ETH-1002"]])
+
+class LookupOrdersResponse(BaseModel):
+    orders: list[LookupOrderResponse]
+    not_found: list[str]
+
 class ScheduleCallbackRequest(BaseModel):
     external_id: str
     channel: str = Field(default="telegram")
@@ -32,6 +52,20 @@ class CallbackResponse(BaseModel):
     status: str
     scheduled_time: datetime
 
+class ScheduleCallbacksRequest(BaseModel):
+    callbacks: list[ScheduleCallbackRequest] = Field(..., min_length=1, max_length=500)
+
+class CallbackResult(BaseModel):
+    ok: bool
+    callback_id: UUID | None = None
+    status: str | None = None
+    scheduled_time: datetime | None = None
+    error: str | None = None
+
+class ScheduleCallbacksResponse(BaseModel):
+    results: list[CallbackResult]
+    failed: int
+
 class HandoffRequest(BaseModel):
     external_id: str
     channel: str = Field(default="telegram")
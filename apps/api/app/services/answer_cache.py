@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import bindparam, delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db import unit_of_work
+from app.db.models import AnswerCacheEntry, KBGeneration
+from app.db.session import AsyncSessionLocal
+
+# The async helpers run in the caller's transaction and never commit
+# (see app.db.unit_of_work). Process-local counters; persisted per-entry
+# hits live in the table. Hits are buffered and written after the turn
+# commits, in a short transaction of their own, so a popular entry's row
+# is never locked for the length of a turn. Expired and surplus entries
+# are evicted by the worker (evict(), on beat), not on the request path.
+#
+# Every entry records the KB generation whose chunks it was built from, and
+# lookups only match the generation being served. A KB switch therefore
+# needs no purge: turns still answering from the old generation may store
+# entries after it, but they are never served again (unless that
+# generation is rolled back to) and evict() drops them.
+_stats = {"hits_exact": 0, "hits_semantic": 0, "misses": 0, "saved_ms": 0}
+
+# entry id -> [hits not yet written, last hit time]
+_pending_hits: Dict[UUID, list] = {}
+_flushing = False
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: str
+    gen_ms: int
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _enabled() -> bool:
+    return os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def _max_distance() -> float:
+    return float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")))
+
+def _max_entries() -> int:
+    return int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+def normalize_question(question: str) -> str:
+    q = question.lower().strip()
+    q = re.sub(r"\s+", " ", q)
+    return q.strip(" ?!.,;:።፧")
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+_HITS_UPDATE = (
+    update(AnswerCacheEntry.__table__)
+    .where(AnswerCacheEntry.__table__.c.id == bindparam("entry_id"))
+    .values(hits=AnswerCacheEntry.__table__.c.hits + bindparam("n"), last_hit_at=bindparam("at"))
+)
+
+async def flush_hits() -> None:
+    """Write buffered hit counts; concurrent calls leave it to the one already running."""
+    global _flushing
+    if _flushing:
+        return
+    _flushing = True
+    try:
+        while _pending_hits:
+            # Sorted by id so concurrent flushes in other processes lock rows in the same order
+            batch: List[dict] = [
+                {"entry_id": entry_id, "n": n, "at": at} for entry_id, (n, at) in sorted(_pending_hits.items())
+            ]
+            _pending_hits.clear()
+            async with AsyncSessionLocal() as db:
+                await db.execute(_HITS_UPDATE, batch)
+                await db.commit()
+    finally:
+        _flushing = False
+
+async def _hit(db: AsyncSession, entry: AnswerCacheEntry, kind: str) -> CachedAnswer:
+    pending = _pending_hits.setdefault(entry.id, [0, None])
+    pending[0] += 1
+    pending[1] = utcnow()
+    unit_of_work.after_commit(db, flush_hits)
+    _stats[kind] += 1
+    _stats["saved_ms"] += entry.gen_ms
+    return CachedAnswer(answer=entry.answer, sources=entry.sources, gen_ms=entry.gen_ms)
+
+async def lookup_exact(db: AsyncSession, question: str, language: str, generation: int) -> Optional[CachedAnswer]:
+    """Exact match on the normalized question; needs no embedding call."""
+    if not _enabled():
+        return None
+    entry = await db.scalar(
+        select(AnswerCacheEntry).where(
+            AnswerCacheEntry.language == language,
+            AnswerCacheEntry.question_hash == question_hash(question),
+            AnswerCacheEntry.kb_generation == generation,
+            AnswerCacheEntry.created_at > utcnow() - _ttl(),
+        )
+    )
+    if entry is None:
+        return None
+    return await _hit(db, entry, "hits_exact")
+
+async def lookup_exact_many(
+    db: AsyncSession, questions: Sequence[Tuple[str, str]], generation: int
+) -> List[Optional[CachedAnswer]]:
+    """lookup_exact for many (question, language) pairs in one query; one result per pair."""
+    if not _enabled() or not questions:
+        return [None] * len(questions)
+    keys = [(language, question_hash(question)) for question, language in questions]
+    entries = await db.scalars(
+        select(AnswerCacheEntry).where(
+            tuple_(AnswerCacheEntry.language, AnswerCacheEntry.question_hash).in_(set(keys)),
+            AnswerCacheEntry.kb_generation == generation,
+            AnswerCacheEntry.created_at > utcnow() - _ttl(),
+        )
+    )
+    by_key = {(e.language, e.question_hash): e for e in entries}
+    out: List[Optional[CachedAnswer]] = []
+    for key in keys:
+        entry = by_key.get(key)
+        out.append(await _hit(db, entry, "hits_exact") if entry is not None else None)
+    return out
+
+async def lookup_similar(
+    db: AsyncSession, qvec: list[float], language: str, generation: int
+) -> Optional[CachedAnswer]:
+    """Nearest cached question in the same language, if within ANSWER_CACHE_MAX_DISTANCE."""
+    if not _enabled():
+        return None
+    distance = AnswerCacheEntry.embedding.cosine_distance(qvec)
+    row = (
+        await db.execute(
+            select(AnswerCacheEntry, distance.label("distance"))
+            .where(
+                AnswerCacheEntry.language == language,
+                AnswerCacheEntry.kb_generation == generation,
+                AnswerCacheEntry.created_at > utcnow() - _ttl(),
+            )
+            .order_by(distance)
+            .limit(1)
+        )
+    ).first()
+    if row is None or float(row.distance) > _max_distance():
+        _stats["misses"] += 1
+        return None
+    return await _hit(db, row.AnswerCacheEntry, "hits_semantic")
+
+async def store(
+    db: AsyncSession,
+    question: str,
+    language: str,
+    qvec: list[float],
+    answer: str,
+    sources: str,
+    gen_ms: int,
+    generation: int,
+) -> None:
+    """Cache an answer built from the chunks of KB `generation`."""
+    if not _enabled():
+        return
+    now = utcnow()
+    stmt = insert(AnswerCacheEntry).values(
+        id=uuid4(),
+        language=language,
+        question_hash=question_hash(question),
+        question=question,
+        kb_generation=generation,
+        answer=answer,
+        sources=sources,
+        gen_ms=gen_ms,
+        hits=0,
+        created_at=now,
+        last_hit_at=now,
+        embedding=qvec,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnswerCacheEntry.language, AnswerCacheEntry.question_hash, AnswerCacheEntry.kb_generation],
+        set_={
+            "answer": stmt.excluded.answer,
+            "sources": stmt.excluded.sources,
+            "gen_ms": stmt.excluded.gen_ms,
+            "created_at": stmt.excluded.created_at,
+            "last_hit_at": stmt.excluded.last_hit_at,
+            "embedding": stmt.excluded.embedding,
+        },
+    )
+    await db.execute(stmt)
+
+def evict(db: Session) -> int:
+    """
+    TTL + LRU eviction, run by the worker: drop expired rows and rows built
+    from a KB generation that is no longer active, then everything past the
+    newest ANSWER_CACHE_MAX_ENTRIES by last use. Lookups already ignore
+    expired and other-generation rows, and between runs the table only
+    grows by the answers generated meanwhile. Returns the rows deleted.
+    """
+    active = select(KBGeneration.id).where(KBGeneration.status == "active").scalar_subquery()
+    expired = db.execute(
+        delete(AnswerCacheEntry).where(
+            (AnswerCacheEntry.created_at <= utcnow() - _ttl())
+            | AnswerCacheEntry.kb_generation.is_distinct_from(active)
+        )
+    )
+    overflow = (
+        select(AnswerCacheEntry.id)
+        .order_by(AnswerCacheEntry.last_hit_at.desc())
+        .offset(_max_entries())
+        .scalar_subquery()
+    )
+    trimmed = db.execute(delete(AnswerCacheEntry).where(AnswerCacheEntry.id.in_(overflow)))
+    db.commit()
+    return expired.rowcount + trimmed.rowcount
+
+async def stats(db: AsyncSession) -> dict:
+    lookups = _stats["hits_exact"] + _stats["hits_semantic"] + _stats["misses"]
+    entries, total_hits, total_saved_ms = (
+        await db.execute(
+            select(
+                func.count(AnswerCacheEntry.id),
+                func.coalesce(func.sum(AnswerCacheEntry.hits), 0),
+                func.coalesce(func.sum(AnswerCacheEntry.hits * AnswerCacheEntry.gen_ms), 0),
+            )
+        )
+    ).one()
+    return {
+        "process": {
+            **_stats,
+            "lookups": lookups,
+            "hit_ratio": ((_stats["hits_exact"] + _stats["hits_semantic"]) / lookups) if lookups else 0.0,
+        },
+        "entries": int(entries),
+        "total_hits": int(total_hits),
+        "total_saved_ms": int(total_saved_ms),
+    }
@@ -1,35 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import os
 import re
+from collections.abc import AsyncIterator
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import metrics
+from app.core.embedding_cache import aembed_texts_cached
 from app.core.language import detect_language
-from app.core.memory import MemoryStore
-from app.core.safety import is_payment_or_credentials_request, payment_refusal
-from app.services import tools_service
-from app.services.rag_service import answer_from_kb
+from app.core.matcher import INTENT_MATCHER
+from app.core.memory import MemoryStore, MemoryTurn
+from app.core.safety import PAYMENT_LABEL, payment_refusal
+from app.db import unit_of_work
+from app.db.models import Callback, Ticket
+from app.db.session import AsyncSessionLocal
+from app.rag import generations
+from app.services import answer_cache, tools_service
+from app.services.order_cache import OrderStatus
+from app.services.rag_service import answer_from_kb, stream_answer_from_kb
 
 
 ORDER_ID_RE = re.compile(r"\bETH-\d+\b", re.IGNORECASE)
-
-ORDER_KEYWORDS_EN = ["order", "status", "track", "delivery status"]
-ORDER_KEYWORDS_AM = ["ትዕዛዝ", "ኦርደር", "ሁኔታ", "ትራክ", "መድረስ"]
-
-TICKET_KEYWORDS_EN = ["complaint", "issue", "problem", "return", "refund", "broken", "wrong item"]
-TICKET_KEYWORDS_AM = ["ቅሬታ", "ችግር", "ችግኝ", "መመለስ", "ተሳሳተ", "ተሰብሯል"]
-
-CALLBACK_KEYWORDS_EN = ["call me", "callback", "phone", "ring me"]
-CALLBACK_KEYWORDS_AM = ["ደውሉልኝ", "መመለሻ ጥሪ", "ስልክ", "ይደውሉ"]
-
-HUMAN_KEYWORDS_EN = ["human", "agent", "representative", "support person"]
-HUMAN_KEYWORDS_AM = ["ሰው", "ሰራተኛ", "ኤጀንት", "ተወካይ"]
-
-def _contains_any(text: str, keywords: list[str]) -> bool:
-    t = text.lower()
-    return any(k.lower() in t for k in keywords)
+# Ids looked up from a single message; the rest are ignored
+ORDER_LOOKUP_MAX_IDS = int(os.getenv("ORDER_LOOKUP_MAX_IDS", "10"))
 
 def _default_callback_time_utc() -> datetime:
     tz = ZoneInfo("Africa/Addis_Ababa")
@@ -46,118 +43,436 @@ def _default_callback_time_utc() -> datetime:
 
     return candidate.astimezone(timezone.utc)
 
-def handle_chat(
-    db: Session,
+async def handle_chat(
+    db: AsyncSession,
     external_id: str,
     channel: str,
     message: str,
     language: str | None = None,
     conversation_ref: str | None = None,
 ) -> dict:
-    mem = MemoryStore.from_env()
+    # One transaction for the whole turn: tools and the answer cache only
+    # add to the session, and nothing is committed unless the turn succeeds.
+    with metrics.chat_turn():
+        result = await _chat_turn(db, external_id, channel, message, language, conversation_ref)
+        await unit_of_work.commit(db)
+        metrics.label_turn(routed_to=result["routed_to"])
+    return result
+
+async def _chat_turn(
+    db: AsyncSession,
+    external_id: str,
+    channel: str,
+    message: str,
+    language: str | None,
+    conversation_ref: str | None,
+) -> dict:
+    # One Redis round-trip to load the profile, one to write everything back
+    # once the turn commits.
+    async with MemoryStore.from_env().turn(external_id, db) as mem:
+        lang = _start_turn(mem, message, language)
+        routed = await _route(db, mem, external_id, channel, message, lang, conversation_ref)
+        if routed is not None:
+            return routed
+
+        # RAG fallback (until you move to LangGraph orchestration)
+        rag_answer, _chunks = await answer_from_kb(db, message, lang)
+        if rag_answer:
+            mem.append_turn(role="assistant", content=rag_answer, ts=datetime.now(timezone.utc))
+            return {"external_id": external_id, "reply": rag_answer, "routed_to": "rag"}
+
+        return _no_answer(mem, external_id, lang)
+
+async def handle_chat_stream(
+    db: AsyncSession,
+    external_id: str,
+    channel: str,
+    message: str,
+    language: str | None = None,
+    conversation_ref: str | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of handle_chat. Yields events:
+      {"type": "delta", "text": ...}    answer text as it is generated
+      {"type": "sources", "text": ...}  the Sources block (RAG answers only)
+      {"type": "done", ...}             same payload handle_chat returns
+    Deterministic routes produce a single delta followed by done.
+    """
+    with metrics.chat_turn():
+        streamed = False
+        async with MemoryStore.from_env().turn(external_id, db) as mem:
+            lang = _start_turn(mem, message, language)
+            result = await _route(db, mem, external_id, channel, message, lang, conversation_ref)
+
+            if result is None:
+                parts: list[str] = []
+                async for kind, text in stream_answer_from_kb(db, message, lang):
+                    parts.append(text)
+                    yield {"type": kind, "text": text}
+
+                if parts:
+                    reply = "".join(parts)
+                    mem.append_turn(role="assistant", content=reply, ts=datetime.now(timezone.utc))
+                    result = {"external_id": external_id, "reply": reply, "routed_to": "rag"}
+                    streamed = True
+                else:
+                    result = _no_answer(mem, external_id, lang)
+
+        # Memory is written by this commit's after_commit callback
+        await unit_of_work.commit(db)
+        metrics.label_turn(routed_to=result["routed_to"])
+        if not streamed:
+            yield {"type": "delta", "text": result["reply"]}
+        yield {"type": "done", **result}
+
+def _batch_concurrency() -> int:
+    # KB answers generated at once per batch, each on its own DB connection
+    return int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+async def handle_chat_batch(db: AsyncSession, items: list[dict]) -> list[dict]:
+    """
+    Many chat turns in one call; each item holds handle_chat's keyword
+    arguments (without db). Returns one result per item, in order:
+    handle_chat's payload with "ok": True, or {"ok": False, "external_id",
+    "error"} for an item that failed without affecting the others.
+
+    Deterministic intents are grouped: the order ids of all lookups are
+    resolved together and all tickets and all callbacks go in one INSERT
+    each, committed in one transaction. Questions for the KB are looked up
+    in the exact-match answer cache in one query; the rest are embedded in
+    a single call and answered CHAT_BATCH_CONCURRENCY at a time. Identical
+    questions are answered once.
+    """
+    batch = _ChatBatch(items)
+    # Stage timings of a batch serve many items at once: labelled routed_to="batch"
+    with metrics.chat_turn():
+        metrics.label_turn(routed_to="batch")
+        await batch.load()
+        batch.plan()
+        try:
+            await batch.run_tools(db)
+            await unit_of_work.commit(db)
+        except Exception as exc:
+            # Nothing of the shared transaction was written
+            await unit_of_work.rollback(db)
+            batch.failed([i for route in _BATCH_DB_ROUTES for i in batch.by_route.get(route, [])], exc)
+        try:
+            await batch.answer_from_kb(db)
+        except Exception as exc:
+            batch.failed([i for i in batch.by_route.get(None, []) if batch.results[i] is None], exc)
+        for i, result in enumerate(batch.results):
+            if result is None:
+                batch.failed([i], "not processed")
+        # Last, so only replies that stood are remembered; a batch that raised writes nothing
+        await batch.flush()
+    return batch.results
+
+# Routes whose batch results depend on the shared transaction committing
+_BATCH_DB_ROUTES = ("lookup_order", "handoff", "create_ticket", "schedule_callback")
+
+class _ChatBatch:
+    def __init__(self, items: list[dict]) -> None:
+        self.items = items
+        store = MemoryStore.from_env()
+        # One memory turn per user, shared by that user's items
+        self.mems = {item["external_id"]: store.turn(item["external_id"]) for item in items}
+        self.langs: list[str] = [""] * len(items)
+        self.order_ids: list[list[str]] = [[] for _ in items]
+        self.by_route: dict[str | None, list[int]] = {}
+        self.results: list[dict | None] = [None] * len(items)
+        self.replied: set[int] = set()
+
+    async def load(self) -> None:
+        await asyncio.gather(*(mem.load() for mem in self.mems.values()))
+
+    async def flush(self) -> None:
+        now = datetime.now(timezone.utc)
+        for i, result in enumerate(self.results):
+            if result["ok"] and i in self.replied:
+                self.mem(i).append_turn(role="assistant", content=result["reply"], ts=now)
+        await asyncio.gather(*(mem.flush() for mem in self.mems.values()))
+
+    def mem(self, i: int) -> MemoryTurn:
+        return self.mems[self.items[i]["external_id"]]
+
+    def plan(self) -> None:
+        for i, item in enumerate(self.items):
+            try:
+                self.langs[i] = _start_turn(self.mem(i), item["message"], item.get("language"))
+                route, self.order_ids[i] = _classify(self.mem(i), item["message"])
+            except Exception as exc:
+                self.failed([i], exc)
+                continue
+            self.by_route.setdefault(route, []).append(i)
+
+    def done(self, i: int, reply: str, routed_to: str) -> None:
+        # Remembered in flush(), unless the item fails later (its transaction did not commit)
+        self.replied.add(i)
+        self.results[i] = {"ok": True, "external_id": self.items[i]["external_id"], "reply": reply, "routed_to": routed_to}
+
+    def no_answer(self, i: int) -> None:
+        self.results[i] = {"ok": True, **_no_answer(self.mem(i), self.items[i]["external_id"], self.langs[i])}
+
+    def failed(self, indexes: list[int], error: BaseException | str) -> None:
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"[:300]
+        for i in indexes:
+            self.results[i] = {"ok": False, "external_id": self.items[i]["external_id"], "error": error}
+
+    async def run_tools(self, db: AsyncSession) -> None:
+        """
+        Every deterministic route, one set-based call per tool. Each call runs
+        in a savepoint, so a failing one leaves the session usable for the rest.
+        """
+        for i in self.by_route.get("safety", []):
+            self.done(i, payment_refusal(self.langs[i]), "safety")
+        for i in self.by_route.get("order_missing_id", []):
+            self.done(i, _missing_id_reply(self.langs[i]), "order_missing_id")
+
+        lookups = self.by_route.get("lookup_order", [])
+        if lookups:
+            try:
+                async with db.begin_nested():
+                    orders = await tools_service.lookup_orders(db, [o for i in lookups for o in self.order_ids[i]])
+            except Exception as exc:
+                self.failed(lookups, exc)
+            else:
+                for i in lookups:
+                    mine = {o: orders[o] for o in self.order_ids[i]}
+                    self.done(i, _orders_reply(self.mem(i), mine, self.langs[i]), "lookup_order")
+
+        handoffs, tickets = self.by_route.get("handoff", []), self.by_route.get("create_ticket", [])
+        if handoffs or tickets:
+            specs = [
+                dict(self._owner(i), summary=self.items[i]["message"] or "Handoff requested", **tools_service.HANDOFF_TICKET)
+                for i in handoffs
+            ] + [
+                dict(
+                    self._owner(i),
+                    summary=self.items[i]["message"],
+                    category="support",
+                    priority="normal",
+                    status="open",
+                    conversation_ref=self.items[i].get("conversation_ref"),
+                )
+                for i in tickets
+            ]
+            await self._insert(db, tools_service.create_tickets, specs, handoffs + tickets)
+
+        callbacks = self.by_route.get("schedule_callback", [])
+        if callbacks:
+            scheduled_time = _default_callback_time_utc()
+            specs = [dict(self._owner(i), scheduled_time=scheduled_time) for i in callbacks]
+            await self._insert(db, tools_service.schedule_callbacks, specs, callbacks)
+
+    def _owner(self, i: int) -> dict:
+        item = self.items[i]
+        return dict(external_id=item["external_id"], channel=item["channel"], language=self.langs[i])
+
+    async def _insert(self, db: AsyncSession, bulk, specs: list[dict], indexes: list[int]) -> None:
+        try:
+            async with db.begin_nested():
+                written = await bulk(db, specs)
+        except Exception as exc:
+            self.failed(indexes, exc)
+            return
+        handoffs = set(self.by_route.get("handoff", []))
+        for i, (row, error) in zip(indexes, written):
+            if error:
+                self.failed([i], error)
+            elif isinstance(row, Callback):
+                self.done(i, _callback_reply(row, self.langs[i]), "schedule_callback")
+            elif i in handoffs:
+                self.done(i, _handoff_reply(row, self.langs[i]), "handoff")
+            else:
+                self.done(i, _ticket_reply(row, self.langs[i]), "create_ticket")
+
+    async def answer_from_kb(self, db: AsyncSession) -> None:
+        indexes = self.by_route.get(None, [])
+        if not indexes:
+            return
+        # Identical questions (as the answer cache normalizes them) are answered once
+        groups: dict[tuple[str, str], list[int]] = {}
+        for i in indexes:
+            groups.setdefault((answer_cache.normalize_question(self.items[i]["message"]), self.langs[i]), []).append(i)
+
+        generation = await generations.active_generation(db)
+        if generation is None:
+            for i in indexes:  # nothing ingested yet
+                self.no_answer(i)
+            return
+
+        # Exact cache hits need no embedding: one query for all questions
+        groups_list = []
+        questions = [(self.items[group[0]]["message"], self.langs[group[0]]) for group in groups.values()]
+        cached = await answer_cache.lookup_exact_many(db, questions, generation)
+        await unit_of_work.commit(db)
+        for group, hit in zip(groups.values(), cached):
+            if hit is None:
+                groups_list.append(group)
+                continue
+            for i in group:
+                self.done(i, hit.answer + hit.sources, "rag")
+        if not groups_list:
+            return
+
+        try:
+            qvecs = await aembed_texts_cached([self.items[group[0]]["message"] for group in groups_list])
+        except Exception as exc:
+            self.failed([i for group in groups_list for i in group], exc)
+            return
+
+        semaphore = asyncio.Semaphore(_batch_concurrency())
+
+        async def answer(i: int, qvec: list[float]) -> str | None:
+            # An AsyncSession is not safe for concurrent use: one per answer
+            async with semaphore, AsyncSessionLocal() as session:
+                reply, _chunks = await answer_from_kb(
+                    session, self.items[i]["message"], self.langs[i], qvec=qvec, generation=generation
+                )
+                await unit_of_work.commit(session)
+                return reply
 
+        replies = await asyncio.gather(
+            *(answer(group[0], qvec) for group, qvec in zip(groups_list, qvecs)), return_exceptions=True
+        )
+        for group, reply in zip(groups_list, replies):
+            if isinstance(reply, Exception):
+                self.failed(group, reply)
+                continue
+            for i in group:
+                if reply:
+                    self.done(i, reply, "rag")
+                else:
+                    self.no_answer(i)
+
+def _start_turn(mem: MemoryTurn, message: str, language: str | None) -> str:
     detected_lang = detect_language(message)
     lang = language or detected_lang or "en"
 
-    now = datetime.now(timezone.utc)
-    mem.append_turn(external_id, role="user", content=message, ts=now)
-    mem.set_profile_field(external_id, "language", lang)
+    mem.append_turn(role="user", content=message, ts=datetime.now(timezone.utc))
+    mem.set_profile_field("language", lang)
+    metrics.label_turn(language=lang)
+    return lang
+
+def _classify(mem: MemoryTurn, message: str) -> tuple[str | None, list[str]]:
+    """
+    The deterministic route a message takes (None: answer from the KB) and,
+    for order lookups, the order ids to resolve.
+    """
+    with metrics.stage("intent_match"):
+        intents = INTENT_MATCHER.match(message)
 
     # Safety gate
-    if is_payment_or_credentials_request(message):
-        reply = payment_refusal(lang)
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "safety"}
+    if PAYMENT_LABEL in intents:
+        return "safety", []
 
     # Human handoff
-    if _contains_any(message, HUMAN_KEYWORDS_EN) or _contains_any(message, HUMAN_KEYWORDS_AM):
-        ticket = tools_service.handoff_to_human(
+    if "human" in intents:
+        return "handoff", []
+
+    # Order lookup (explicit, possibly several ids, or via memory)
+    order_ids = list(dict.fromkeys(m.upper() for m in ORDER_ID_RE.findall(message)))[:ORDER_LOOKUP_MAX_IDS]
+
+    order_intent = "order" in intents
+    if not order_ids and order_intent:
+        last = mem.get_profile_field("last_order_id")
+        order_ids = [last] if last else []
+
+    if order_ids:
+        return "lookup_order", order_ids
+    if order_intent:
+        return "order_missing_id", []
+
+    if "callback" in intents:
+        return "schedule_callback", []
+    if "ticket" in intents:
+        return "create_ticket", []
+    return None, []
+
+def _order_line(order_id: str, order: OrderStatus | None, lang: str) -> str:
+    if not order:
+        return f"Order {order_id} not found." if lang != "am" else f"ትዕዛዝ {order_id} አልተገኘም።"
+    if lang == "am":
+        return (
+            f"ትዕዛዝዎ {order.order_id} ሁኔታ: {order.status}."
+            + (f" የመድረሻ ቦታ: {order.delivery_area}." if order.delivery_area else "")
+        )
+    return (
+        f"Your order {order.order_id} status is: {order.status}."
+        + (f" Delivery area: {order.delivery_area}." if order.delivery_area else "")
+    )
+
+def _orders_reply(mem: MemoryTurn, orders: dict[str, OrderStatus | None], lang: str) -> str:
+    found = [order for order in orders.values() if order]
+    if found:
+        mem.set_profile_field("last_order_id", found[-1].order_id)
+    return "\n".join(_order_line(order_id, order, lang) for order_id, order in orders.items())
+
+def _missing_id_reply(lang: str) -> str:
+    return (
+        "Please share your order id (example: ETH-1001)."
+        if lang != "am"
+        else "እባክዎ የትዕዛዝ መለያዎን ይላኩ (ለምሳሌ: ETH-1001)።"
+    )
+
+def _handoff_reply(ticket: Ticket, lang: str) -> str:
+    if lang == "am":
+        return f"ወደ ሰው ድጋፍ ተላልፏል። የትኬት መለያ: {ticket.id}"
+    return f"Escalated to a human agent. Ticket id: {ticket.id}"
+
+def _callback_reply(cb: Callback, lang: str) -> str:
+    local = cb.scheduled_time.astimezone(ZoneInfo("Africa/Addis_Ababa"))
+    local_str = local.strftime("%Y-%m-%d %H:%M")
+    if lang == "am":
+        return f"መመለሻ ጥሪ ተይዟል: {local_str} (EAT). መለያ: {cb.id}"
+    return f"Callback scheduled for {local_str} (EAT). Id: {cb.id}"
+
+def _ticket_reply(ticket: Ticket, lang: str) -> str:
+    if lang == "am":
+        return f"ትኬት ተከፍቷል። መለያ: {ticket.id}"
+    return f"Ticket created. Id: {ticket.id}"
+
+async def _route(
+    db: AsyncSession,
+    mem: MemoryTurn,
+    external_id: str,
+    channel: str,
+    message: str,
+    lang: str,
+    conversation_ref: str | None,
+) -> dict | None:
+    """Deterministic intents; returns None when the message should go to RAG."""
+    route, order_ids = _classify(mem, message)
+    if route is None:
+        return None
+
+    if route == "safety":
+        reply = payment_refusal(lang)
+    elif route == "handoff":
+        ticket = await tools_service.handoff_to_human(
             db=db,
             external_id=external_id,
             channel=channel,
             language=lang,
             reason=message,
         )
-        if lang == "am":
-            reply = f"ወደ ሰው ድጋፍ ተላልፏል። የትኬት መለያ: {ticket.id}"
-        else:
-            reply = f"Escalated to a human agent. Ticket id: {ticket.id}"
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "handoff"}
-
-    # Order lookup (explicit or via memory)
-    m = ORDER_ID_RE.search(message)
-    order_id = m.group(0).upper() if m else None
-
-    order_intent = (
-        _contains_any(message, ORDER_KEYWORDS_EN) or _contains_any(message, ORDER_KEYWORDS_AM)
-    )
-    if not order_id and order_intent:
-        order_id = mem.get_profile_field(external_id, "last_order_id")
-
-    if order_id:
-        order = tools_service.lookup_order(db, order_id)
-        if not order:
-            reply = (
-                f"Order {order_id} not found."
-                if lang != "am"
-                else f"ትዕዛዝ {order_id} አልተገኘም።"
-            )
-        else:
-            mem.set_profile_field(external_id, "last_order_id", order.order_id)
-            if lang == "am":
-                reply = (
-                    f"ትዕዛዝዎ {order.order_id} ሁኔታ: {order.status}."
-                    + (f" የመድረሻ ቦታ: {order.delivery_area}." if order.delivery_area else "")
-                )
-            else:
-                reply = (
-                    f"Your order {order.order_id} status is: {order.status}."
-                    + (f" Delivery area: {order.delivery_area}." if order.delivery_area else "")
-                )
-
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "lookup_order"}
-
-    if order_intent and not order_id:
-        reply = (
-            "Please share your order id (example: ETH-1001)."
-            if lang != "am"
-            else "እባክዎ የትዕዛዝ መለያዎን ይላኩ (ለምሳሌ: ETH-1001)።"
-        )
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "order_missing_id"}
-
-    # Callback scheduling
-    callback_intent = (
-        _contains_any(message, CALLBACK_KEYWORDS_EN) or _contains_any(message, CALLBACK_KEYWORDS_AM)
-    )
-    if callback_intent:
-        scheduled_time = _default_callback_time_utc()
-        cb = tools_service.schedule_callback(
+        reply = _handoff_reply(ticket, lang)
+    elif route == "lookup_order":
+        reply = _orders_reply(mem, await tools_service.lookup_orders(db, order_ids), lang)
+    elif route == "order_missing_id":
+        reply = _missing_id_reply(lang)
+    elif route == "schedule_callback":
+        cb = await tools_service.schedule_callback(
             db=db,
             external_id=external_id,
             channel=channel,
             language=lang,
-            scheduled_time=scheduled_time,
+            scheduled_time=_default_callback_time_utc(),
         )
-
-        local = cb.scheduled_time.astimezone(ZoneInfo("Africa/Addis_Ababa"))
-        local_str = local.strftime("%Y-%m-%d %H:%M")
-        if lang == "am":
-            reply = f"መመለሻ ጥሪ ተይዟል: {local_str} (EAT). መለያ: {cb.id}"
-        else:
-            reply = f"Callback scheduled for {local_str} (EAT). Id: {cb.id}"
-
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "schedule_callback"}
-
-    # Ticket creation
-    ticket_intent = (
-        _contains_any(message, TICKET_KEYWORDS_EN) or _contains_any(message, TICKET_KEYWORDS_AM)
-    )
-    if ticket_intent:
-        ticket = tools_service.create_ticket(
+        reply = _callback_reply(cb, lang)
+    else:
+        ticket = await tools_service.create_ticket(
             db=db,
             external_id=external_id,
             channel=channel,
@@ -168,20 +483,12 @@ def handle_chat(
             status="open",
             conversation_ref=conversation_ref,
         )
-        if lang == "am":
-            reply = f"ትኬት ተከፍቷል። መለያ: {ticket.id}"
-        else:
-            reply = f"Ticket created. Id: {ticket.id}"
-
-        mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": reply, "routed_to": "create_ticket"}
+        reply = _ticket_reply(ticket, lang)
 
-    # RAG fallback (until you move to LangGraph orchestration)
-    rag_answer, _chunks = answer_from_kb(db, message, lang)
-    if rag_answer:
-        mem.append_turn(external_id, role="assistant", content=rag_answer, ts=datetime.now(timezone.utc))
-        return {"external_id": external_id, "reply": rag_answer, "routed_to": "rag"}
+    mem.append_turn(role="assistant", content=reply, ts=datetime.now(timezone.utc))
+    return {"external_id": external_id, "reply": reply, "routed_to": route}
 
+def _no_answer(mem: MemoryTurn, external_id: str, lang: str) -> dict:
     # If nothing found, graceful fallback
     if lang == "am":
         reply = (
@@ -194,5 +501,6 @@ def handle_chat(
             "If you share a bit more detail, I can try again, or I can escalate you to a human."
         )
 
-    mem.append_turn(external_id, role="assistant", content=reply, ts=datetime.now(timezone.utc))
+    metrics.NO_ANSWER.labels(metrics.language_label(lang)).inc()
+    mem.append_turn(role="assistant", content=reply, ts=datetime.now(timezone.utc))
     return {"external_id": external_id, "reply": reply, "routed_to": "no_answer"}
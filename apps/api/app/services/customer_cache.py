@@ -0,0 +1,70 @@
+"""
+external_id -> (customer id, channel, language) cache in front of the
+customer upsert. Entries live in Redis so every API process sees the latest
+channel/language; without Redis a per-process LRU is used instead. Entries
+are only written after the transaction that created or updated the
+customer commits (app.db.unit_of_work.after_commit).
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from redis.exceptions import RedisError
+
+from app.core.redis_client import get_async_redis
+
+@dataclass(frozen=True)
+class CachedCustomer:
+    id: UUID
+    channel: str
+    language: str
+
+_lru: "OrderedDict[str, CachedCustomer]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+def _lru_size() -> int:
+    return int(os.getenv("CUSTOMER_CACHE_LRU_SIZE", "10000"))
+
+def _ttl_seconds() -> int:
+    return int(os.getenv("CUSTOMER_CACHE_TTL_SECONDS", "86400"))
+
+def _key(external_id: str) -> str:
+    return f"customer:{external_id}"
+
+async def get(external_id: str) -> Optional[CachedCustomer]:
+    r = get_async_redis()
+    if r is None:
+        with _lru_lock:
+            entry = _lru.get(external_id)
+            if entry is not None:
+                _lru.move_to_end(external_id)
+            return entry
+    try:
+        raw = await r.get(_key(external_id))
+    except RedisError:
+        return None
+    if raw is None:
+        return None
+    data = json.loads(raw)
+    return CachedCustomer(UUID(data["id"]), data["channel"], data["language"])
+
+async def put(external_id: str, customer_id: UUID, channel: str, language: str) -> None:
+    r = get_async_redis()
+    if r is None:
+        with _lru_lock:
+            _lru[external_id] = CachedCustomer(customer_id, channel, language)
+            _lru.move_to_end(external_id)
+            while len(_lru) > _lru_size():
+                _lru.popitem(last=False)
+        return
+    value = json.dumps({"id": str(customer_id), "channel": channel, "language": language})
+    try:
+        await r.set(_key(external_id), value, ex=_ttl_seconds())
+    except RedisError:
+        pass
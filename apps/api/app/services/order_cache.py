@@ -0,0 +1,186 @@
+"""
+Read-through Redis cache of order status for the order lookup tool.
+
+Entries are dropped when an Order row is written through the ORM: mapper
+events note the order ids on the session, and once the transaction commits
+each key's version (order:<id>:v) is bumped and the entry deleted. A reader
+notes the versions before it queries Postgres and only caches what it
+loaded if they are unchanged, so a lookup that read the row just before a
+write committed cannot put the old status back. In the API the invalidation
+runs as a task on the event loop right after the COMMIT, so for a moment a
+reader may still get the old entry.
+
+Only ORM unit-of-work writes are seen. Core statements (update(Order),
+insert(Order).values([...]), bulk ORM updates by query), other services and
+manual SQL do not fire mapper events: call invalidate()/ainvalidate() after
+committing them, or they are bounded by ORDER_CACHE_TTL_SECONDS. Unknown ids
+are cached briefly as well, so repeated lookups of a typo stay off Postgres.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.redis_client import get_async_redis, get_redis
+from app.db.models import Order
+
+log = logging.getLogger(__name__)
+
+_MISSING = "{}"
+
+# Versions outlive any lookup that could still be in flight
+_VERSION_TTL_SECONDS = 86400
+
+@dataclass(frozen=True)
+class OrderStatus:
+    order_id: str
+    status: str
+    delivery_area: Optional[str]
+    items: Optional[dict]
+
+    @classmethod
+    def from_row(cls, order: Order) -> "OrderStatus":
+        return cls(order.order_id, order.status, order.delivery_area, order.items)
+
+def _enabled() -> bool:
+    return os.getenv("ORDER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def _ttl_seconds() -> int:
+    return int(os.getenv("ORDER_CACHE_TTL_SECONDS", "300"))
+
+def _miss_ttl_seconds() -> int:
+    return int(os.getenv("ORDER_CACHE_MISS_TTL_SECONDS", "30"))
+
+def _key(order_id: str) -> str:
+    return f"order:{order_id}"
+
+def _version_key(order_id: str) -> str:
+    return f"order:{order_id}:v"
+
+# Version of each id at lookup time; "" when it was never bumped
+Versions = Dict[str, str]
+
+# SET each entry only if its version still matches. KEYS: entry, version
+# pairs; ARGV: expected version, value, ttl triples.
+_PUT_IF_UNCHANGED = """
+for i = 1, #KEYS, 2 do
+    local j = (i - 1) / 2 * 3
+    if (redis.call('GET', KEYS[i + 1]) or '') == ARGV[j + 1] then
+        redis.call('SET', KEYS[i], ARGV[j + 2], 'EX', ARGV[j + 3])
+    end
+end
+"""
+
+async def get_many(order_ids: List[str]) -> Tuple[Dict[str, Optional[OrderStatus]], Versions]:
+    """
+    Cached entries among order_ids (a None value is a cached 'not found'),
+    plus the current versions to pass to put_many, in one round-trip.
+    """
+    r = get_async_redis()
+    if r is None or not _enabled() or not order_ids:
+        return {}, {}
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.mget([_key(i) for i in order_ids])
+            pipe.mget([_version_key(i) for i in order_ids])
+            values, versions = await pipe.execute()
+    except RedisError:
+        return {}, {}
+    out: Dict[str, Optional[OrderStatus]] = {}
+    for order_id, raw in zip(order_ids, values):
+        if raw is None:
+            continue
+        out[order_id] = None if raw == _MISSING else OrderStatus(**json.loads(raw))
+    return out, {order_id: v or "" for order_id, v in zip(order_ids, versions)}
+
+async def put_many(found: Dict[str, Optional[OrderStatus]], versions: Versions) -> None:
+    """Cache what a lookup loaded, skipping ids written since get_many returned `versions`."""
+    r = get_async_redis()
+    found = {i: order for i, order in found.items() if i in versions}
+    if r is None or not _enabled() or not found:
+        return
+    keys, args = [], []
+    for order_id, order in found.items():
+        keys += [_key(order_id), _version_key(order_id)]
+        if order is None:
+            args += [versions[order_id], _MISSING, _miss_ttl_seconds()]
+        else:
+            args += [versions[order_id], json.dumps(asdict(order), ensure_ascii=False), _ttl_seconds()]
+    try:
+        await r.eval(_PUT_IF_UNCHANGED, len(keys), *keys, *args)
+    except RedisError:
+        pass
+
+def _invalidate_commands(pipe, order_ids: Set[str]) -> None:
+    for order_id in order_ids:
+        pipe.incr(_version_key(order_id))
+        pipe.expire(_version_key(order_id), _VERSION_TTL_SECONDS)
+        pipe.delete(_key(order_id))
+
+def invalidate(order_ids: Iterable[str]) -> None:
+    """Drop the entries of orders written outside the ORM (sync callers)."""
+    order_ids = set(order_ids)
+    r = get_redis()
+    if r is None or not order_ids:
+        return
+    try:
+        with r.pipeline(transaction=True) as pipe:
+            _invalidate_commands(pipe, order_ids)
+            pipe.execute()
+    except RedisError:
+        log.warning("order cache invalidation failed for %d orders", len(order_ids), exc_info=True)
+
+async def ainvalidate(order_ids: Iterable[str]) -> None:
+    """invalidate() for async callers."""
+    order_ids = set(order_ids)
+    r = get_async_redis()
+    if r is None or not order_ids:
+        return
+    try:
+        async with r.pipeline(transaction=True) as pipe:
+            _invalidate_commands(pipe, order_ids)
+            await pipe.execute()
+    except RedisError:
+        log.warning("order cache invalidation failed for %d orders", len(order_ids), exc_info=True)
+
+# ---- invalidation on ORM writes ----
+
+_DIRTY = "order_cache_dirty"
+
+# Invalidation tasks started from AsyncSession commits, kept until done
+_tasks: Set[asyncio.Task] = set()
+
+def _note_write(_mapper, _connection, target: Order) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY, set()).add(target.order_id)
+
+for _evt in ("after_insert", "after_update", "after_delete"):
+    event.listen(Order, _evt, _note_write)
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY, None)
+    if not dirty:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        invalidate(dirty)  # sync Session: scripts, workers, threadpool
+        return
+    # AsyncSession: the event fires on the loop thread, so don't block it
+    task = loop.create_task(ainvalidate(dirty))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session: Session, _previous_transaction) -> None:
+    session.info.pop(_DIRTY, None)
@@ -2,14 +2,21 @@ from __future__ import annotations
 
 import os
 import re
+import time
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import BIT
+from sqlalchemy import Select, bindparam, cast, exists, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.llm_client import embed_texts, generate_answer
-from app.db.models import KBDocument, KBChunk
+from app.core import metrics
+from app.core.embedding_cache import aembed_texts_cached
+from app.core.llm_client import agenerate_answer, astream_answer
+from app.db.models import KBChunk
+from app.db.vector_index import EMBEDDING_DIM
+from app.rag import generations
+from app.services import answer_cache
 
 @dataclass
 class RetrievedChunk:
@@ -26,44 +33,169 @@ def _top_k() -> int:
 def _max_distance() -> float:
     return float(os.getenv("RAG_MAX_DISTANCE", "0.35"))
 
-def retrieve(db: Session, query: str, language: Optional[str]) -> List[RetrievedChunk]:
-    qvec = embed_texts([query])[0]
-    top_k = _top_k()
+def _retrieval_mode() -> str:
+    # ann: one HNSW query on full vectors
+    # binary_rerank: Hamming-distance candidates from the bit-quantized index,
+    #                re-ranked by exact cosine distance on the full vectors
+    return os.getenv("RAG_RETRIEVAL_MODE", "ann")
+
+def _rerank_candidates() -> int:
+    return int(os.getenv("RAG_RERANK_CANDIDATES", "64"))
+
+def _ranked(qvec: List[float], top_k: int, mode: str, *where) -> Select:
+    if mode != "binary_rerank":
+        distance = KBChunk.embedding.cosine_distance(qvec)
+        return (
+            select(
+                KBChunk.title,
+                KBChunk.page_start,
+                KBChunk.page_end,
+                KBChunk.content,
+                distance.label("distance"),
+            )
+            .where(*where)
+            .order_by(distance)
+            .limit(top_k)
+        )
 
-    # Prefer same-language docs when possible
-    base_stmt = (
+    # Must match the expression indexed by ix_kb_chunks_g*_bq_hnsw*
+    bits = BIT(EMBEDDING_DIM)
+    hamming = cast(func.binary_quantize(KBChunk.embedding), bits).op("<~>")(
+        cast(func.binary_quantize(cast(bindparam("qvec", qvec, type_=KBChunk.embedding.type, unique=True), KBChunk.embedding.type)), bits)
+    )
+    candidates = (
+        select(KBChunk.title, KBChunk.page_start, KBChunk.page_end, KBChunk.content, KBChunk.embedding)
+        .where(*where)
+        .order_by(hamming)
+        .limit(max(_rerank_candidates(), top_k))
+        .subquery()
+    )
+    distance = candidates.c.embedding.cosine_distance(qvec)
+    return (
         select(
-            KBChunk,
-            KBDocument,
-            KBChunk.embedding.cosine_distance(qvec).label("distance"),
+            candidates.c.title,
+            candidates.c.page_start,
+            candidates.c.page_end,
+            candidates.c.content,
+            distance.label("distance"),
         )
-        .join(KBDocument, KBChunk.document_id == KBDocument.id)
-        .order_by(KBChunk.embedding.cosine_distance(qvec))
+        .order_by(distance)
         .limit(top_k)
     )
 
-    rows = db.execute(base_stmt.where(KBDocument.language == language)).all() if language else []
-    if not rows:
-        rows = db.execute(base_stmt).all()
+def search_stmt(
+    qvec: List[float], language: Optional[str], top_k: int, generation: int, mode: Optional[str] = None
+) -> Select:
+    mode = mode or _retrieval_mode()
+    # Only one KB generation is searched; like the language it is rendered
+    # inline so the planner matches that generation's partial HNSW indexes.
+    in_generation = KBChunk.generation == bindparam("generation", generation, literal_execute=True)
+    if not language:
+        return _ranked(qvec, top_k, mode, in_generation)
+
+    # Same language first, then any language, in one round-trip. The
+    # language is rendered inline (literal_execute) so the planner can
+    # match the per-language partial HNSW index even for prepared
+    # statements; the fallback leg only runs when that language has no
+    # chunks at all (a one-time InitPlan filter).
+    lang = bindparam("lang", language, literal_execute=True)
+    has_lang = exists().where(in_generation, KBChunk.language == lang)
+    return union_all(
+        _ranked(qvec, top_k, mode, in_generation, KBChunk.language == lang).subquery().select(),
+        _ranked(qvec, top_k, mode, in_generation, ~has_lang).subquery().select(),
+    )
+
+def _backend() -> str:
+    # postgres: pgvector query; numpy: in-process snapshot (app.rag.numpy_index)
+    return os.getenv("RAG_BACKEND", "postgres")
 
+def _search_numpy(
+    qvec: List[float], language: Optional[str], top_k: int, generation: int
+) -> Optional[List[RetrievedChunk]]:
+    from app.rag import numpy_index  # optional backend: numpy is only needed when enabled
+
+    index = numpy_index.get_index()
+    if index is None or index.generation != generation:
+        return None  # no snapshot of this generation yet (published or picked up)
     out: List[RetrievedChunk] = []
-    for i, (chunk, doc, dist) in enumerate(rows, start=1):
+    for i, (row, dist) in enumerate(index.search(qvec, language, top_k), start=1):
+        page_start, page_end = index.pages[row]
         out.append(
             RetrievedChunk(
                 sid=f"S{i}",
-                title=doc.title,
-                page_start=chunk.page_start,
-                page_end=chunk.page_end,
-                content=chunk.content,
-                distance=float(dist),
+                title=index.titles[row],
+                page_start=page_start,
+                page_end=page_end,
+                content=index.contents[row],
+                distance=dist,
             )
         )
     return out
 
-def answer_from_kb(db: Session, question: str, language: str) -> Tuple[Optional[str], List[RetrievedChunk]]:
-    chunks = retrieve(db, question, language=language)
+async def search(
+    db: AsyncSession,
+    qvec: List[float],
+    language: Optional[str],
+    mode: Optional[str] = None,
+    generation: Optional[int] = None,
+) -> List[RetrievedChunk]:
+    """Nearest chunks of KB `generation` (default: the active one)."""
+    top_k = _top_k()
+    if generation is None:
+        generation = await generations.active_generation(db)
+    if generation is None:
+        return []
+    if _backend() == "numpy":
+        with metrics.stage("vector_query"):
+            found = _search_numpy(qvec, language, top_k, generation)
+        if found is not None:
+            return found
+
+    stmt = search_stmt(qvec, language, top_k, generation, mode)
+
+    # With iterative index scans (relaxed order) rows can come back slightly
+    # out of order, so sort by exact distance here.
+    with metrics.stage("vector_query"):
+        rows = (await db.execute(stmt)).all()
+    rows = sorted(rows, key=lambda r: r.distance)[:top_k]
+
+    out: List[RetrievedChunk] = []
+    for i, row in enumerate(rows, start=1):
+        out.append(
+            RetrievedChunk(
+                sid=f"S{i}",
+                title=row.title,
+                page_start=row.page_start,
+                page_end=row.page_end,
+                content=row.content,
+                distance=float(row.distance),
+            )
+        )
+    return out
+
+async def retrieve(
+    db: AsyncSession,
+    query: str,
+    language: Optional[str],
+    qvec: Optional[List[float]] = None,
+    generation: Optional[int] = None,
+) -> List[RetrievedChunk]:
+    if qvec is None:
+        qvec = (await aembed_texts_cached([query]))[0]
+    return await search(db, qvec, language, generation=generation)
+
+async def prepare_answer(
+    db: AsyncSession,
+    question: str,
+    language: str,
+    qvec: Optional[List[float]] = None,
+    generation: Optional[int] = None,
+) -> Tuple[Optional[str], List[RetrievedChunk]]:
+    """Retrieve context and build the LLM prompt; prompt is None when the KB has no answer."""
+    chunks = await retrieve(db, question, language=language, qvec=qvec, generation=generation)
     if not chunks:
         return None, []
+    metrics.TOP_DISTANCE.labels(metrics.language_label(language)).observe(chunks[0].distance)
 
     # If the best chunk is too far, treat as “no answer”
     if chunks[0].distance > _max_distance():
@@ -91,16 +223,99 @@ def answer_from_kb(db: Session, question: str, language: str) -> Tuple[Optional[
             "When you use a fact, cite the snippet id like [S1]."
         )
 
-    prompt = f"{instructions}\n\nQUESTION:\n{question}\n\nCONTEXT:\n{context}\n\nANSWER:"
+    return f"{instructions}\n\nQUESTION:\n{question}\n\nCONTEXT:\n{context}\n\nANSWER:", chunks
 
-    text = generate_answer(prompt)
-
-    # Append a clean sources section (mapping S-ids to titles/pages)
+def format_sources(chunks: List[RetrievedChunk]) -> str:
+    # A clean sources section (mapping S-ids to titles/pages)
     sources = []
     for c in chunks:
         pg = ""
         if c.page_start is not None:
             pg = f" page {c.page_start}" + (f"-{c.page_end}" if c.page_end and c.page_end != c.page_start else "")
         sources.append(f"- [{c.sid}] {c.title}{pg}")
+    return "\n\nSources:\n" + "\n".join(sources)
+
+async def _cached_answer(
+    db: AsyncSession, question: str, language: str, generation: int, qvec: Optional[List[float]] = None
+) -> Tuple[Optional[answer_cache.CachedAnswer], Optional[List[float]]]:
+    # Exact text first (saves the embedding call too), then nearest question.
+    # A caller passing qvec has done the exact lookup already (lookup_exact_many).
+    if qvec is None:
+        cached = await answer_cache.lookup_exact(db, question, language, generation)
+        if cached:
+            return cached, None
+        qvec = (await aembed_texts_cached([question]))[0]
+    return await answer_cache.lookup_similar(db, qvec, language, generation), qvec
+
+async def answer_from_kb(
+    db: AsyncSession,
+    question: str,
+    language: str,
+    qvec: Optional[List[float]] = None,
+    generation: Optional[int] = None,
+) -> Tuple[Optional[str], List[RetrievedChunk]]:
+    """
+    qvec: the question's embedding when the caller already has it (batch
+    chat embeds all questions at once); such a caller has also checked the
+    exact-match cache already, for `generation`.
+
+    The cache lookup, retrieval and the stored answer all use one KB
+    generation (default: the active one), so an answer is cached under the
+    generation whose chunks it cites.
+    """
+    if generation is None:
+        generation = await generations.active_generation(db)
+    if generation is None:
+        return None, []
+    cached, qvec = await _cached_answer(db, question, language, generation, qvec)
+    if cached:
+        return cached.answer + cached.sources, []
+
+    prompt, chunks = await prepare_answer(db, question, language, qvec=qvec, generation=generation)
+    if prompt is None:
+        return None, chunks
+
+    started = time.perf_counter()
+    text = (await agenerate_answer(prompt)).strip()
+    sources = format_sources(chunks)
+    await answer_cache.store(
+        db, question, language, qvec, text, sources,
+        gen_ms=int((time.perf_counter() - started) * 1000), generation=generation,
+    )
+    return text + sources, chunks
 
-    return text.strip() + "\n\nSources:\n" + "\n".join(sources), chunks
+async def stream_answer_from_kb(db: AsyncSession, question: str, language: str) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Streaming answer_from_kb. Yields ("delta", text) pieces as the provider
+    produces them, then one ("sources", text). Yields nothing when the KB has
+    no answer.
+    """
+    generation = await generations.active_generation(db)
+    if generation is None:
+        return
+    cached, qvec = await _cached_answer(db, question, language, generation)
+    if cached:
+        yield "delta", cached.answer
+        yield "sources", cached.sources
+        return
+
+    prompt, chunks = await prepare_answer(db, question, language, qvec=qvec, generation=generation)
+    if prompt is None:
+        return
+
+    started = time.perf_counter()
+    parts: List[str] = []
+    async for delta in astream_answer(prompt):
+        if not parts:
+            delta = delta.lstrip()
+            if not delta:
+                continue
+        parts.append(delta)
+        yield "delta", delta
+
+    sources = format_sources(chunks)
+    yield "sources", sources
+    await answer_cache.store(
+        db, question, language, qvec, "".join(parts).strip(), sources,
+        gen_ms=int((time.perf_counter() - started) * 1000), generation=generation,
+    )
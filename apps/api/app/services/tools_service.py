@@ -1,45 +1,167 @@
+"""
+Tool actions behind the chat intents and the /tools routes. They add rows
+to the caller's session but never commit: the request handler commits once
+(app.db.unit_of_work.commit).
+"""
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
-from uuid import uuid4
+from functools import partial
+from uuid import UUID, uuid4
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import String, any_, bindparam, case, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import metrics
 from app.db.models import Customer, Ticket, Order, Callback
+from app.db.unit_of_work import after_commit
+from app.services import customer_cache, order_cache, write_behind
+from app.services.order_cache import OrderStatus
+
+# Ticket fields of a handoff to a human agent
+HANDOFF_TICKET = dict(category="handoff", priority="high", status="escalated")
 
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
-def get_or_create_customer(db: Session, external_id: str, channel: str, language: str) -> Customer:
-    customer = db.scalar(select(Customer).where(Customer.external_id == external_id))
-    if customer:
-        # Update language/channel if needed
-        changed = False
-        if language and customer.language_pref != language:
-            customer.language_pref = language
-            changed = True
-        if channel and customer.channel != channel:
-            customer.channel = channel
-            changed = True
-        if changed:
-            db.commit()
-        return customer
-
-    customer = Customer(
+@metrics.timed("tools.upsert_customer")
+async def upsert_customer(db: AsyncSession, external_id: str, channel: str, language: str) -> UUID:
+    """
+    Id of the customer with this external_id, created or updated (channel,
+    language) in one INSERT ... ON CONFLICT ... RETURNING, so concurrent
+    first messages from one user cannot collide on the unique constraint.
+    No query at all when the cache already has the same channel and language.
+    Runs in the caller's transaction; the caller commits.
+    """
+    cached = await customer_cache.get(external_id)
+    if cached and (not channel or cached.channel == channel) and (not language or cached.language == language):
+        return cached.id
+
+    stmt = insert(Customer).values(
         id=uuid4(),
         external_id=external_id,
         channel=channel or "unknown",
         language_pref=language or "en",
         created_at=utcnow(),
     )
-    db.add(customer)
-    db.commit()
-    db.refresh(customer)
-    return customer
+    # Empty channel/language keep the stored values
+    updates = {}
+    if channel:
+        updates["channel"] = stmt.excluded.channel
+    if language:
+        updates["language_pref"] = stmt.excluded.language_pref
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Customer.external_id],
+        # DO UPDATE (not DO NOTHING) so RETURNING also yields existing rows
+        set_=updates or {"external_id": stmt.excluded.external_id},
+    ).returning(Customer.id, Customer.channel, Customer.language_pref)
+    row = (await db.execute(stmt)).one()
+    after_commit(db, partial(customer_cache.put, external_id, row.id, row.channel, row.language_pref))
+    return row.id
+
+@metrics.timed("tools.upsert_customers")
+async def upsert_customers(db: AsyncSession, customers: list[tuple[str, str, str]]) -> dict[str, UUID]:
+    """
+    Bulk upsert_customer for (external_id, channel, language) triples:
+    external_id -> id. Cache hits are skipped and the rest go in one
+    INSERT ... ON CONFLICT ... RETURNING. As in upsert_customer, an empty
+    channel or language keeps the stored value; per field, the last
+    non-empty value per external_id wins.
+    """
+    latest: dict[str, tuple[str, str]] = {}
+    for external_id, channel, language in customers:
+        prev_channel, prev_language = latest.get(external_id, ("", ""))
+        latest[external_id] = (channel or prev_channel, language or prev_language)
+    cached = await asyncio.gather(*(customer_cache.get(external_id) for external_id in latest))
+    ids: dict[str, UUID] = {}
+    for (external_id, (channel, language)), hit in zip(latest.items(), cached):
+        if hit and hit.channel == (channel or hit.channel) and hit.language == (language or hit.language):
+            ids[external_id] = hit.id
+    todo = {k: v for k, v in latest.items() if k not in ids}
+    if not todo:
+        return ids
+
+    stmt = insert(Customer).values(
+        [
+            dict(
+                id=uuid4(),
+                external_id=external_id,
+                channel=channel or "unknown",
+                language_pref=language or "en",
+                created_at=utcnow(),
+            )
+            for external_id, (channel, language) in todo.items()
+        ]
+    )
+
+    def updated(column, position: int):
+        # Inserted rows get the defaults for empty values; existing ones keep theirs
+        kept = [external_id for external_id, values in todo.items() if not values[position]]
+        new = stmt.excluded[column.key]
+        return case((stmt.excluded.external_id.in_(kept), column), else_=new) if kept else new
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Customer.external_id],
+        set_={"channel": updated(Customer.channel, 0), "language_pref": updated(Customer.language_pref, 1)},
+    ).returning(Customer.external_id, Customer.id, Customer.channel, Customer.language_pref)
+    for row in await db.execute(stmt):
+        ids[row.external_id] = row.id
+        after_commit(db, partial(customer_cache.put, row.external_id, row.id, row.channel, row.language_pref))
+    return ids
+
+def _db_error(exc: DBAPIError) -> str:
+    # First line of the driver's message, e.g. the violated constraint
+    orig = exc.orig or exc
+    lines = str(orig).strip().splitlines()
+    return f"{type(orig).__name__}: {lines[0] if lines else ''}"[:300]
+
+async def _insert_isolated(db: AsyncSession, model, rows: list[dict]) -> list[str | None]:
+    """
+    Insert rows in one statement. If that fails, retry them one savepoint
+    per row so a bad row only fails itself. Returns an error per row (None
+    when inserted). A lost connection is not a row problem and is raised.
+    """
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(model).values(rows))
+        return [None] * len(rows)
+    except OperationalError:
+        raise
+    except DBAPIError as exc:
+        if len(rows) == 1:
+            return [_db_error(exc)]
+    errors: list[str | None] = []
+    for row in rows:
+        errors += await _insert_isolated(db, model, [row])
+    return errors
 
-def create_ticket(
-    db: Session,
+async def _insert_for_customers(
+    db: AsyncSession, model, kind: str, owners: list[tuple[str, str, str]], rows: list[dict]
+) -> list[tuple[object, str | None]]:
+    """
+    Bulk path of create_ticket/schedule_callback: rows[i] belongs to the
+    customer owners[i] (external_id, channel, language). Rows go to the
+    write-behind stream, once the request commits, when enabled; otherwise
+    they get their customers from one upsert and are inserted in one
+    statement. Returns (row object, error) per row, in order.
+    """
+    if not rows:
+        return []
+    if write_behind.available():
+        write_behind.queue(db, [(kind, *owner, row) for owner, row in zip(owners, rows)])
+        return [(model(customer_id=None, **row), None) for row in rows]
+    ids = await upsert_customers(db, owners)
+    for owner, row in zip(owners, rows):
+        row["customer_id"] = ids[owner[0]]
+    errors = await _insert_isolated(db, model, rows)
+    return [(model(**row), error) for row, error in zip(rows, errors)]
+
+@metrics.timed("tools.create_ticket")
+async def create_ticket(
+    db: AsyncSession,
     external_id: str,
     channel: str,
     language: str,
@@ -49,11 +171,8 @@ def create_ticket(
     status: str = "open",
     conversation_ref: str | None = None,
 ) -> Ticket:
-    customer = get_or_create_customer(db, external_id, channel, language)
-
-    ticket = Ticket(
+    values = dict(
         id=uuid4(),
-        customer_id=customer.id,
         category=category,
         priority=priority,
         status=status,
@@ -61,49 +180,101 @@ def create_ticket(
         conversation_ref=conversation_ref,
         created_at=utcnow(),
     )
+    if write_behind.available():
+        # Queued when the turn commits; customer_id is resolved when the worker inserts it
+        write_behind.queue(db, [("ticket", external_id, channel, language, values)])
+        return Ticket(customer_id=None, **values)
+
+    ticket = Ticket(customer_id=await upsert_customer(db, external_id, channel, language), **values)
     db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
     return ticket
 
-def lookup_order(db: Session, order_id: str) -> Order | None:
-    return db.scalar(select(Order).where(Order.order_id == order_id))
+@metrics.timed("tools.create_tickets")
+async def create_tickets(db: AsyncSession, tickets: list[dict]) -> list[tuple[Ticket, str | None]]:
+    """
+    Bulk create_ticket; each dict holds create_ticket's keyword arguments
+    (without db). Returns (ticket, error) per item; error is None when the
+    ticket was written or queued.
+    """
+    owners = [(t["external_id"], t["channel"], t["language"]) for t in tickets]
+    rows = [
+        dict(
+            id=uuid4(),
+            category=t.get("category", "general"),
+            priority=t.get("priority", "normal"),
+            status=t.get("status", "open"),
+            summary=t["summary"],
+            conversation_ref=t.get("conversation_ref"),
+            created_at=utcnow(),
+        )
+        for t in tickets
+    ]
+    return await _insert_for_customers(db, Ticket, "ticket", owners, rows)
+
+@metrics.timed("tools.lookup_orders")
+async def lookup_orders(db: AsyncSession, order_ids: list[str]) -> dict[str, OrderStatus | None]:
+    """
+    Status of each order id (None if unknown), in the order given. Cache
+    misses are resolved with a single WHERE order_id = ANY(...) query and
+    written back to the cache.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    found, versions = await order_cache.get_many(order_ids)
+    missing = [i for i in order_ids if i not in found]
+    if missing:
+        # One array parameter, so the statement text is the same for any number of ids
+        ids = bindparam("order_ids", missing, type_=ARRAY(String))
+        rows = await db.scalars(select(Order).where(Order.order_id == any_(ids)))
+        loaded: dict[str, OrderStatus | None] = dict.fromkeys(missing)
+        loaded.update({o.order_id: OrderStatus.from_row(o) for o in rows})
+        await order_cache.put_many(loaded, versions)
+        found.update(loaded)
+    return {i: found[i] for i in order_ids}
+
+async def lookup_order(db: AsyncSession, order_id: str) -> OrderStatus | None:
+    return (await lookup_orders(db, [order_id]))[order_id]
 
-def schedule_callback(
-    db: Session,
+@metrics.timed("tools.schedule_callback")
+async def schedule_callback(
+    db: AsyncSession,
     external_id: str,
     channel: str,
     language: str,
     scheduled_time: datetime,
 ) -> Callback:
-    customer = get_or_create_customer(db, external_id, channel, language)
+    values = dict(id=uuid4(), scheduled_time=scheduled_time, status="scheduled", created_at=utcnow())
+    if write_behind.available():
+        write_behind.queue(db, [("callback", external_id, channel, language, values)])
+        return Callback(customer_id=None, **values)
 
-    cb = Callback(
-        id=uuid4(),
-        customer_id=customer.id,
-        scheduled_time=scheduled_time,
-        status="scheduled",
-        created_at=utcnow(),
-    )
+    cb = Callback(customer_id=await upsert_customer(db, external_id, channel, language), **values)
     db.add(cb)
-    db.commit()
-    db.refresh(cb)
     return cb
 
-def handoff_to_human(
-    db: Session,
+@metrics.timed("tools.schedule_callbacks")
+async def schedule_callbacks(db: AsyncSession, callbacks: list[dict]) -> list[tuple[Callback, str | None]]:
+    """Bulk schedule_callback, same conventions as create_tickets."""
+    owners = [(c["external_id"], c["channel"], c["language"]) for c in callbacks]
+    rows = [
+        dict(id=uuid4(), scheduled_time=c["scheduled_time"], status="scheduled", created_at=utcnow())
+        for c in callbacks
+    ]
+    return await _insert_for_customers(db, Callback, "callback", owners, rows)
+
+@metrics.timed("tools.handoff_to_human")
+async def handoff_to_human(
+    db: AsyncSession,
     external_id: str,
     channel: str,
     language: str,
     reason: str | None = None,
 ) -> Ticket:
-    return create_ticket(
+    # Unwrapped: this call is already timed as tools.handoff_to_human
+    return await create_ticket.__wrapped__(
         db=db,
         external_id=external_id,
         channel=channel,
         language=language,
         summary=reason or "Handoff requested",
-        category="handoff",
-        priority="high",
-        status="escalated",
+        **HANDOFF_TICKET,
     )
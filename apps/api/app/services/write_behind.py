@@ -0,0 +1,302 @@
+"""
+Write-behind persistence for tickets and callbacks (WRITE_BEHIND_ENABLED).
+
+Once the request's transaction commits, the API appends each write to a
+Redis stream and replies with the id it generated; a Celery beat task
+(worker.tasks.writes.drain) reads the stream through a consumer group and
+inserts batches in one transaction. Inserts are idempotent (ON CONFLICT
+(id) DO NOTHING), so a batch redelivered after a crash is harmless. Entries are only acknowledged after the commit;
+entries left pending by a dead consumer are re-claimed with XAUTOCLAIM, and
+an entry whose insert fails on its own (bad data, not an outage) is moved
+to a dead-letter stream instead of being retried forever.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.redis_client import get_async_redis, get_redis
+from app.db.models import Callback, Customer, Ticket
+from app.db.session import SessionLocal
+from app.db.unit_of_work import after_commit
+
+log = logging.getLogger(__name__)
+
+GROUP = "writers"
+
+def enabled() -> bool:
+    return os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def stream_key() -> str:
+    return os.getenv("WRITE_BEHIND_STREAM", "support:writes")
+
+def dead_letter_key() -> str:
+    return f"{stream_key()}:dead"
+
+def _batch_size() -> int:
+    return int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+
+def _claim_idle_ms() -> int:
+    return int(os.getenv("WRITE_BEHIND_CLAIM_IDLE_MS", "60000"))
+
+def _max_batches() -> int:
+    # Batches per drain run, so one run cannot starve the worker
+    return int(os.getenv("WRITE_BEHIND_MAX_BATCHES", "20"))
+
+def _consumer() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value) if value is not None else None
+
+# (kind, external_id, channel, language, row): one ticket/callback insert,
+# `row` holding its columns including the pre-generated id
+Write = Tuple[str, str, str, str, dict]
+
+def available() -> bool:
+    """Enabled and Redis connected: queue() may be used instead of inserting."""
+    return enabled() and get_async_redis() is not None
+
+def _fields(write: Write) -> Dict[str, str]:
+    kind, external_id, channel, language, row = write
+    customer = {
+        "external_id": external_id,
+        "channel": channel,
+        "language": language,
+        "created_at": row["created_at"],
+    }
+    return {
+        "kind": kind,
+        "customer": json.dumps({k: _encode(v) for k, v in customer.items()}),
+        "row": json.dumps({k: _encode(v) for k, v in row.items()}),
+    }
+
+def queue(db: AsyncSession, writes: Sequence[Write]) -> None:
+    """
+    Queue inserts (each with the customer upsert it needs) once the
+    request's transaction commits; nothing is queued if it rolls back. If
+    the XADD fails then, the rows are written synchronously instead, so
+    nothing is dropped.
+    """
+    if writes:
+        after_commit(db, partial(_enqueue, [_fields(w) for w in writes]))
+
+async def _enqueue(entries: List[Dict[str, str]]) -> None:
+    r = get_async_redis()
+    try:
+        if r is None:
+            raise RedisError("Redis is not connected")
+        async with r.pipeline(transaction=False) as pipe:
+            for fields in entries:
+                pipe.xadd(stream_key(), fields)
+            await pipe.execute()
+        return
+    except RedisError:
+        log.warning("write-behind enqueue of %d writes failed; writing synchronously", len(entries), exc_info=True)
+    # Idempotent on the row ids, so entries that did reach the stream are harmless
+    await asyncio.to_thread(_apply_now, [("", fields) for fields in entries])
+
+# ---- drain (worker side) ----
+
+Entry = Tuple[str, Dict[str, str]]
+
+_MODELS = {"ticket": Ticket, "callback": Callback}
+_DATETIMES = {"created_at", "scheduled_time"}
+
+_group_ready = False
+
+def _ensure_group(r) -> None:
+    global _group_ready
+    if _group_ready:
+        return
+    try:
+        r.xgroup_create(stream_key(), GROUP, id="0", mkstream=True)
+    except Exception as exc:  # BUSYGROUP: already exists
+        if "BUSYGROUP" not in str(exc):
+            raise
+    _group_ready = True
+
+def _group_call(r, fn):
+    """fn() against the consumer group, recreated once if Redis lost it (NOGROUP)."""
+    global _group_ready
+    _ensure_group(r)
+    try:
+        return fn()
+    except ResponseError as exc:
+        if "NOGROUP" not in str(exc):
+            raise
+        # The stream was deleted or Redis restarted without persistence
+        log.warning("write-behind group %s is missing; recreating it", GROUP)
+        _group_ready = False
+        _ensure_group(r)
+        return fn()
+
+def _decode_row(raw: str) -> dict:
+    row = json.loads(raw)
+    row["id"] = UUID(row["id"])
+    for key in _DATETIMES & row.keys():
+        if row[key] is not None:
+            row[key] = datetime.fromisoformat(row[key])
+    return row
+
+def _upsert_customers(db: Session, customers: List[dict]) -> Dict[str, object]:
+    """
+    One INSERT ... ON CONFLICT for all customers in a batch; returns
+    external_id -> id. As in tools_service.upsert_customer, an empty channel
+    or language keeps the stored value (COALESCE(NULLIF(new, ''), old));
+    within the batch, the last non-empty value of each field wins.
+    """
+    latest: Dict[str, dict] = {}
+    for c in customers:
+        merged = latest.setdefault(c["external_id"], {"external_id": c["external_id"], "created_at": c["created_at"]})
+        merged.update({field: c[field] for field in ("channel", "language") if c.get(field)})
+    stmt = insert(Customer).values(
+        [
+            {
+                "id": uuid4(),
+                "external_id": c["external_id"],
+                "channel": c.get("channel") or "unknown",
+                "language_pref": c.get("language") or "en",
+                "created_at": datetime.fromisoformat(c["created_at"]),
+            }
+            for c in latest.values()
+        ]
+    )
+
+    def updated(column, field: str):
+        # Inserted rows get the defaults for empty values; existing ones keep theirs
+        kept = [external_id for external_id, c in latest.items() if not c.get(field)]
+        new = stmt.excluded[column.key]
+        return case((stmt.excluded.external_id.in_(kept), column), else_=new) if kept else new
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Customer.external_id],
+        set_={"channel": updated(Customer.channel, "channel"), "language_pref": updated(Customer.language_pref, "language")},
+    ).returning(Customer.external_id, Customer.id)
+    return {external_id: customer_id for external_id, customer_id in db.execute(stmt)}
+
+def apply(db: Session, entries: List[Entry]) -> int:
+    """Insert a batch of stream entries in one transaction; returns rows inserted."""
+    customers, rows = [], {kind: [] for kind in _MODELS}
+    for _, fields in entries:
+        customer = json.loads(fields["customer"])
+        customers.append(customer)
+        row = _decode_row(fields["row"])
+        row["_external_id"] = customer["external_id"]
+        rows[fields["kind"]].append(row)
+
+    ids = _upsert_customers(db, customers) if customers else {}
+    inserted = 0
+    for kind, kind_rows in rows.items():
+        if not kind_rows:
+            continue
+        for row in kind_rows:
+            row["customer_id"] = ids[row.pop("_external_id")]
+        model = _MODELS[kind]
+        result = db.execute(insert(model).values(kind_rows).on_conflict_do_nothing(index_elements=[model.id]))
+        inserted += result.rowcount
+    db.commit()
+    return inserted
+
+def _apply_now(entries: List[Entry]) -> None:
+    # Fallback for a failed enqueue, run in a thread off the event loop
+    with SessionLocal() as db:
+        try:
+            apply(db, entries)
+        except Exception:
+            log.exception("write-behind fallback failed; lost rows: %s", [fields["row"] for _, fields in entries])
+
+def _ack(r, ids: List[str]) -> None:
+    with r.pipeline(transaction=True) as pipe:
+        pipe.xack(stream_key(), GROUP, *ids)
+        pipe.xdel(stream_key(), *ids)
+        pipe.execute()
+
+def _dead_letter(r, entry: Entry, error: str) -> None:
+    entry_id, fields = entry
+    r.xadd(dead_letter_key(), {**fields, "source_id": entry_id, "error": error[:500]})
+    _ack(r, [entry_id])
+
+def _process(r, db: Session, entries: List[Entry]) -> int:
+    if not entries:
+        return 0
+    try:
+        inserted = apply(db, entries)
+    except OperationalError:
+        # Database unavailable: leave the entries pending; reconcile() re-claims them
+        db.rollback()
+        raise
+    except Exception:
+        db.rollback()
+        if len(entries) == 1:
+            log.exception("write-behind entry %s failed; moved to %s", entries[0][0], dead_letter_key())
+            _dead_letter(r, entries[0], "insert failed")
+            return 0
+        # Isolate the bad entry; the others still go in
+        return sum(_process(r, db, [entry]) for entry in entries)
+    _ack(r, [entry_id for entry_id, _ in entries])
+    return inserted
+
+def reconcile(db: Session) -> int:
+    """
+    Re-claim entries pending longer than WRITE_BEHIND_CLAIM_IDLE_MS (their
+    consumer died or the database was down) and apply them.
+    """
+    r = get_redis()
+    if r is None:
+        return 0
+    inserted, cursor = 0, "0-0"
+    while True:
+        cursor, claimed, *_ = _group_call(
+            r,
+            lambda: r.xautoclaim(
+                stream_key(), GROUP, _consumer(), _claim_idle_ms(), start_id=cursor, count=_batch_size()
+            ),
+        )
+        # Entries deleted from the stream come back as (id, None)
+        inserted += _process(r, db, [(i, f) for i, f in claimed if f])
+        if cursor == "0-0":
+            return inserted
+
+def drain(db: Session) -> int:
+    """Apply new stream entries in batches of WRITE_BEHIND_BATCH_SIZE; returns rows inserted."""
+    r = get_redis()
+    if r is None:
+        return 0
+    inserted = 0
+    for _ in range(_max_batches()):
+        batch = _group_call(r, lambda: r.xreadgroup(GROUP, _consumer(), {stream_key(): ">"}, count=_batch_size()))
+        entries = batch[0][1] if batch else []
+        if not entries:
+            break
+        inserted += _process(r, db, entries)
+    return inserted
+
+async def backlog() -> Optional[dict]:
+    """Entries not yet inserted ('queued', of which 'pending' are claimed by a consumer) and dead-lettered."""
+    r = get_async_redis()
+    if r is None:
+        return None
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.xlen(stream_key())
+        pipe.xinfo_groups(stream_key())
+        pipe.xlen(dead_letter_key())
+        queued, groups, dead = await pipe.execute(raise_on_error=False)
+    if isinstance(queued, Exception):
+        return {"queued": 0, "pending": 0, "dead": 0}  # stream not created yet
+    pending = next((g["pending"] for g in groups if g["name"] == GROUP), 0) if isinstance(groups, list) else 0
+    return {"queued": queued, "pending": pending, "dead": dead if isinstance(dead, int) else 0}
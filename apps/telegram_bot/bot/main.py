@@ -1,5 +1,9 @@
 import os
+import json
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 
 import httpx
 from telegram import Update
@@ -15,6 +19,44 @@ logger = logging.getLogger("telegram_bot")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000").rstrip("/")
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 
+# Streaming mode: call /chat/stream and edit the reply as tokens arrive.
+BOT_STREAM_REPLIES = os.getenv("BOT_STREAM_REPLIES", "false").lower() in ("1", "true", "yes")
+# Telegram rate-limits message edits; keep at least this long between edits.
+BOT_STREAM_EDIT_INTERVAL = float(os.getenv("BOT_STREAM_EDIT_INTERVAL", "1.0"))
+TELEGRAM_MAX_MESSAGE_CHARS = 4096
+
+# One pooled HTTP client for the life of the bot
+BOT_HTTP_MAX_CONNECTIONS = int(os.getenv("BOT_HTTP_MAX_CONNECTIONS", "50"))
+BOT_HTTP_MAX_KEEPALIVE = int(os.getenv("BOT_HTTP_MAX_KEEPALIVE", "20"))
+# Global cap on concurrent /chat calls, so a burst of updates cannot swamp the API
+BOT_MAX_IN_FLIGHT = int(os.getenv("BOT_MAX_IN_FLIGHT", "32"))
+
+_in_flight = asyncio.Semaphore(BOT_MAX_IN_FLIGHT)
+# chat_id -> [lock, holders+waiters]; entries are dropped once nobody uses them
+_chat_locks: dict[int, list] = {}
+
+
+@asynccontextmanager
+async def _chat_turn(chat_id: int):
+    """
+    Serialize messages per chat (asyncio.Lock is FIFO, so they reach the API
+    in arrival order) and bound the global number of in-flight API calls.
+    """
+    entry = _chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            async with _in_flight:
+                yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _chat_locks.pop(chat_id, None)
+
+
+def _http(context: ContextTypes.DEFAULT_TYPE) -> httpx.AsyncClient:
+    return context.application.bot_data["http"]
+
 
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (
@@ -56,13 +98,17 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     }
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            r = await client.post(f"{API_BASE_URL}/chat", json=payload)
+        async with _chat_turn(update.message.chat_id):
+            if BOT_STREAM_REPLIES:
+                await _reply_streaming(update, _http(context), payload)
+                return
+
+            r = await _http(context).post(f"{API_BASE_URL}/chat", json=payload)
             r.raise_for_status()
             data = r.json()
 
-        reply = data.get("reply") or "Sorry, I had trouble generating a reply."
-        await update.message.reply_text(reply)
+            reply = data.get("reply") or "Sorry, I had trouble generating a reply."
+            await update.message.reply_text(reply)
 
     except Exception as e:
         logger.exception("Failed to call API /chat: %s", e)
@@ -71,17 +117,83 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         )
 
 
+async def _reply_streaming(update: Update, client: httpx.AsyncClient, payload: dict) -> None:
+    """Send the first tokens as a reply, then edit it progressively until done."""
+    sent = None
+    shown = ""
+    text = ""
+    last_edit = 0.0
+
+    async with client.stream(
+        "POST", f"{API_BASE_URL}/chat/stream", json=payload, timeout=httpx.Timeout(20.0, read=60.0)
+    ) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            kind = event.get("type")
+            if kind in ("delta", "sources"):
+                text += event.get("text", "")
+            elif kind == "done":
+                text = event.get("reply") or text
+            elif kind == "error":
+                raise RuntimeError(event.get("message", "stream error"))
+
+            now = time.monotonic()
+            if not text.strip() or (kind != "done" and now - last_edit < BOT_STREAM_EDIT_INTERVAL):
+                continue
+
+            chunk = text[:TELEGRAM_MAX_MESSAGE_CHARS]
+            if sent is None:
+                sent = await update.message.reply_text(chunk)
+            elif chunk != shown:
+                await sent.edit_text(chunk)
+            shown = chunk
+            last_edit = now
+
+    if sent is None:
+        await update.message.reply_text("Sorry, I had trouble generating a reply.")
+
+
+async def _post_init(app: Application) -> None:
+    app.bot_data["http"] = httpx.AsyncClient(
+        timeout=20.0,
+        limits=httpx.Limits(
+            max_connections=BOT_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=BOT_HTTP_MAX_KEEPALIVE,
+        ),
+    )
+
+
+async def _post_shutdown(app: Application) -> None:
+    client = app.bot_data.pop("http", None)
+    if client is not None:
+        await client.aclose()
+
+
 def main() -> None:
     if not BOT_TOKEN:
         raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    # concurrent_updates: different chats run in parallel; _chat_turn keeps
+    # each chat's messages in order.
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start_cmd))
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
-    logger.info("Telegram bot started. Using API_BASE_URL=%s", API_BASE_URL)
+    logger.info(
+        "Telegram bot started. Using API_BASE_URL=%s streaming=%s", API_BASE_URL, BOT_STREAM_REPLIES
+    )
     app.run_polling(close_loop=False)
 
 
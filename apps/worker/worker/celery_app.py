@@ -13,7 +13,32 @@ celery.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Ingest tasks are long and uneven; take one at a time so idle nodes pick up the rest
+    worker_prefetch_multiplier=1,
 )
 
+# Write-behind drain (WRITE_BEHIND_ENABLED); a run that could not start in
+# time is dropped rather than queued behind the next one.
+_drain_seconds = float(os.getenv("WRITE_BEHIND_DRAIN_SECONDS", "1"))
+_reconcile_seconds = float(os.getenv("WRITE_BEHIND_RECONCILE_SECONDS", "60"))
+_answer_cache_evict_seconds = float(os.getenv("ANSWER_CACHE_EVICT_SECONDS", "300"))
+celery.conf.beat_schedule = {
+    "write-behind-drain": {
+        "task": "worker.tasks.writes.drain",
+        "schedule": _drain_seconds,
+        "options": {"expires": _drain_seconds},
+    },
+    "write-behind-reconcile": {
+        "task": "worker.tasks.writes.reconcile",
+        "schedule": _reconcile_seconds,
+        "options": {"expires": _reconcile_seconds},
+    },
+    "answer-cache-evict": {
+        "task": "worker.tasks.maintenance.evict_answer_cache",
+        "schedule": _answer_cache_evict_seconds,
+        "options": {"expires": _answer_cache_evict_seconds},
+    },
+}
+
 # Import tasks so Celery registers them
 import worker.tasks
\ No newline at end of file
@@ -1,5 +1,8 @@
 from worker.celery_app import celery
 
 @celery.task(name="worker.tasks.example_task")
-async def ping() -> str:
-    return "pong"
\ No newline at end of file
+def ping() -> str:
+    return "pong"
+
+# Import task modules so Celery registers them
+from worker.tasks import kb, maintenance, writes  # noqa: E402,F401
@@ -0,0 +1,164 @@
+"""
+Distributed KB ingestion. `ingest_run` walks the kb/ folder and, if any file
+changed, starts a new KB generation (a copy of the active one) and fans
+out: one task per changed FAQ/CSV file, and for each changed PDF one task
+per page range joined by a chord whose callback finalizes the document.
+Whichever task finishes the last file builds the generation's indexes,
+verifies them and activates it. Progress is kept in Redis
+(app.rag.ingest_progress) and polled through GET /kb/ingest/{run_id}.
+
+ingest_run plans every task (PDF outlines, document rows) before sending
+any, so a failure while planning leaves no task writing into the
+generation; any failure marks the run and the generation failed.
+
+Tasks are acks_late, so a task can run again after its worker died. Each
+file is counted done once (ingest_progress.file_done), so a redelivered
+task cannot make the run look complete while other files are still being
+written. Every task holds the generation (generations.hold) so gc() does
+not take a long run for an abandoned one.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Tuple
+from uuid import UUID, uuid4
+
+from celery import chord, group
+from sqlalchemy.orm import Session
+
+from app.db.models import KBDocument
+from app.db.session import SessionLocal
+from app.rag import generations, ingest_kb, ingest_progress
+from worker.celery_app import celery
+
+@celery.task(name="worker.tasks.kb.ingest_run")
+def ingest_run(run_id: str, kb_path: str) -> None:
+    generation = None
+    try:
+        with SessionLocal() as db:
+            sources = ingest_kb.kb_sources(Path(kb_path))
+            pending = ingest_kb.changed_sources(db, sources, generations.active_id(db))
+            if not pending:
+                ingest_progress.started(run_id, files_total=len(sources))
+                ingest_progress.incr(run_id, files_done=len(sources), files_unchanged=len(sources))
+                ingest_progress.finished(run_id)
+                return
+
+            generation = generations.begin(db, meta={"mode": "distributed", "run_id": run_id})
+            with generations.hold(db, generation):
+                ingest_progress.started(run_id, files_total=len(sources), generation=generation)
+                changed = {str(path) for _, _, path in pending}
+                # Changed files are still outstanding, so this never completes the run
+                ingest_progress.files_skipped(run_id, [str(p) for _, _, p in sources if str(p) not in changed])
+                signatures = [_plan_file(db, run_id, generation, kind, path) for kind, _, path in pending]
+
+                ingest_progress.incr(run_id, tasks_total=sum(n for _, n in signatures))
+                for send, _ in signatures:
+                    send()
+    except Exception as exc:
+        if generation is None:
+            ingest_progress.failed(run_id, f"ingest_run: {exc}")
+        else:
+            _fail(run_id, generation, f"ingest_run: {exc}")
+        raise
+
+def _plan_file(db: Session, run_id: str, generation: int, kind: str, path: Path) -> Tuple[Callable[[], object], int]:
+    """(callable that sends the file's tasks, number of tasks)."""
+    digest = ingest_kb.file_hash(path)
+    if kind != "PDF":
+        return (lambda: ingest_file.delay(run_id, generation, kind, str(path), digest)), 1
+
+    language, pages = ingest_kb.pdf_outline(path)
+    doc = ingest_kb.upsert_document(
+        db=db,
+        source_type="pdf",
+        title=path.stem,
+        source_path=str(path),
+        language=language,
+        meta={"filename": path.name},
+    )
+    # One run id per document, shared by all of its page-range tasks
+    doc_run = str(uuid4())
+    ranges = ingest_kb.pdf_page_ranges(pages) or [(0, 0)]
+    header = group(
+        ingest_pdf_pages.s(run_id, generation, str(doc.id), doc_run, str(path), start, stop)
+        for start, stop in ranges
+    )
+    callback = finalize_document.s(run_id, generation, str(doc.id), doc_run, digest, str(path)).on_error(
+        run_failed.s(run_id, generation)
+    )
+    return (lambda: chord(header)(callback)), len(ranges)
+
+@celery.task(name="worker.tasks.kb.ingest_file", acks_late=True)
+def ingest_file(run_id: str, generation: int, kind: str, path: str, digest: str) -> None:
+    changed, written = False, 0
+    try:
+        with SessionLocal() as db, generations.hold(db, generation):
+            extracted = ingest_kb.EXTRACTORS[kind](Path(path), None)
+            if extracted is not None:
+                doc = ingest_kb.upsert_document(
+                    db=db,
+                    source_type=extracted.source_type,
+                    title=Path(path).stem,
+                    source_path=path,
+                    language=extracted.language,
+                    meta={"filename": Path(path).name},
+                )
+                run = uuid4()
+                changed, written = ingest_kb.write_chunks(db, doc, extracted.specs, run, generation)
+                changed = ingest_kb.finish_document(db, doc, run, digest, changed, generation)
+    except Exception as exc:
+        _fail(run_id, generation, f"{path}: {exc}")
+        raise
+    ingest_progress.incr(run_id, tasks_done=1, chunks=written)
+    _file_done(run_id, generation, path, changed=changed)
+
+@celery.task(name="worker.tasks.kb.ingest_pdf_pages", acks_late=True)
+def ingest_pdf_pages(
+    run_id: str, generation: int, doc_id: str, doc_run: str, path: str, start: int, stop: int
+) -> list:
+    with SessionLocal() as db, generations.hold(db, generation):
+        doc = db.get(KBDocument, UUID(doc_id))
+        specs = ingest_kb.extract_pdf_pages(Path(path), start, stop)
+        changed, written = ingest_kb.write_chunks(db, doc, specs, UUID(doc_run), generation)
+    ingest_progress.incr(run_id, tasks_done=1, chunks=written)
+    return [changed, written]
+
+@celery.task(name="worker.tasks.kb.finalize_document")
+def finalize_document(
+    results: list, run_id: str, generation: int, doc_id: str, doc_run: str, digest: str, path: str
+) -> bool:
+    with SessionLocal() as db, generations.hold(db, generation):
+        doc = db.get(KBDocument, UUID(doc_id))
+        ingest_kb.renumber_chunks(db, doc, generation)
+        changed = ingest_kb.finish_document(
+            db, doc, UUID(doc_run), digest, any(r[0] for r in results), generation
+        )
+    _file_done(run_id, generation, path, changed=changed)
+    return changed
+
+@celery.task(name="worker.tasks.kb.run_failed")
+def run_failed(request, exc, traceback, run_id: str, generation: int) -> None:
+    _fail(run_id, generation, f"{request.task}: {exc}")
+
+def _fail(run_id: str, generation: int, error: str) -> None:
+    ingest_progress.failed(run_id, error)
+    with SessionLocal() as db:
+        generations.mark_failed(db, generation, error)
+
+def _file_done(run_id: str, generation: int, path: str, changed: bool) -> None:
+    state = ingest_progress.file_done(run_id, path, changed=changed)
+    if state is None:
+        return
+    # This was the run's last file: index, verify and switch to the generation
+    ingest_progress.indexing(run_id)
+    with SessionLocal() as db, generations.hold(db, generation):
+        try:
+            problems = generations.finish(db, generation)
+        except Exception as exc:
+            ingest_progress.failed(run_id, f"generation {generation}: {exc}")
+            raise
+    if problems:
+        ingest_progress.failed(run_id, f"generation {generation}: {'; '.join(problems)}")
+    else:
+        ingest_progress.finished(run_id)
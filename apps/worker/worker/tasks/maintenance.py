@@ -0,0 +1,14 @@
+"""
+Periodic housekeeping kept off the request path; runs from celery beat
+(see beat_schedule in worker.celery_app).
+"""
+from __future__ import annotations
+
+from app.db.session import SessionLocal
+from app.services import answer_cache
+from worker.celery_app import celery
+
+@celery.task(name="worker.tasks.maintenance.evict_answer_cache")
+def evict_answer_cache() -> int:
+    with SessionLocal() as db:
+        return answer_cache.evict(db)
@@ -0,0 +1,19 @@
+"""
+Drains the write-behind stream (app.services.write_behind) into Postgres.
+Both tasks run from celery beat; see beat_schedule in worker.celery_app.
+"""
+from __future__ import annotations
+
+from app.db.session import SessionLocal
+from app.services import write_behind
+from worker.celery_app import celery
+
+@celery.task(name="worker.tasks.writes.drain")
+def drain() -> int:
+    with SessionLocal() as db:
+        return write_behind.drain(db)
+
+@celery.task(name="worker.tasks.writes.reconcile")
+def reconcile() -> int:
+    with SessionLocal() as db:
+        return write_behind.reconcile(db)
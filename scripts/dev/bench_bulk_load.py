@@ -0,0 +1,131 @@
+"""
+Insert throughput for kb_chunks: ORM add_all (the incremental path) vs
+binary COPY (ingest_kb --bulk), on a synthetic catalog with random unit
+embeddings, so no provider calls are needed.
+
+Rows go into a scratch KB generation, which is indexed like a real bulk
+rebuild and dropped at the end; the active generation is not touched.
+Run inside the API container:
+    python scripts/dev/bench_bulk_load.py --rows 100000
+"""
+import argparse
+import time
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import delete
+
+from app.db.models import KBChunk, KBDocument
+from app.db.session import SessionLocal
+from app.db.vector_index import EMBEDDING_DIM
+from app.rag import bulk_load, generations
+from app.rag.ingest_kb import content_hash, utcnow
+
+
+def _vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    vecs = rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _rows(rng: np.random.Generator, n: int, batch: int):
+    for start in range(0, n, batch):
+        vecs = _vectors(rng, min(batch, n - start))
+        for offset, vec in enumerate(vecs):
+            i = start + offset + 1
+            text = f"sku: SYN-{i:07d}\nname: Synthetic product {i}\nprice: {i % 500}.99"
+            yield i, text, vec
+
+
+def _orm(db, rng, doc_id, generation: int, n: int, batch: int) -> float:
+    started = time.perf_counter()
+    pending = []
+    for i, text, vec in _rows(rng, n, batch):
+        pending.append(
+            KBChunk(
+                id=uuid4(),
+                document_id=doc_id,
+                generation=generation,
+                chunk_index=i,
+                language="en",
+                title="synthetic",
+                content=text,
+                content_hash=content_hash(text),
+                token_count=len(text.split()),
+                meta={"type": "csv", "row": i},
+                created_at=utcnow(),
+                embedding=vec,
+            )
+        )
+        if len(pending) == batch:
+            db.add_all(pending)
+            db.commit()
+            pending = []
+    db.add_all(pending)
+    db.commit()
+    return time.perf_counter() - started
+
+
+def _copy(rng, doc_id, generation: int, n: int, batch: int) -> tuple[float, float]:
+    with bulk_load.connect() as conn:
+        started = time.perf_counter()
+        bulk_load.copy_chunks(
+            conn,
+            (
+                bulk_load.chunk_row(
+                    uuid4(), doc_id, generation, i, "en", "synthetic", text, content_hash(text),
+                    len(text.split()), None, None, {"type": "csv", "row": i}, utcnow(), vec,
+                )
+                for i, text, vec in _rows(rng, n, batch)
+            ),
+        )
+        conn.commit()
+        load_s = time.perf_counter() - started
+        started = time.perf_counter()
+        bulk_load.build_indexes(conn, generation)
+        return load_s, time.perf_counter() - started
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--mode", choices=("orm", "copy", "both"), default="both")
+    args = ap.parse_args()
+
+    with SessionLocal() as db:
+        doc = KBDocument(
+            id=uuid4(),
+            source_type="csv",
+            title="synthetic",
+            source_path=f"synthetic://{uuid4()}",
+            language="en",
+            meta={},
+            created_at=utcnow(),
+        )
+        db.add(doc)
+        db.commit()
+        generation = generations.begin(db, copy_active=False, meta={"mode": "bench"})
+
+        print(f"rows={args.rows} dim={EMBEDDING_DIM} storage={bulk_load.EMBEDDING_STORAGE}")
+        print(f"{'mode':<6} {'load s':>8} {'rows/s':>9} {'index s':>8} {'total s':>8}")
+        try:
+            if args.mode in ("orm", "both"):
+                secs = _orm(db, np.random.default_rng(7), doc.id, generation, args.rows, args.batch)
+                print(f"{'orm':<6} {secs:>8.1f} {args.rows / secs:>9.0f} {'-':>8} {secs:>8.1f}")
+                db.execute(delete(KBChunk).where(KBChunk.document_id == doc.id))
+                db.commit()
+            if args.mode in ("copy", "both"):
+                load_s, index_s = _copy(np.random.default_rng(7), doc.id, generation, args.rows, args.batch)
+                print(
+                    f"{'copy':<6} {load_s:>8.1f} {args.rows / load_s:>9.0f} "
+                    f"{index_s:>8.1f} {load_s + index_s:>8.1f}"
+                )
+        finally:
+            db.rollback()
+            generations.drop(db, generation)
+            db.execute(delete(KBDocument).where(KBDocument.id == doc.id))
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark: per-message intent matching cost as keyword tables grow.
+
+Compares the old per-list substring scan (`_contains_any` called once per
+keyword table) with the compiled `KeywordMatcher` used by handle_chat. The
+shipped `INTENT_MATCHER` is timed first. Before timing, the compiled
+matcher is checked against a per-keyword scan with the same word-boundary
+rules, on tables whose keywords overlap ("card" / "card number"). Only
+app.core is imported, so no database or Redis settings are needed.
+
+Run from the API root (PYTHONPATH must contain `app`):
+    python scripts/dev/bench_intents.py
+"""
+import random
+import string
+import time
+
+from app.core.matcher import (
+    CALLBACK_KEYWORDS_AM,
+    CALLBACK_KEYWORDS_EN,
+    HUMAN_KEYWORDS_AM,
+    HUMAN_KEYWORDS_EN,
+    INTENT_MATCHER,
+    ORDER_KEYWORDS_AM,
+    ORDER_KEYWORDS_EN,
+    PAYMENT_KEYWORDS,
+    TICKET_KEYWORDS_AM,
+    TICKET_KEYWORDS_EN,
+    KeywordMatcher,
+    _contains_any,
+)
+
+MESSAGES = [
+    "Hi, where is my order ETH-1001? The shipping seems slow.",
+    "ትዕዛዜ የት ደረሰ? ETH-1002",
+    "The item arrived broken, I want a refund please",
+    "Can someone call me back tomorrow morning?",
+    "Do you deliver to Bole and how much is delivery?",
+    "I want to talk to a human agent",
+]
+
+
+# Keywords of different labels that start at the same position
+OVERLAP_TABLES = {
+    "a": ["card", "call", "ትዕዛዝ"],
+    "b": ["card number", "call me back", "ትዕዛዝ ሁኔታ"],
+    "c": ["number"],
+}
+OVERLAP_MESSAGES = [
+    "my card number is 1234",
+    "my cards numbers",
+    "please call me back",
+    "ትዕዛዝ ሁኔታ ETH-1",
+    "cardnumber",
+]
+
+
+def _per_keyword(tables: dict[str, list[str]]):
+    """Reference: one single-keyword matcher per keyword, so nothing can shadow anything."""
+    single = [(label, KeywordMatcher({label: [w]})) for label, words in tables.items() for w in words]
+
+    def match(text: str) -> frozenset[str]:
+        return frozenset(label for label, m in single if m.match(text))
+
+    return match
+
+
+def check(tables: dict[str, list[str]], messages: list[str]) -> None:
+    compiled, reference = KeywordMatcher(tables), _per_keyword(tables)
+    for m in messages:
+        got, want = compiled.match(m), reference(m)
+        assert got == want, f"{m!r}: compiled {sorted(got)} != per-keyword {sorted(want)}"
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+
+
+def _tables(extra_per_table: int, rng: random.Random) -> dict[str, list[str]]:
+    tables = {
+        "payment": list(PAYMENT_KEYWORDS),
+        "human": HUMAN_KEYWORDS_EN + HUMAN_KEYWORDS_AM,
+        "order": ORDER_KEYWORDS_EN + ORDER_KEYWORDS_AM,
+        "callback": CALLBACK_KEYWORDS_EN + CALLBACK_KEYWORDS_AM,
+        "ticket": TICKET_KEYWORDS_EN + TICKET_KEYWORDS_AM,
+    }
+    for words in tables.values():
+        words.extend(_random_word(rng) for _ in range(extra_per_table))
+    return tables
+
+
+def _per_message_us(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for m in MESSAGES:
+            fn(m)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES)) * 1e6
+
+
+def main() -> None:
+    rng = random.Random(42)
+    check(OVERLAP_TABLES, OVERLAP_MESSAGES)
+    check(_tables(20, random.Random(7)), MESSAGES + OVERLAP_MESSAGES)
+    print("compiled matcher agrees with the per-keyword scan")
+    print(f"INTENT_MATCHER: {_per_message_us(INTENT_MATCHER.match, 2000):.1f} us/msg\n")
+    print(f"{'keywords':>9} {'naive us/msg':>13} {'compiled us/msg':>16} {'build ms':>9}")
+    for extra in (0, 20, 200, 1000, 4000):
+        tables = _tables(extra, rng)
+        total = sum(len(v) for v in tables.values())
+
+        def naive(text: str, tables=tables) -> set[str]:
+            return {label for label, words in tables.items() if _contains_any(text, words)}
+
+        t0 = time.perf_counter()
+        matcher = KeywordMatcher(tables)
+        build_ms = (time.perf_counter() - t0) * 1e3
+
+        rounds = max(5, 2000 // (1 + extra // 10))
+        print(
+            f"{total:>9} {_per_message_us(naive, rounds):>13.1f} "
+            f"{_per_message_us(matcher.match, rounds):>16.1f} {build_ms:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
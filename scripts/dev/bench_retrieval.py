@@ -0,0 +1,88 @@
+"""
+Recall@k and latency: single-stage HNSW (ann) vs binary-quantized candidates
+with exact re-rank (binary_rerank), against exact brute-force ground truth.
+
+Queries are stored chunk embeddings with a little Gaussian noise, so no
+provider calls are needed. Run inside the API container after ingest:
+    python scripts/dev/bench_retrieval.py --queries 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+
+from app.db.models import KBChunk
+from app.db.session import AsyncSessionLocal, async_engine
+from app.rag.generations import active_generation
+from app.services.rag_service import _top_k, search_stmt
+
+
+def _noisy(vec, rng: random.Random, sigma: float) -> list[float]:
+    return [float(x) + rng.gauss(0.0, sigma) for x in vec]
+
+
+async def _run(db, stmt, exact: bool = False):
+    async with db.begin():
+        if exact:
+            await db.execute(text("SET LOCAL enable_indexscan = off"))
+            await db.execute(text("SET LOCAL enable_bitmapscan = off"))
+        started = time.perf_counter()
+        rows = (await db.execute(stmt)).all()
+        elapsed = (time.perf_counter() - started) * 1000
+    ranked = sorted(rows, key=lambda r: r.distance)
+    return [(r.title, r.content) for r in ranked], elapsed
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--noise", type=float, default=0.01)
+    ap.add_argument("--language", default="en")
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    top_k = _top_k()
+
+    async with AsyncSessionLocal() as db:
+        generation = await active_generation(db)
+        sample = (
+            await db.execute(
+                select(KBChunk.embedding)
+                .where(KBChunk.generation == generation)
+                .order_by(func.random())
+                .limit(args.queries)
+            )
+        ).scalars().all()
+        await db.commit()
+
+        results = {"ann": ([], []), "binary_rerank": ([], [])}
+        exact_ms = []
+        for vec in sample:
+            qvec = _noisy(vec.to_list() if hasattr(vec, "to_list") else vec, rng, args.noise)
+            truth, ms = await _run(db, search_stmt(qvec, args.language, top_k, generation, "ann"), exact=True)
+            exact_ms.append(ms)
+            truth_set = set(truth[:top_k])
+            for mode, (recalls, latencies) in results.items():
+                got, ms = await _run(db, search_stmt(qvec, args.language, top_k, generation, mode))
+                recalls.append(len(truth_set & set(got[:top_k])) / max(1, len(truth_set)))
+                latencies.append(ms)
+
+    def _p(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+    print(f"generation={generation} queries={len(sample)} top_k={top_k}")
+    print(f"{'mode':<15} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'exact (seq)':<15} {1.0:>9.3f} {_p(exact_ms, 50):>8.2f} {_p(exact_ms, 95):>8.2f}")
+    for mode, (recalls, latencies) in results.items():
+        print(
+            f"{mode:<15} {statistics.mean(recalls):>9.3f} "
+            f"{_p(latencies, 50):>8.2f} {_p(latencies, 95):>8.2f}"
+        )
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
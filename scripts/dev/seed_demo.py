@@ -5,6 +5,7 @@ from sqlalchemy import select
 
 from app.db.session import SessionLocal
 from app.db.models import Customer, Order
+import app.services.order_cache  # noqa: F401  (drops cached "not found" entries for seeded orders)
 
 def utcnow():
     return datetime.now(timezone.utc)